@@ -1,9 +1,224 @@
-from flask import Flask, render_template, jsonify, request
+from flask import (Flask, render_template, jsonify, request, Response, stream_with_context,
+                   send_from_directory, abort)
 from database.db_manager import DatabaseManager
+from image_store import ImageStore
+import driver_io
+import metrics
+import io
+import json
 import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
 
 app = Flask(__name__)
-db = DatabaseManager()
+# Read-only here: the dashboard lists thumbnails and never full frames
+image_store = ImageStore()
+# Deleting a violation also removes its image and thumbnail once unused
+db = DatabaseManager(remove_image=image_store.remove)
+
+# Largest page a client can ask for; NDJSON exports are not capped
+MAX_PAGE_SIZE = 1000
+
+# Serialized dashboard responses keyed by request path, each tagged with the
+# data version it was built from. BOOT_ID keeps ETags from an earlier run of
+# the server from matching after a restart resets the version counter.
+BOOT_ID = uuid.uuid4().hex[:8]
+MAX_CACHED_RESPONSES = 256
+_response_cache = {}
+_response_cache_lock = threading.Lock()
+
+
+def page_args(default_limit, capped=True):
+    """Read limit, plate and time-range filters shared by the list endpoints"""
+    limit = request.args.get('limit', default_limit, type=int)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE) if capped else limit)
+    return {
+        'limit': limit,
+        'plate': request.args.get('plate'),
+        'since': request.args.get('since'),
+        'until': request.args.get('until')
+    }
+
+
+def wants_ndjson():
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best == 'application/x-ndjson')
+
+
+def ndjson_response(rows):
+    """Stream rows as newline-delimited JSON without building the whole body"""
+    def generate():
+        for row in rows:
+            yield json.dumps(row) + "\n"
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def page_body(rows, limit, cursor_of):
+    """Serialize one page as a JSON list, with the next cursor in X-Next-Cursor"""
+    rows = list(rows)
+    headers = {}
+    if limit is not None and len(rows) == limit:
+        headers['X-Next-Cursor'] = cursor_of(rows[-1])
+    return json.dumps(rows), headers
+
+
+def page_response(rows, limit, cursor_of):
+    body, headers = page_body(rows, limit, cursor_of)
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+def cached_json(build, per_hour=False):
+    """Serve build() -> (body, headers), reusing it until the data version changes
+
+    Responses carry an ETag and Last-Modified, so an unchanged poll gets a
+    304 without running a query or re-serializing anything. Responses that
+    depend on the clock as well, such as today's counts, pass per_hour so
+    they are also rebuilt when the hour rolls over.
+    """
+    version = db.get_data_version()
+    changed_at = db.data_changed_at
+    if per_hour:
+        # The local hour, which is what the summary's buckets use
+        hour_started = datetime.now().replace(minute=0, second=0, microsecond=0).timestamp()
+        version = f"{version}-{int(hour_started)}"
+        changed_at = max(changed_at, hour_started)
+    key = request.full_path
+    with _response_cache_lock:
+        entry = _response_cache.get(key)
+    if entry is None or entry[0] != version:
+        body, headers = build()
+        entry = (version, body, headers)
+        with _response_cache_lock:
+            if len(_response_cache) >= MAX_CACHED_RESPONSES:
+                _response_cache.clear()
+            _response_cache[key] = entry
+
+    _, body, headers = entry
+    response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(f"{BOOT_ID}-{version}")
+    response.last_modified = changed_at
+    # Let browsers keep the body but revalidate on every poll
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def with_thumbnails(violations):
+    """Add each violation's thumbnail URL; rows are copied, not modified"""
+    for violation in violations:
+        name = image_store.thumbnail_name(violation['image_path'])
+        yield dict(violation, thumbnail_url=f"/thumbnails/{name}")
+
+
+def violation_cursor(row):
+    return f"{row['timestamp']}:{row['id']}"
+
+
+class ViolationFeed:
+    """In-process fan-out of new violations to any number of stream clients
+
+    Violations committed through this process's DatabaseManager arrive via
+    its subscribe() hook. A single poller thread picks up violations written
+    by other processes, such as the camera monitor, with one query per data
+    change no matter how many clients are connected.
+    """
+
+    def __init__(self, db, history=1000, poll_interval=0.5, page_size=500):
+        self.db = db
+        self.poll_interval = poll_interval
+        # Violations fetched per query when catching up
+        self.page_size = page_size
+        # Recent (sequence, violation) pairs; clients track the last sequence seen
+        self._events = deque(maxlen=history)
+        self._seen_ids = set()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._poller = None
+        self._last_polled_id = 0
+
+    def start(self):
+        """Hook into the database and start the poller once"""
+        with self._cond:
+            if self._poller:
+                return
+            self._last_polled_id = self.db.get_latest_violation_id()
+            self._poller = threading.Thread(target=self._poll, name="violation-feed", daemon=True)
+        self.db.subscribe(self.publish)
+        self._poller.start()
+
+    def publish(self, violation):
+        with self._cond:
+            if violation["id"] in self._seen_ids:
+                return
+            if len(self._events) == self._events.maxlen:
+                self._seen_ids.discard(self._events[0][1]["id"])
+            self._seq += 1
+            self._events.append((self._seq, violation))
+            self._seen_ids.add(violation["id"])
+            self._cond.notify_all()
+
+    def current_seq(self):
+        with self._cond:
+            return self._seq
+
+    def wait(self, seq, timeout):
+        """Return (violations published after seq, new seq), waiting up to timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+            events = [event for n, event in self._events if n > seq]
+            return events, self._seq
+
+    def _poll(self):
+        version = self.db.get_data_version()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                current = self.db.get_data_version()
+                if current == version:
+                    continue
+                version = current
+                # A burst, such as a batch import, can span several pages
+                while True:
+                    page = self.db.get_violations_since(self._last_polled_id, self.page_size)
+                    for violation in page:
+                        self._last_polled_id = max(self._last_polled_id, violation["id"])
+                        self.publish(violation)
+                    if len(page) < self.page_size:
+                        break
+            except Exception as e:
+                print(f"Error polling for violations: {str(e)}")
+
+
+feed = ViolationFeed(db)
+
+# Seconds between SSE comment lines that keep idle connections open
+SSE_HEARTBEAT = 15.0
+
+
+def sse_event(violation):
+    violation = next(with_thumbnails([violation]))
+    return f"id: {violation['id']}\nevent: violation\ndata: {json.dumps(violation)}\n\n"
+
+@app.before_request
+def start_timer():
+    request.started_at = time.perf_counter()
+
+@app.after_request
+def record_timing(response):
+    # Streaming responses are timed until their headers are ready
+    started = getattr(request, 'started_at', None)
+    if started is not None and request.endpoint and metrics.registry.enabled:
+        metrics.registry.observe(f"api.{request.endpoint}", time.perf_counter() - started)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Stage timings of this server and of monitors that write snapshots"""
+    text = metrics.registry.render(metrics.read_snapshots(exclude=metrics.registry.process))
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
@@ -12,21 +227,118 @@ def index():
 
 @app.route('/api/violations')
 def get_violations():
-    """Get recent violations"""
-    violations = db.get_violations(limit=10)
-    return jsonify(violations)
+    """Get recent violations, one keyset page at a time"""
+    ndjson = wants_ndjson()
+    args = page_args(None if ndjson else 10, capped=not ndjson)
+    after = request.args.get('after')
+    if after:
+        timestamp, _, violation_id = after.rpartition(':')
+        if not timestamp or not violation_id.isdigit():
+            return jsonify({'error': 'Invalid cursor'}), 400
+        after = (timestamp, int(violation_id))
+    def violations():
+        return with_thumbnails(db.iter_violations(after=after or None, **args))
+    if ndjson:
+        return ndjson_response(violations())
+    return cached_json(lambda: page_body(violations(), args['limit'], violation_cursor))
+
+@app.route('/api/violations/stream')
+def stream_violations():
+    """Push new violations as Server-Sent Events"""
+    feed.start()
+    # Browsers send Last-Event-ID when they reconnect
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+
+    def generate():
+        seq = feed.current_seq()
+        replayed = last_id
+        yield "retry: 2000\n\n"
+        if last_id is not None:
+            # Replay what the client missed, then follow the live feed
+            while True:
+                missed = db.get_violations_since(replayed)
+                for violation in missed:
+                    yield sse_event(violation)
+                    replayed = violation["id"]
+                if len(missed) < 500:
+                    break
+        while True:
+            violations, seq = feed.wait(seq, SSE_HEARTBEAT)
+            if not violations:
+                yield ": heartbeat\n\n"
+            for violation in violations:
+                if replayed is None or violation["id"] > replayed:
+                    yield sse_event(violation)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/thumbnails/<path:name>')
+def thumbnail(name):
+    """Serve a violation thumbnail, creating it for images stored before thumbnails"""
+    if not os.path.isfile(os.path.join(image_store.thumb_root, name)):
+        image_path = image_store.image_for_thumbnail(name)
+        if image_path is None or image_store.thumbnail_name(image_path) != name:
+            abort(404)
+        image_store.make_thumbnail(image_path)
+    # Names are derived from the image's content hash, so they never change
+    return send_from_directory(image_store.thumb_root, name, max_age=365 * 24 * 3600)
 
 @app.route('/api/top-speeders')
 def get_top_speeders():
     """Get top speeders"""
-    speeders = db.get_top_speeders(limit=5)
-    return jsonify(speeders)
+    return cached_json(lambda: (json.dumps(db.get_top_speeders(limit=5)), {}))
+
+# --- Analytics, served from rollup tables ---
+@app.route('/api/stats/summary')
+def stats_summary():
+    """All-time, today's and this hour's violation counts"""
+    # "today" and "this hour" move with the clock, not only with new data
+    return cached_json(lambda: (json.dumps(db.get_stats_summary()), {}), per_hour=True)
+
+@app.route('/api/stats/hourly')
+@app.route('/api/stats/daily')
+def stats_series():
+    """Violations per hour or day, newest first; since/until are bucket prefixes"""
+    period = 'hour' if request.path.endswith('hourly') else 'day'
+    limit = request.args.get('limit', 24 if period == 'hour' else 30, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    since = request.args.get('since')
+    until = request.args.get('until')
+    return cached_json(lambda: (json.dumps(db.get_violation_counts(period, since, until, limit)), {}))
+
+@app.route('/api/stats/speeds')
+def stats_speeds():
+    """Speed histogram for ?day=YYYYmmdd, ?hour=YYYYmmdd_HH, or all time"""
+    if request.args.get('hour'):
+        period, bucket = 'hour', request.args['hour']
+    elif request.args.get('day'):
+        period, bucket = 'day', request.args['day']
+    else:
+        period, bucket = 'all', ''
+    return cached_json(lambda: (json.dumps(db.get_speed_histogram(period, bucket)), {}))
+
+@app.route('/api/stats/drivers/<license_plate>')
+def stats_driver(license_plate):
+    """One driver's violation count, average speed and speed histogram"""
+    stats = db.get_driver_stats(license_plate)
+    if stats is None:
+        return jsonify({'error': 'Driver not found'}), 404
+    return jsonify(stats)
 
 # --- CRUD for Drivers ---
 @app.route('/api/drivers', methods=['GET'])
 def list_drivers():
-    drivers = db.get_all_drivers() if hasattr(db, 'get_all_drivers') else []
-    return jsonify(drivers)
+    ndjson = wants_ndjson()
+    args = page_args(None if ndjson else 100, capped=not ndjson)
+    after = request.args.get('after', type=int)
+    drivers = db.iter_drivers(after=after, **args)
+    if ndjson:
+        return ndjson_response(drivers)
+    return page_response(drivers, args['limit'], lambda row: str(row['id']))
 
 @app.route('/api/drivers', methods=['POST'])
 def create_driver():
@@ -42,6 +354,29 @@ def create_driver():
     else:
         return jsonify({'error': 'Driver already exists or error occurred'}), 400
 
+@app.route('/api/drivers/import', methods=['POST'])
+def import_drivers():
+    """Upsert drivers from a CSV or NDJSON request body, read as it arrives"""
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'ndjson' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    batch_size = max(1, request.args.get('batch_size', 5000, type=int))
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    report = driver_io.import_drivers(db, stream, fmt, batch_size=batch_size)
+    return jsonify(report)
+
+@app.route('/api/drivers/export')
+def export_drivers():
+    """Stream every driver as CSV (default) or NDJSON"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(driver_io.export_drivers(db, fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=drivers.{fmt}'})
+
 @app.route('/api/drivers/<license_plate>', methods=['PUT'])
 def update_driver(license_plate):
     data = request.json
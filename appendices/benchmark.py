@@ -0,0 +1,593 @@
+"""Benchmarks for the recognition, storage, database and API hot paths
+
+Everything runs offline: plate images are synthetic and databases are
+generated at the requested sizes. Results are written as JSON, and a run
+can be compared against a stored baseline:
+
+    python benchmark.py run --output results.json
+    python benchmark.py run --groups db --sizes 10000 --baseline baseline.json
+    python benchmark.py generate --images synthetic/ --count 50
+    python benchmark.py generate --video synthetic.mp4 --count 120
+    python benchmark.py run --groups startup --startup-budget-ms 200
+
+Groups whose dependencies (OpenCV, easyocr, Flask) are not installed are
+reported as skipped rather than failing the run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from database.db_manager import DatabaseManager
+
+GROUPS = ("startup", "recognition", "storage", "db", "api")
+DEFAULT_SIZES = (10000, 1000000, 10000000)
+# One driver per this many violations in generated databases
+VIOLATIONS_PER_DRIVER = 20
+PLATE_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+# Modules that must not be imported by CLI runs that take no action
+HEAVY_MODULES = ("cv2", "numpy", "easyocr", "torch")
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(fn, repeat=50, warmup=3, number=1):
+    """Time fn() and return latency statistics in milliseconds
+
+    number calls are timed together and averaged, for operations too fast
+    to time one at a time.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) * 1000.0 / number)
+    samples.sort()
+    return {
+        "n": repeat * number,
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4)
+    }
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, int(round(pct / 100.0 * len(sorted_samples))) - 1)
+    return sorted_samples[min(index, len(sorted_samples) - 1)]
+
+
+def random_plate(rng):
+    return "".join(rng.choice(PLATE_CHARS) for _ in range(7))
+
+
+# --- Synthetic plate images ---
+
+def synthetic_frame(text, size=(1280, 720), plate_center=None, seed=0):
+    """Draw a road scene with one car and a readable license plate
+
+    Returns (frame, plate_box), the box being (x, y, w, h).
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = (90, 90, 90)
+    frame += rng.integers(0, 12, frame.shape, dtype=np.uint8)
+    # Lane markings give the edge detector some distractors
+    for x in range(0, width, width // 6):
+        cv2.line(frame, (x, height - 1), (x + width // 12, height // 2), (200, 200, 200), 3)
+
+    cx, cy = plate_center or (width // 2, int(height * 0.65))
+    plate_w, plate_h = width // 6, width // 24
+    car_w, car_h = plate_w * 3, plate_h * 8
+    cv2.rectangle(frame, (cx - car_w // 2, cy - car_h // 2 - plate_h * 2),
+                  (cx + car_w // 2, cy + car_h // 2), (40, 30, 120), -1)
+
+    x, y = cx - plate_w // 2, cy - plate_h // 2
+    cv2.rectangle(frame, (x, y), (x + plate_w, y + plate_h), (245, 245, 245), -1)
+    cv2.rectangle(frame, (x, y), (x + plate_w, y + plate_h), (0, 0, 0), 2)
+    scale = plate_h / 32.0
+    (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+    cv2.putText(frame, text, (x + (plate_w - text_w) // 2, y + (plate_h + text_h) // 2),
+                cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 2, cv2.LINE_AA)
+    return frame, (x, y, plate_w, plate_h)
+
+
+def synthetic_frames(count, size=(1280, 720), seed=0):
+    """Yield (frame, plate_text) for a car driving across the scene
+
+    The plate changes every 30 frames, as if a new vehicle arrived.
+    """
+    rng = random.Random(seed)
+    width, height = size
+    text = random_plate(rng)
+    for n in range(count):
+        if n and n % 30 == 0:
+            text = random_plate(rng)
+        progress = (n % 30) / 30.0
+        center = (int(width * (0.2 + 0.6 * progress)), int(height * (0.5 + 0.3 * progress)))
+        frame, _ = synthetic_frame(text, size, center, seed=n)
+        yield frame, text
+
+
+def write_images(directory, count, size=(1280, 720), seed=0, speed_range=(5.0, 15.0)):
+    """Write synthetic JPEGs and a CSV manifest that process_demo --batch accepts"""
+    import csv
+    import cv2
+
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = os.path.join(directory, "manifest.csv")
+    with open(manifest, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image", "speed", "plate"])
+        for n in range(count):
+            text = random_plate(rng)
+            frame, _ = synthetic_frame(text, size, seed=n)
+            name = f"plate_{n:05d}.jpg"
+            cv2.imwrite(os.path.join(directory, name), frame)
+            writer.writerow([name, round(rng.uniform(*speed_range), 1), text])
+    return manifest
+
+
+def write_video(path, count, size=(1280, 720), fps=30, seed=0):
+    """Write a synthetic drive-by video for the monitor and replay tools"""
+    import cv2
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        for frame, _ in synthetic_frames(count, size, seed):
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+# --- Startup ---
+
+def bench_startup(repeat, budget_ms=200.0):
+    """Time process_demo cold starts in fresh interpreters
+
+    Returns (results, failures); a failure is a start slower than budget_ms
+    at p50, a heavy module loaded where none is needed, or a run that exits
+    with an error.
+    """
+    script = os.path.join(HERE, "process_demo.py")
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ)
+    # The children must find the database package wherever this process did
+    package_dirs = [p for p in sys.path if os.path.isdir(os.path.join(p or os.curdir, "database"))]
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in [HERE] + package_dirs + [env.get("PYTHONPATH")] if p)
+
+    def python(*args):
+        def call():
+            subprocess.run([sys.executable] + list(args), cwd=workdir, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return call
+
+    runs = {
+        "startup.import_process_demo": python("-c", "import process_demo"),
+        "startup.help": python(script, "--help"),
+        "startup.below_threshold": python(script, "--image", "missing.jpg", "--speed", "3"),
+    }
+    results = {}
+    failures = []
+    try:
+        for name, call in runs.items():
+            try:
+                results[name] = measure(call, max(3, repeat // 10), warmup=1)
+            except subprocess.CalledProcessError as e:
+                results[name] = {"failed": f"exit status {e.returncode}"}
+                failures.append(f"{name} exited with status {e.returncode}")
+                continue
+            if results[name]["p50_ms"] > budget_ms:
+                failures.append(f"{name} took {results[name]['p50_ms']:.0f} ms "
+                                f"(budget {budget_ms:.0f} ms)")
+
+        check = ("import sys, process_demo; "
+                 f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+        checked = subprocess.run([sys.executable, "-c", check], cwd=workdir, env=env,
+                                 capture_output=True, text=True)
+        if checked.returncode:
+            error = (checked.stderr.strip().splitlines() or ["no output"])[-1]
+            results["startup.heavy_modules"] = {"failed": error}
+            failures.append(f"importing process_demo failed: {error}")
+        else:
+            loaded = [m for m in checked.stdout.strip().split(",") if m]
+            results["startup.heavy_modules"] = {"loaded": loaded}
+            if loaded:
+                failures.append(f"importing process_demo loads {', '.join(loaded)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results, failures
+
+
+# --- Recognition and storage ---
+
+class _NoText:
+    """Stand-in OCR reader, used when only the detection stages are measured"""
+
+    def readtext(self, image):
+        return []
+
+
+def bench_recognition(repeat, size=(1280, 720), ocr=True):
+    from plate_recognition import PlateRecognizer
+    from preprocessing import Preprocessor
+
+    frame, _ = synthetic_frame("BM12345", size)
+    results = {}
+    for label, detect_width in (("full", None), ("640w", 640)):
+        preprocessor = Preprocessor(detect_width=detect_width)
+        recognizer = PlateRecognizer(_NoText(), preprocessor=preprocessor)
+        results[f"recognition.preprocess.{label}"] = measure(
+            lambda: preprocessor.edges(frame), repeat)
+        edges, scale = preprocessor.edges(frame)
+        edges = edges.copy()
+        results[f"recognition.contour_search.{label}"] = measure(
+            lambda: recognizer.candidates_from_edges(edges, scale), repeat)
+
+    if not ocr:
+        return results
+    try:
+        import easyocr
+    except ImportError:
+        results["recognition.ocr"] = {"skipped": "easyocr is not installed"}
+        return results
+
+    recognizer = PlateRecognizer(easyocr.Reader(['en'], verbose=False))
+    candidates = recognizer.find_candidates(frame)
+    # OCR and the end-to-end path are slow, so they get fewer samples
+    slow_repeat = max(3, repeat // 10)
+    results["recognition.ocr"] = measure(
+        lambda: recognizer.ocr_candidates(frame, candidates), slow_repeat, warmup=1)
+    results["recognition.process_license_plate"] = measure(
+        lambda: recognizer.read_plate(frame), slow_repeat, warmup=1)
+    return results
+
+
+def bench_storage(repeat, size=(1280, 720)):
+    from image_store import ImageStore
+
+    frame, _ = synthetic_frame("BM12345", size)
+    root = tempfile.mkdtemp(prefix="bench_images_")
+    counter = iter(range(10 ** 9))
+    try:
+        store = ImageStore(root)
+        data = store.encode(frame)
+        source = os.path.join(root, "source.jpg")
+        with open(source, "wb") as f:
+            f.write(data)
+
+        def save_new():
+            # Change a few pixels so every save writes a new file
+            frame[0, :4, 0] = list(next(counter).to_bytes(4, "little"))
+            store.save(frame)
+
+        def thumbnail():
+            image_path = os.path.join(root, "thumb_source.jpg")
+            os.remove(store.make_thumbnail(image_path, data=data))
+
+        return {
+            "storage.encode": measure(lambda: store.encode(frame), repeat),
+            "storage.save": measure(save_new, repeat),
+            "storage.save_file": measure(lambda: store.save_file(source, data=data), repeat),
+            "storage.thumbnail_from_bytes": measure(thumbnail, repeat)
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+# --- Database ---
+
+def build_database(path, rows, seed=0):
+    """Create a database with `rows` violations, generated inside SQLite"""
+    drivers = max(100, rows // VIOLATIONS_PER_DRIVER)
+    manager = DatabaseManager(path)
+    conn = manager.get_connection()
+    with conn:
+        conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO drivers (name, license_plate, email, violation_count, plate_key)
+        SELECT 'Driver ' || i, printf('BM%07d', i), printf('driver%d@example.com', i), 0,
+               plate_key(printf('BM%07d', i))
+        FROM n
+        ''', (drivers,))
+        # One violation every 30 seconds, ending today; speeds 7.0-21.9 m/s
+        start = int(time.time()) - rows * 30
+        conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO violations (driver_id, speed, timestamp, image_path)
+        SELECT (i * 7919) % ? + 1, 7.0 + (i % 150) / 10.0,
+               strftime('%Y%m%d_%H%M%S', ? + i * 30, 'unixepoch'),
+               printf('captured_images/%08d.jpg', i)
+        FROM n
+        ''', (rows, drivers, start))
+        conn.execute('''
+        UPDATE drivers SET violation_count =
+            (SELECT COUNT(*) FROM violations WHERE driver_id = drivers.id)
+        ''')
+    conn.execute("ANALYZE")
+    manager.close()
+    return drivers
+
+
+def open_database(data_dir, rows):
+    """Reuse a generated database of this size, or build it"""
+    path = os.path.join(data_dir, f"bench_{rows}.db")
+    if not os.path.exists(path):
+        print(f"Generating database with {rows} violations...", file=sys.stderr)
+        started = time.perf_counter()
+        build_database(path + ".tmp", rows)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + ".tmp" + suffix):
+                os.remove(path + ".tmp" + suffix)
+        os.replace(path + ".tmp", path)
+        print(f"  done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return path
+
+
+def bench_db(path, rows, repeat):
+    rng = random.Random(rows)
+    # Approximate matching is opt-in; enable it so misreads are timed too
+    db = DatabaseManager(path, plate_match_distance=1)
+    drivers = db.get_connection().execute("SELECT MAX(id) FROM drivers").fetchone()[0]
+    plates = [f"BM{rng.randint(1, drivers):07d}" for _ in range(1000)]
+    plate_iter = iter(plates * (repeat * 1000))
+    prefix = f"db.{rows}"
+    results = {}
+
+    def violation():
+        return {
+            "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
+            "speed": 12.5,
+            "license_plate": rng.choice(plates),
+            "image_path": "captured_images/bench.jpg"
+        }
+
+    # Cached and uncached plate lookups
+    results[f"{prefix}.get_driver_info"] = measure(
+        lambda: db.get_driver_info(next(plate_iter)), repeat, number=20)
+    db.plate_cache.clear()
+    results[f"{prefix}.get_driver_info.uncached"] = measure(
+        lambda: (db.plate_cache.clear(), db.get_driver_info(next(plate_iter))), repeat, number=20)
+
+    # Misreads that match no plate exactly or by key go to the approximate
+    # index; the first one loads every driver into it
+    def load_index():
+        db._plate_index = None
+        db.plate_index()
+    results[f"{prefix}.plate_index.load"] = measure(load_index, 1, warmup=0)
+    # One character replaced by a letter the plates never contain
+    misreads = [plate[:n] + "X" + plate[n + 1:]
+                for plate, n in zip(plates, (rng.randrange(2, 9) for _ in plates))]
+    misread_iter = iter(misreads * (repeat * 1000))
+    results[f"{prefix}.get_driver_info.misread"] = measure(
+        lambda: (db.plate_cache.clear(), db.get_driver_info(next(misread_iter))), repeat, number=20)
+
+    results[f"{prefix}.get_violations"] = measure(lambda: db.get_violations(10), repeat)
+    results[f"{prefix}.get_top_speeders"] = measure(lambda: db.get_top_speeders(5), repeat)
+    latest = db.get_latest_violation_id()
+    results[f"{prefix}.get_violations_since"] = measure(
+        lambda: db.get_violations_since(latest - 500), repeat)
+    results[f"{prefix}.iter_violations"] = measure(
+        lambda: list(db.iter_violations(limit=100)), repeat)
+    # A cursor halfway through the table, as deep pages would use
+    cursor = tuple(db.get_connection().execute(
+        "SELECT timestamp, id FROM violations WHERE id = ?", (rows // 2,)).fetchone())
+    results[f"{prefix}.iter_violations.cursor"] = measure(
+        lambda: list(db.iter_violations(after=cursor, limit=100)), repeat)
+    results[f"{prefix}.iter_violations.plate"] = measure(
+        lambda: list(db.iter_violations(plate=rng.choice(plates), limit=100)), repeat)
+    results[f"{prefix}.iter_drivers"] = measure(
+        lambda: list(db.iter_drivers(after=drivers // 2, limit=100)), repeat)
+    results[f"{prefix}.get_stats_summary"] = measure(db.get_stats_summary, repeat)
+    results[f"{prefix}.get_violation_counts"] = measure(
+        lambda: db.get_violation_counts("hour", limit=24), repeat)
+    results[f"{prefix}.get_speed_histogram"] = measure(db.get_speed_histogram, repeat)
+    results[f"{prefix}.get_driver_stats"] = measure(
+        lambda: db.get_driver_stats(rng.choice(plates)), repeat)
+    if drivers <= 100000:
+        # A full dump at 1M+ rows measures the disk, not the query
+        results[f"{prefix}.get_all_drivers"] = measure(db.get_all_drivers, max(3, repeat // 10))
+
+    results[f"{prefix}.add_violation"] = measure(lambda: db.add_violation(violation()), repeat)
+    results[f"{prefix}.add_violations.50"] = measure(
+        lambda: db.add_violations([violation() for _ in range(50)]), max(3, repeat // 5))
+    results[f"{prefix}.update_driver"] = measure(
+        lambda: db.update_driver(rng.choice(plates), email="bench@example.com"), repeat)
+
+    # Delete only the rows this run added, so the database stays reusable
+    added = [r[0] for r in db.get_connection().execute(
+        "SELECT id FROM violations WHERE id > ? ORDER BY id", (latest,))]
+    deletes = iter(added)
+    results[f"{prefix}.delete_violation"] = measure(
+        lambda: db.delete_violation(next(deletes)), min(repeat, len(added) // 2), warmup=0)
+    for violation_id in deletes:
+        db.delete_violation(violation_id)
+    db.close()
+    return results
+
+
+# --- API ---
+
+def bench_api(path, rows, repeat):
+    import app as dashboard
+
+    # Point the dashboard at the generated database
+    dashboard.db = DatabaseManager(path)
+    dashboard._response_cache.clear()
+    client = dashboard.app.test_client()
+    prefix = f"api.{rows}"
+    results = {}
+
+    def get(url, headers=None, cold=False):
+        def call():
+            if cold:
+                dashboard._response_cache.clear()
+            response = client.get(url, headers=headers)
+            response.get_data()
+            assert response.status_code in (200, 304), (url, response.status_code)
+        return call
+
+    results[f"{prefix}.violations.cold"] = measure(get("/api/violations", cold=True), repeat)
+    results[f"{prefix}.violations.cached"] = measure(get("/api/violations"), repeat)
+    etag = client.get("/api/violations").headers.get("ETag")
+    results[f"{prefix}.violations.not_modified"] = measure(
+        get("/api/violations", {"If-None-Match": etag}), repeat)
+    results[f"{prefix}.violations.page_1000"] = measure(
+        get("/api/violations?limit=1000", cold=True), max(3, repeat // 5))
+    results[f"{prefix}.violations.ndjson_10000"] = measure(
+        get("/api/violations?format=ndjson&limit=10000"), max(3, repeat // 10))
+    results[f"{prefix}.top_speeders.cold"] = measure(get("/api/top-speeders", cold=True), repeat)
+    results[f"{prefix}.drivers"] = measure(get("/api/drivers"), repeat)
+    results[f"{prefix}.stats_summary.cold"] = measure(get("/api/stats/summary", cold=True), repeat)
+    results[f"{prefix}.stats_daily.cold"] = measure(get("/api/stats/daily", cold=True), repeat)
+    results[f"{prefix}.stats_speeds.cold"] = measure(get("/api/stats/speeds", cold=True), repeat)
+    dashboard.db.close()
+    return results
+
+
+# --- Running and comparing ---
+
+def run(groups, sizes, data_dir, repeat, ocr=True, startup_budget_ms=200.0):
+    results = {}
+    failures = []
+    for group in groups:
+        try:
+            if group == "startup":
+                startup, startup_failures = bench_startup(repeat, startup_budget_ms)
+                results.update(startup)
+                failures += startup_failures
+            elif group == "recognition":
+                results.update(bench_recognition(repeat, ocr=ocr))
+            elif group == "storage":
+                results.update(bench_storage(repeat))
+            else:
+                for rows in sizes:
+                    path = open_database(data_dir, rows)
+                    if group == "db":
+                        results.update(bench_db(path, rows, repeat))
+                    else:
+                        results.update(bench_api(path, rows, repeat))
+        except ImportError as e:
+            results[group] = {"skipped": f"missing dependency: {e.name}"}
+        print(f"Finished {group} benchmarks", file=sys.stderr)
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "sizes": list(sizes),
+            "repeat": repeat
+        },
+        "results": results,
+        "budget_failures": failures
+    }
+
+
+def compare(results, baseline, tolerance=0.25, metric="p50_ms"):
+    """Return (name, baseline, current) for every benchmark slower than baseline
+
+    A benchmark regresses when its metric grows by more than tolerance
+    (0.25 = 25%). Benchmarks missing from either run are ignored.
+    """
+    regressions = []
+    for name, base in baseline["results"].items():
+        current = results["results"].get(name)
+        if not current or metric not in base or metric not in current:
+            continue
+        if current[metric] > base[metric] * (1 + tolerance):
+            regressions.append((name, base[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the speed monitor hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks and write JSON results")
+    run_parser.add_argument('--groups', default=",".join(GROUPS),
+                            help=f'Comma-separated groups to run ({", ".join(GROUPS)})')
+    run_parser.add_argument('--sizes', default=",".join(str(s) for s in DEFAULT_SIZES),
+                            help='Comma-separated violation counts for the db and api groups')
+    run_parser.add_argument('--data-dir', default="bench_data",
+                            help='Where generated databases are kept between runs')
+    run_parser.add_argument('--repeat', type=int, default=50, help='Samples per benchmark')
+    run_parser.add_argument('--no-ocr', action='store_true', help='Skip the OCR benchmarks')
+    run_parser.add_argument('--startup-budget-ms', type=float, default=200.0,
+                            help='Largest allowed p50 for process_demo cold starts')
+    run_parser.add_argument('--output', help='Write results to this JSON file')
+    run_parser.add_argument('--baseline', help='Compare against this results file')
+    run_parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown against the baseline (0.25 = 25%%)')
+
+    gen_parser = commands.add_parser("generate", help="Write synthetic plate images or video")
+    gen_parser.add_argument('--images', help='Directory for JPEGs and a manifest.csv')
+    gen_parser.add_argument('--video', help='Path of an MP4 drive-by video')
+    gen_parser.add_argument('--count', type=int, default=100, help='Images or frames to write')
+    gen_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        if not (args.images or args.video):
+            gen_parser.error("--images or --video is required")
+        if args.images:
+            print(f"Wrote {write_images(args.images, args.count, seed=args.seed)}")
+        if args.video:
+            print(f"Wrote {write_video(args.video, args.count, seed=args.seed)}")
+        return
+
+    groups = [g for g in args.groups.split(",") if g]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        run_parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    results = run(groups, sizes, args.data_dir, args.repeat, ocr=not args.no_ocr,
+                  startup_budget_ms=args.startup_budget_ms)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    for failure in results["budget_failures"]:
+        print(f"BUDGET {failure}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+        if not regressions:
+            print("No regressions against baseline", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    if results["budget_failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
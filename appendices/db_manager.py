@@ -1,19 +1,139 @@
 import sqlite3
+import threading
+import queue
+import time
+import atexit
+from collections import Counter, OrderedDict
 from datetime import datetime
 import os
+import metrics
+from plate_index import PlateIndex, normalize_plate
 
-class DatabaseManager:
-    def __init__(self, db_path="speed_monitor.db"):
-        self.db_path = db_path
-        self.init_database()
+# Rollup buckets keyed by a prefix of the YYYYmmdd_HHMMSS timestamp; "all"
+# holds all-time totals under an empty bucket
+ROLLUP_PERIODS = {
+    "hour": "substr({row}.timestamp, 1, 11)",
+    "day": "substr({row}.timestamp, 1, 8)",
+    "all": "''",
+}
+# Speed histograms use 1 m/s bins; everything from MAX_SPEED_BIN up shares the last
+MAX_SPEED_BIN = 40
+SPEED_BIN = "min(CAST({row}.speed AS INTEGER), %d)" % MAX_SPEED_BIN
 
-    def init_database(self):
-        """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
 
-        # Create drivers table
-        cursor.execute('''
+def _rollup_statements():
+    """Rollup tables, the triggers that keep them current, and their backfill
+
+    Triggers run inside the statement that fires them, so rollups change in
+    the same transaction as every insert and delete, whichever code path or
+    process makes it.
+    """
+    statements = [
+        # Violation count and speed total per time bucket
+        '''
+        CREATE TABLE IF NOT EXISTS violation_counts (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            speed_sum REAL NOT NULL,
+            PRIMARY KEY (period, bucket)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS speed_histogram (
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            speed_bin INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (period, bucket, speed_bin)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS driver_speed_histogram (
+            driver_id INTEGER NOT NULL,
+            speed_bin INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            speed_sum REAL NOT NULL,
+            PRIMARY KEY (driver_id, speed_bin)
+        ) WITHOUT ROWID
+        ''',
+    ]
+
+    on_insert = []
+    for period, bucket in ROLLUP_PERIODS.items():
+        new_bucket = bucket.format(row="NEW")
+        new_bin = SPEED_BIN.format(row="NEW")
+        on_insert += [
+            f"INSERT INTO violation_counts VALUES ('{period}', {new_bucket}, 1, NEW.speed) "
+            "ON CONFLICT (period, bucket) DO UPDATE SET count = count + 1, speed_sum = speed_sum + NEW.speed;",
+            f"INSERT INTO speed_histogram VALUES ('{period}', {new_bucket}, {new_bin}, 1) "
+            "ON CONFLICT (period, bucket, speed_bin) DO UPDATE SET count = count + 1;",
+        ]
+        statements += [
+            f'''
+            INSERT INTO violation_counts
+            SELECT '{period}', {bucket.format(row="v")}, COUNT(*), SUM(v.speed)
+            FROM violations v WHERE v.driver_id IS NOT NULL GROUP BY 2
+            ''',
+            f'''
+            INSERT INTO speed_histogram
+            SELECT '{period}', {bucket.format(row="v")}, {SPEED_BIN.format(row="v")}, COUNT(*)
+            FROM violations v WHERE v.driver_id IS NOT NULL GROUP BY 2, 3
+            ''',
+        ]
+
+    on_insert.append(
+        f"INSERT INTO driver_speed_histogram VALUES (NEW.driver_id, {SPEED_BIN.format(row='NEW')}, "
+        "1, NEW.speed) ON CONFLICT (driver_id, speed_bin) DO UPDATE SET count = count + 1, speed_sum = speed_sum + NEW.speed;")
+    statements += [
+        f'''
+        INSERT INTO driver_speed_histogram
+        SELECT v.driver_id, {SPEED_BIN.format(row="v")}, COUNT(*), SUM(v.speed)
+        FROM violations v WHERE v.driver_id IS NOT NULL GROUP BY 1, 2
+        ''',
+        "CREATE TRIGGER IF NOT EXISTS violations_rollup_insert AFTER INSERT ON violations\n"
+        "WHEN NEW.driver_id IS NOT NULL BEGIN\n" + "\n".join(on_insert) + "\nEND",
+        _rollup_delete_trigger(),
+    ]
+    return statements
+
+
+def _rollup_delete_trigger(condition="OLD.driver_id IS NOT NULL"):
+    """Trigger that takes deleted violations out of every rollup and violation_count"""
+    on_delete = []
+    for period, bucket in ROLLUP_PERIODS.items():
+        old_bucket = bucket.format(row="OLD")
+        old_bin = SPEED_BIN.format(row="OLD")
+        on_delete += [
+            "UPDATE violation_counts SET count = count - 1, speed_sum = speed_sum - OLD.speed "
+            f"WHERE period = '{period}' AND bucket = {old_bucket};",
+            f"DELETE FROM violation_counts WHERE period = '{period}' AND bucket = {old_bucket} "
+            "AND count <= 0;",
+            "UPDATE speed_histogram SET count = count - 1 "
+            f"WHERE period = '{period}' AND bucket = {old_bucket} AND speed_bin = {old_bin};",
+            f"DELETE FROM speed_histogram WHERE period = '{period}' AND bucket = {old_bucket} "
+            f"AND speed_bin = {old_bin} AND count <= 0;",
+        ]
+    on_delete += [
+        "UPDATE driver_speed_histogram SET count = count - 1, speed_sum = speed_sum - OLD.speed "
+        f"WHERE driver_id = OLD.driver_id AND speed_bin = {SPEED_BIN.format(row='OLD')};",
+        "DELETE FROM driver_speed_histogram WHERE driver_id = OLD.driver_id "
+        f"AND speed_bin = {SPEED_BIN.format(row='OLD')} AND count <= 0;",
+        # add_violation increments violation_count itself
+        "UPDATE drivers SET violation_count = violation_count - 1 WHERE id = OLD.driver_id;",
+    ]
+    return ("CREATE TRIGGER IF NOT EXISTS violations_rollup_delete AFTER DELETE ON violations\n"
+            f"WHEN {condition} BEGIN\n" + "\n".join(on_delete) + "\nEND")
+
+
+ROLLUP_MIGRATION = _rollup_statements()
+
+# Schema migrations as (version, description, statements). The applied
+# version is stored in PRAGMA user_version; append new entries, never edit
+# ones that have shipped.
+MIGRATIONS = [
+    (1, "create drivers and violations tables", [
+        '''
         CREATE TABLE IF NOT EXISTS drivers (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -22,10 +142,8 @@ class DatabaseManager:
             violation_count INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-        ''')
-
-        # Create violations table
-        cursor.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS violations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             driver_id INTEGER,
@@ -34,100 +152,791 @@ class DatabaseManager:
             image_path TEXT NOT NULL,
             FOREIGN KEY (driver_id) REFERENCES drivers (id)
         )
-        ''')
+        ''',
+    ]),
+    (2, "indexes for dashboard and violation queries", [
+        # Covers get_violations: walked backwards for ORDER BY timestamp DESC
+        '''
+        CREATE INDEX IF NOT EXISTS idx_violations_timestamp
+        ON violations (timestamp, driver_id, speed, image_path)
+        ''',
+        # Joins and lookups from a driver to their violations
+        '''
+        CREATE INDEX IF NOT EXISTS idx_violations_driver_id
+        ON violations (driver_id, timestamp)
+        ''',
+        # Covers get_top_speeders
+        '''
+        CREATE INDEX IF NOT EXISTS idx_drivers_violation_count
+        ON drivers (violation_count, name, license_plate)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_drivers_created_at
+        ON drivers (created_at)
+        ''',
+    ]),
+    (3, "email outbox", [
+        # Notifications waiting for the background sender. next_attempt_at
+        # (epoch seconds) doubles as the claim lease and the retry backoff.
+        '''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            speed REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            image_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+        ON email_outbox (status, next_attempt_at)
+        ''',
+    ]),
+    (4, "keyset pagination index for violations", [
+        # Replaces idx_violations_timestamp: with id right after timestamp the
+        # index also orders the (timestamp, id) keyset used by iter_violations
+        "DROP INDEX IF EXISTS idx_violations_timestamp",
+        '''
+        CREATE INDEX IF NOT EXISTS idx_violations_timestamp_id
+        ON violations (timestamp, id, driver_id, speed, image_path)
+        ''',
+    ]),
+    (5, "violation rollups", ROLLUP_MIGRATION),
+    (6, "image path index for retention", [
+        # Content-addressed images can be shared, so a file is only removed
+        # once no violation refers to it
+        '''
+        CREATE INDEX IF NOT EXISTS idx_violations_image_path
+        ON violations (image_path)
+        ''',
+    ]),
+    (7, "normalized plate keys", [
+        # plate_key() is normalize_plate(), registered on every connection
+        '''ALTER TABLE drivers ADD COLUMN plate_key TEXT''',
+        '''UPDATE drivers SET plate_key = plate_key(license_plate)''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_drivers_plate_key
+        ON drivers (plate_key)
+        ''',
+    ]),
+    (8, "let archiving deletes skip the rollup trigger", [
+        # delete_violations(archive=True) adds a row here and removes it in
+        # the same transaction, so no other connection ever sees it
+        '''
+        CREATE TABLE IF NOT EXISTS archiving (
+            active INTEGER NOT NULL
+        )
+        ''',
+        "DROP TRIGGER IF EXISTS violations_rollup_delete",
+        _rollup_delete_trigger("OLD.driver_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM archiving)"),
+    ]),
+]
 
-        conn.commit()
-        conn.close()
+DRIVER_BY_PLATE_QUERY = '''
+SELECT id, name, email, violation_count, license_plate
+FROM drivers
+WHERE license_plate = ?
+'''
+
+# Two rows means the key is shared and the read is ambiguous
+DRIVER_BY_KEY_QUERY = '''
+SELECT id, name, email, violation_count, license_plate
+FROM drivers
+WHERE plate_key = ?
+LIMIT 2
+'''
+
+DRIVER_BY_ID_QUERY = '''
+SELECT id, name, email, violation_count, license_plate
+FROM drivers
+WHERE id = ?
+'''
+
+PLATE_KEYS_AFTER_QUERY = '''
+SELECT id, plate_key FROM drivers WHERE id > ? ORDER BY id
+'''
+
+RECENT_VIOLATIONS_QUERY = '''
+SELECT v.id, v.timestamp, v.speed, d.name, d.license_plate, v.image_path
+FROM violations v
+JOIN drivers d ON v.driver_id = d.id
+ORDER BY v.timestamp DESC
+LIMIT ?
+'''
+
+VIOLATIONS_SINCE_QUERY = '''
+SELECT v.id, v.timestamp, v.speed, d.name, d.license_plate, v.image_path
+FROM violations v
+JOIN drivers d ON v.driver_id = d.id
+WHERE v.id > ?
+ORDER BY v.id
+LIMIT ?
+'''
+
+TOP_SPEEDERS_QUERY = '''
+SELECT name, license_plate, violation_count
+FROM drivers
+ORDER BY violation_count DESC
+LIMIT ?
+'''
+
+INSERT_VIOLATION_QUERY = '''
+INSERT INTO violations (driver_id, speed, timestamp, image_path)
+VALUES (?, ?, ?, ?)
+'''
+
+# Re-importing a plate updates its name and email and keeps its id and
+# violation count
+UPSERT_DRIVER_QUERY = '''
+INSERT INTO drivers (name, license_plate, email, plate_key)
+VALUES (?, ?, ?, ?)
+ON CONFLICT (license_plate) DO UPDATE SET name = excluded.name, email = excluded.email
+'''
+
+ALL_DRIVERS_QUERY = '''
+SELECT name, license_plate, email, violation_count, created_at
+FROM drivers
+ORDER BY created_at DESC
+'''
+
+DUE_EMAILS_QUERY = '''
+SELECT id, recipient, speed, timestamp, image_path, attempts
+FROM email_outbox
+WHERE status = 'pending' AND next_attempt_at <= ?
+ORDER BY next_attempt_at
+LIMIT ?
+'''
+
+DUE_EMAIL_BY_ID_QUERY = '''
+SELECT id, recipient, speed, timestamp, image_path, attempts
+FROM email_outbox
+WHERE status = 'pending' AND next_attempt_at <= ? AND id = ?
+'''
+
+VIOLATION_COUNTS_QUERY = '''
+SELECT bucket, count, speed_sum
+FROM violation_counts
+WHERE period = ? AND bucket >= ? AND bucket < ?
+ORDER BY bucket DESC
+LIMIT ?
+'''
+
+STATS_SUMMARY_QUERY = '''
+SELECT period, count, speed_sum
+FROM violation_counts
+WHERE (period = 'all' AND bucket = '')
+   OR (period = 'day' AND bucket = ?)
+   OR (period = 'hour' AND bucket = ?)
+'''
+
+SPEED_HISTOGRAM_QUERY = '''
+SELECT speed_bin, count
+FROM speed_histogram
+WHERE period = ? AND bucket = ?
+ORDER BY speed_bin
+'''
+
+DRIVER_HISTOGRAM_QUERY = '''
+SELECT speed_bin, count, speed_sum
+FROM driver_speed_histogram
+WHERE driver_id = ?
+ORDER BY speed_bin
+'''
+
+def _recount_statements():
+    """Rebuild every rollup and violation_count from the violations left"""
+    statements = [
+        '''
+        UPDATE drivers SET violation_count =
+            (SELECT COUNT(*) FROM violations v WHERE v.driver_id = drivers.id)
+        ''',
+        "DELETE FROM violation_counts",
+        "DELETE FROM speed_histogram",
+        "DELETE FROM driver_speed_histogram",
+    ]
+    # The same backfill the rollup migration ran
+    return statements + [statement for statement in ROLLUP_MIGRATION
+                         if statement.lstrip().startswith("INSERT")]
+
+
+RECOUNT_STATEMENTS = _recount_statements()
+
+IMAGE_IN_USE_QUERY = '''
+SELECT EXISTS (SELECT 1 FROM violations WHERE image_path = ?)
+    OR EXISTS (SELECT 1 FROM email_outbox WHERE status = 'pending' AND image_path = ?)
+'''
+
+
+def driver_page_query(after=None, plate=None, since=None, until=None, limit=None):
+    """Build the keyset query for drivers, newest first, after a driver id"""
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append("id < ?")
+        params.append(after)
+    if plate:
+        conditions.append("license_plate = ?")
+        params.append(plate)
+    if since:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("created_at < ?")
+        params.append(until)
+    query = '''
+    SELECT id, name, license_plate, email, violation_count, created_at
+    FROM drivers
+    '''
+    if conditions:
+        query += "WHERE " + " AND ".join(conditions) + "\n"
+    query += "ORDER BY id DESC\n"
+    if limit is not None:
+        query += "LIMIT ?"
+        params.append(limit)
+    return query, tuple(params)
+
+
+def violation_page_query(after=None, plate=None, since=None, until=None, limit=None):
+    """Build the keyset query for violations, newest first, after a (timestamp, id) cursor"""
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append("(v.timestamp, v.id) < (?, ?)")
+        params.extend(after)
+    if plate:
+        # Resolving the plate first lets the (driver_id, timestamp) index
+        # serve both the filter and the ordering
+        conditions.append("v.driver_id = (SELECT id FROM drivers WHERE license_plate = ?)")
+        params.append(plate)
+    if since:
+        conditions.append("v.timestamp >= ?")
+        params.append(since)
+    if until:
+        conditions.append("v.timestamp < ?")
+        params.append(until)
+    query = '''
+    SELECT v.id, v.timestamp, v.speed, d.name, d.license_plate, v.image_path
+    FROM violations v
+    JOIN drivers d ON v.driver_id = d.id
+    '''
+    if conditions:
+        query += "WHERE " + " AND ".join(conditions) + "\n"
+    query += "ORDER BY v.timestamp DESC, v.id DESC\n"
+    if limit is not None:
+        query += "LIMIT ?"
+        params.append(limit)
+    return query, tuple(params)
+
+
+# Queries that must stay index-backed, checked by check_query_plans()
+HOT_QUERIES = {
+    "get_driver_info": (DRIVER_BY_PLATE_QUERY, ("ABC123",)),
+    "match_plate_key": (DRIVER_BY_KEY_QUERY, ("A8C123",)),
+    "match_plate_id": (DRIVER_BY_ID_QUERY, (1,)),
+    "load_plate_index": (PLATE_KEYS_AFTER_QUERY, (0,)),
+    "get_violations": (RECENT_VIOLATIONS_QUERY, (10,)),
+    "get_violations_since": (VIOLATIONS_SINCE_QUERY, (1000, 500)),
+    "get_top_speeders": (TOP_SPEEDERS_QUERY, (5,)),
+    "get_all_drivers": (ALL_DRIVERS_QUERY, ()),
+    "claim_emails": (DUE_EMAILS_QUERY, (0.0, 10)),
+    "iter_drivers": driver_page_query(after=1000, limit=100),
+    "iter_violations": violation_page_query(after=("20250101_000000", 1000), limit=100),
+    "iter_violations_by_plate": violation_page_query(plate="ABC123", limit=100),
+    "iter_violations_by_time": violation_page_query(since="20250101_000000",
+                                                    until="20250102_000000", limit=100),
+    "get_violation_counts": (VIOLATION_COUNTS_QUERY, ("hour", "", "~", 24)),
+    "get_stats_summary": (STATS_SUMMARY_QUERY, ("20250101", "20250101_00")),
+    "get_speed_histogram": (SPEED_HISTOGRAM_QUERY, ("day", "20250101")),
+    "get_driver_stats": (DRIVER_HISTOGRAM_QUERY, (1,)),
+    "image_in_use": (IMAGE_IN_USE_QUERY, ("captured_images/x.jpg", "captured_images/x.jpg")),
+}
+
+class DatabaseManager:
+    # Database files this process has already brought up to date, so each
+    # file's schema is checked once per process rather than per manager
+    _migrated_files = set()
+    _migrated_lock = threading.Lock()
+
+    def __init__(self, db_path="speed_monitor.db", busy_timeout=5.0, cached_statements=128,
+                 plate_cache_size=1024, plate_cache_ttl=300.0, remove_image=None,
+                 plate_match_distance=0):
+        self.db_path = db_path
+        # Seconds a writer waits on a locked database before giving up
+        self.busy_timeout = busy_timeout
+        # Number of compiled statements each connection keeps for reuse
+        self.cached_statements = cached_statements
+
+        # One long-lived connection per thread, so the capture loop and the
+        # dashboard threads never share a connection or pay setup per call.
+        # (thread, connection) pairs; connections of threads that have
+        # exited, such as finished Flask request threads, are closed as new
+        # ones open.
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        # Plate -> driver records, so repeat offenders skip the lookup query
+        self.plate_cache = PlateCache(plate_cache_size, plate_cache_ttl,
+                                      version=self.get_data_version)
+
+        # Plates that match no driver exactly or by plate key are matched
+        # within this edit distance. Off (0) by default: a plate one edit
+        # from a registered one may be a different, unregistered vehicle,
+        # and its violation would be charged to the wrong driver. The index
+        # is built on the first such lookup, so processes that only look up
+        # exact plates never hold it in memory.
+        self.plate_match_distance = plate_match_distance
+        self._plate_index = None
+        self._plate_index_lock = threading.Lock()
+
+        # Monotonic counter of driver/violation changes, for response caches
+        self.data_version = 0
+        self.data_changed_at = time.time()
+        self._data_version_lock = threading.Lock()
+        # Dedicated connection whose PRAGMA data_version reveals commits made
+        # by other connections, including other processes such as the monitor
+        self._watch_conn = None
+        self._watch_seen = None
+
+        # Called with an image path once deletes leave no violation or pending
+        # email using it; ImageStore.remove also drops the thumbnail
+        self.remove_image = remove_image or os.remove
+
+        # Callbacks fired with each violation after its insert commits
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+
+        self.init_database()
+
+    def get_connection(self):
+        """Get the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+            # Only takes effect on a new, empty database, so it must come
+            # before the WAL switch writes the header. Lets the retention job
+            # return freed pages without a full VACUUM.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL lets readers run alongside the violation writer
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Lets SQL (migrations, bulk copies) compute plate keys
+            conn.create_function("plate_key", 1, normalize_plate, deterministic=True)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.conn = conn
+            with self._connections_lock:
+                live = []
+                for thread, pooled in self._connections:
+                    if thread.is_alive():
+                        live.append((thread, pooled))
+                    else:
+                        pooled.close()
+                live.append((threading.current_thread(), conn))
+                self._connections = live
+        return conn
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._data_version_lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
+        with self._connections_lock:
+            for _, conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def get_data_version(self):
+        """Return a counter that changes whenever drivers or violations may have changed"""
+        with self._data_version_lock:
+            if self._watch_conn is None:
+                self._watch_conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                                   check_same_thread=False)
+            seen = self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+            if seen != self._watch_seen:
+                if self._watch_seen is not None:
+                    self._bump_data_version()
+                self._watch_seen = seen
+            return self.data_version
+
+    def _bump_data_version(self):
+        self.data_version += 1
+        self.data_changed_at = time.time()
 
+    def _data_changed(self):
+        with self._data_version_lock:
+            self._bump_data_version()
+
+    def subscribe(self, callback):
+        """Call callback(violation) after every committed violation insert
+
+        Callbacks run on the writing thread, so they must return quickly.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _publish(self, violations):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            for violation in violations:
+                try:
+                    callback(violation)
+                except Exception as e:
+                    print(f"Error in violation subscriber: {str(e)}")
+
+    def init_database(self):
+        """Initialize database with required tables, once per file and process"""
+        key = self._file_key()
+        with self._migrated_lock:
+            if key is not None and key in self._migrated_files:
+                return
+        self.migrate()
+        key = self._file_key()
+        if key is not None:
+            with self._migrated_lock:
+                self._migrated_files.add(key)
+
+    def _file_key(self):
+        # The inode tells a recreated file apart from the one already migrated
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (os.path.abspath(self.db_path), stat.st_dev, stat.st_ino)
+
+    def migrate(self):
+        """Apply pending schema migrations in version order"""
+        conn = self.get_connection()
+        # Up-to-date databases need a single PRAGMA read and no DDL
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= MIGRATIONS[-1][0]:
+            return
+        for version, description, statements in MIGRATIONS:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            # BEGIN IMMEDIATE takes the write lock up front, so two processes
+            # starting together cannot both apply the same migration
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {version}")
+                    print(f"Applied migration {version}: {description}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def check_query_plans(self):
+        """Return (query, plan detail) pairs for hot queries that scan a whole table"""
+        conn = self.get_connection()
+        problems = []
+        for name, (query, params) in HOT_QUERIES.items():
+            plan = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+            for row in plan:
+                detail = row[-1]
+                # "SCAN CONSTANT ROW" is a SELECT with no FROM, not a table scan
+                full_scan = (detail.startswith("SCAN") and "INDEX" not in detail
+                             and detail != "SCAN CONSTANT ROW")
+                if full_scan or "TEMP B-TREE" in detail:
+                    problems.append((name, detail))
+        return problems
+
+    @metrics.timed("db.add_driver")
     def add_driver(self, name, license_plate, email):
         """Add a new driver to the database"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
             cursor.execute('''
-            INSERT INTO drivers (name, license_plate, email)
-            VALUES (?, ?, ?)
-            ''', (name, license_plate, email))
+            INSERT INTO drivers (name, license_plate, email, plate_key)
+            VALUES (?, ?, ?, ?)
+            ''', (name, license_plate, email, normalize_plate(license_plate)))
             conn.commit()
+            # Misreads cached as unknown may match the new driver
+            self.plate_cache.clear()
+            self._data_changed()
             return True
         except sqlite3.IntegrityError:
+            conn.rollback()
             return False
-        finally:
-            conn.close()
 
+    @metrics.timed("db.upsert_drivers")
+    def upsert_drivers(self, drivers):
+        """Insert or update (name, license_plate, email) rows in one transaction
+
+        Returns (count, errors): how many rows were written, and
+        (index, message) for rows the database rejected. A rejected row does
+        not stop the rest of the batch.
+        """
+        if not drivers:
+            return 0, []
+        records = [(name, plate, email, normalize_plate(plate)) for name, plate, email in drivers]
+        conn = self.get_connection()
+        errors = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(UPSERT_DRIVER_QUERY, records)
+                written = len(records)
+            except sqlite3.IntegrityError:
+                # Retry row by row so only the offending rows are skipped
+                conn.rollback()
+                conn.execute("BEGIN IMMEDIATE")
+                written = 0
+                for n, record in enumerate(records):
+                    try:
+                        conn.execute(UPSERT_DRIVER_QUERY, record)
+                        written += 1
+                    except sqlite3.IntegrityError as e:
+                        errors.append((n, str(e)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if written:
+            self.plate_cache.clear()
+            self._data_changed()
+        return written, errors
+
+    @metrics.timed("db.get_driver_info")
     def get_driver_info(self, license_plate):
-        """Get driver information by license plate"""
-        conn = sqlite3.connect(self.db_path)
+        """Get driver information by license plate
+
+        OCR reads that match no plate exactly are matched by plate key and,
+        when plate_match_distance is set, by edit distance; license_plate in
+        the result is the registered plate.
+        """
+        found, driver = self.plate_cache.get(license_plate)
+        if found:
+            return driver
+
+        generation = self.plate_cache.generation
+        version = self.get_data_version()
+        conn = self.get_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''
-        SELECT id, name, email, violation_count
-        FROM drivers
-        WHERE license_plate = ?
-        ''', (license_plate,))
+        cursor.execute(DRIVER_BY_PLATE_QUERY, (license_plate,))
 
         result = cursor.fetchone()
-        conn.close()
 
-        if result:
-            return {
-                "id": result[0],
-                "name": result[1],
-                "email": result[2],
-                "violation_count": result[3]
-            }
-        return None
+        driver = self._driver_record(result) if result else self.match_plate(license_plate)
+        # Unknown plates are cached too, so repeated misreads stay cheap
+        # until the database next changes
+        self.plate_cache.put(license_plate, driver, generation, version)
+        return driver
+
+    @staticmethod
+    def _driver_record(row):
+        return {
+            "id": row[0],
+            "name": row[1],
+            "email": row[2],
+            "violation_count": row[3],
+            "license_plate": row[4]
+        }
+
+    @metrics.timed("db.match_plate")
+    def match_plate(self, license_plate):
+        """Find the driver for a plate read that has no exact match, or None
+
+        Tries the normalized plate key, then the nearest key within
+        plate_match_distance. Reads that fit two drivers equally well
+        match neither.
+        """
+        key = normalize_plate(license_plate)
+        if not key:
+            return None
+        conn = self.get_connection()
+        rows = conn.execute(DRIVER_BY_KEY_QUERY, (key,)).fetchall()
+        if len(rows) == 1:
+            metrics.count("db.plate_key_matches")
+            return self._driver_record(rows[0])
+        if rows or self.plate_match_distance <= 0:
+            return None
 
+        index = self.plate_index()
+        with metrics.timer("db.plate_index.lookup"):
+            match = index.lookup(key)
+        if match is None:
+            return None
+        row = conn.execute(DRIVER_BY_ID_QUERY, (match[0],)).fetchone()
+        if row is None:
+            # Deleted by another process since the index was loaded
+            index.remove(match[0])
+            return None
+        metrics.count("db.plate_fuzzy_matches")
+        return self._driver_record(row)
+
+    def plate_index(self):
+        """The approximate plate index, loading drivers added since the last call"""
+        with self._plate_index_lock:
+            if self._plate_index is None:
+                self._plate_index = PlateIndex(self.plate_match_distance)
+            index = self._plate_index
+            # Driver ids only grow, so new drivers, including those added by
+            # other processes, are picked up by id
+            with metrics.timer("db.plate_index.load"):
+                rows = self.get_connection().execute(PLATE_KEYS_AFTER_QUERY, (index.last_id,))
+                index.add_many(rows)
+        return index
+
+    @metrics.timed("db.add_violation")
     def add_violation(self, violation_data):
-        """Add a new violation record"""
-        conn = sqlite3.connect(self.db_path)
+        """Add a new violation record and return the matched driver, or None"""
+        license_plate = violation_data["license_plate"]
+        driver = self.get_driver_info(license_plate)
+        if not driver:
+            return None
+
+        conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
-            # Get driver ID
-            cursor.execute('''
-            SELECT id FROM drivers WHERE license_plate = ?
-            ''', (violation_data["license_plate"],))
+            # Add violation record
+            cursor.execute(INSERT_VIOLATION_QUERY, (driver["id"], violation_data["speed"],
+                  violation_data["timestamp"], violation_data["image_path"]))
+            violation_id = cursor.lastrowid
             
-            driver_id = cursor.fetchone()
+            # Update violation count
+            cursor.execute('''
+            UPDATE drivers
+            SET violation_count = violation_count + 1
+            WHERE id = ?
+            ''', (driver["id"],))
             
-            if driver_id:
-                # Add violation record
-                cursor.execute('''
-                INSERT INTO violations (driver_id, speed, timestamp, image_path)
-                VALUES (?, ?, ?, ?)
-                ''', (driver_id[0], violation_data["speed"], 
-                      violation_data["timestamp"], violation_data["image_path"]))
-                
-                # Update violation count
-                cursor.execute('''
-                UPDATE drivers
-                SET violation_count = violation_count + 1
-                WHERE id = ?
-                ''', (driver_id[0],))
-                
-                conn.commit()
-                return True
-            return False
-        finally:
-            conn.close()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # A misread and the registered plate are cached separately
+        for plate in {license_plate, driver["license_plate"]}:
+            self.plate_cache.add_violations(plate, 1)
+        self._data_changed()
+        self._publish([{
+            "id": violation_id,
+            "timestamp": violation_data["timestamp"],
+            "speed": violation_data["speed"],
+            "driver_name": driver["name"],
+            "license_plate": driver["license_plate"],
+            "image_path": violation_data["image_path"]
+        }])
+        driver["violation_count"] += 1
+        return driver
+
+    @metrics.timed("db.add_violations")
+    def add_violations(self, violations):
+        """Add a batch of violation records in a single transaction"""
+        if not violations:
+            return 0
+
+        conn = self.get_connection()
 
+        # Plates already in the cache need no lookup
+        driver_ids = {}
+        driver_names = {}
+        driver_plates = {}
+        missing = []
+        for plate in {v["license_plate"] for v in violations}:
+            found, driver = self.plate_cache.get(plate)
+            if not found:
+                missing.append(plate)
+            elif driver:
+                driver_ids[plate] = driver["id"]
+                driver_names[plate] = driver["name"]
+                driver_plates[plate] = driver["license_plate"]
+
+        try:
+            # Resolve the remaining plates up front, in chunks that stay
+            # under SQLite's bound-parameter limit
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(f'''
+                SELECT license_plate, id, name FROM drivers
+                WHERE license_plate IN ({placeholders})
+                ''', chunk)
+                for plate, driver_id, name in rows:
+                    driver_ids[plate] = driver_id
+                    driver_names[plate] = name
+                    driver_plates[plate] = plate
+            # Misreads are matched one by one, by plate key (or edit distance)
+            for plate in missing:
+                if plate not in driver_ids:
+                    driver = self.match_plate(plate)
+                    if driver:
+                        driver_ids[plate] = driver["id"]
+                        driver_names[plate] = driver["name"]
+                        driver_plates[plate] = driver["license_plate"]
+
+            records = [(driver_ids[v["license_plate"]], v["speed"],
+                        v["timestamp"], v["image_path"])
+                       for v in violations if v["license_plate"] in driver_ids]
+            counts = Counter(record[0] for record in records)
+
+            conn.executemany(INSERT_VIOLATION_QUERY, records)
+            # The write lock is held, so the batch got consecutive ids
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            conn.executemany('''
+            UPDATE drivers
+            SET violation_count = violation_count + ?
+            WHERE id = ?
+            ''', [(count, driver_id) for driver_id, count in counts.items()])
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # Each cached plate, misread or registered, gets its driver's total
+        cached = {}
+        for plate in {v["license_plate"] for v in violations if v["license_plate"] in driver_ids}:
+            cached[plate] = cached[driver_plates[plate]] = driver_ids[plate]
+        for plate, driver_id in cached.items():
+            self.plate_cache.add_violations(plate, counts[driver_id])
+        if records:
+            self._data_changed()
+            accepted = [v for v in violations if v["license_plate"] in driver_ids]
+            first_id = last_id - len(accepted) + 1
+            self._publish([{
+                "id": first_id + n,
+                "timestamp": v["timestamp"],
+                "speed": v["speed"],
+                "driver_name": driver_names[v["license_plate"]],
+                "license_plate": driver_plates[v["license_plate"]],
+                "image_path": v["image_path"]
+            } for n, v in enumerate(accepted)])
+        return len(records)
+
+    @metrics.timed("db.get_violations")
     def get_violations(self, limit=10):
         """Get recent violations"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''
-        SELECT v.id, v.timestamp, v.speed, d.name, d.license_plate, v.image_path
-        FROM violations v
-        JOIN drivers d ON v.driver_id = d.id
-        ORDER BY v.timestamp DESC
-        LIMIT ?
-        ''', (limit,))
+        cursor.execute(RECENT_VIOLATIONS_QUERY, (limit,))
 
         violations = cursor.fetchall()
-        conn.close()
 
         return [{
             "id": v[0],
@@ -138,20 +947,15 @@ class DatabaseManager:
             "image_path": v[5]
         } for v in violations]
 
+    @metrics.timed("db.get_top_speeders")
     def get_top_speeders(self, limit=5):
         """Get top speeders based on violation count"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''
-        SELECT name, license_plate, violation_count
-        FROM drivers
-        ORDER BY violation_count DESC
-        LIMIT ?
-        ''', (limit,))
+        cursor.execute(TOP_SPEEDERS_QUERY, (limit,))
 
         speeders = cursor.fetchall()
-        conn.close()
 
         return [{
             "name": s[0],
@@ -159,17 +963,13 @@ class DatabaseManager:
             "violation_count": s[2]
         } for s in speeders]
 
+    @metrics.timed("db.get_all_drivers")
     def get_all_drivers(self):
         """Get all drivers"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-        SELECT name, license_plate, email, violation_count, created_at
-        FROM drivers
-        ORDER BY created_at DESC
-        ''')
+        cursor.execute(ALL_DRIVERS_QUERY)
         drivers = cursor.fetchall()
-        conn.close()
         return [{
             "name": d[0],
             "license_plate": d[1],
@@ -178,9 +978,127 @@ class DatabaseManager:
             "created_at": d[4]
         } for d in drivers]
 
+    @metrics.timed("db.get_violations_since")
+    def get_violations_since(self, after_id, limit=500):
+        """Get violations with an id above after_id, oldest first"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(VIOLATIONS_SINCE_QUERY, (after_id, limit))
+        return [{
+            "id": v[0],
+            "timestamp": v[1],
+            "speed": v[2],
+            "driver_name": v[3],
+            "license_plate": v[4],
+            "image_path": v[5]
+        } for v in cursor.fetchall()]
+
+    def get_latest_violation_id(self):
+        """Get the highest violation id, or 0 when there are none"""
+        row = self.get_connection().execute("SELECT MAX(id) FROM violations").fetchone()
+        return row[0] or 0
+
+    def iter_drivers(self, after=None, plate=None, since=None, until=None, limit=None):
+        """Yield drivers newest first, streaming from an open cursor"""
+        query, params = driver_page_query(after, plate, since, until, limit)
+        cursor = self.get_connection().cursor()
+        try:
+            cursor.execute(query, params)
+            for d in cursor:
+                yield {
+                    "id": d[0],
+                    "name": d[1],
+                    "license_plate": d[2],
+                    "email": d[3],
+                    "violation_count": d[4],
+                    "created_at": d[5]
+                }
+        finally:
+            # Release the read snapshot even if the consumer stops early
+            cursor.close()
+
+    def iter_violations(self, after=None, plate=None, since=None, until=None, limit=None):
+        """Yield violations newest first, streaming from an open cursor"""
+        query, params = violation_page_query(after, plate, since, until, limit)
+        cursor = self.get_connection().cursor()
+        try:
+            cursor.execute(query, params)
+            for v in cursor:
+                yield {
+                    "id": v[0],
+                    "timestamp": v[1],
+                    "speed": v[2],
+                    "driver_name": v[3],
+                    "license_plate": v[4],
+                    "image_path": v[5]
+                }
+        finally:
+            cursor.close()
+
+    @metrics.timed("db.get_violation_counts")
+    def get_violation_counts(self, period="hour", since=None, until=None, limit=24):
+        """Violation count and average speed per hour or day, newest bucket first
+
+        since and until are bucket prefixes such as "20250101" or
+        "20250101_08"; rows come from the rollup table, so the cost depends
+        on limit rather than on the size of the history.
+        """
+        if period not in ("hour", "day"):
+            raise ValueError(f"Unknown rollup period: {period}")
+        conn = self.get_connection()
+        rows = conn.execute(VIOLATION_COUNTS_QUERY, (period, since or "", until or "~", limit))
+        return [{
+            "bucket": bucket,
+            "count": count,
+            "avg_speed": round(speed_sum / count, 2)
+        } for bucket, count, speed_sum in rows]
+
+    @metrics.timed("db.get_stats_summary")
+    def get_stats_summary(self):
+        """All-time, today's and this hour's violation counts and average speeds"""
+        now = datetime.now()
+        conn = self.get_connection()
+        rows = conn.execute(STATS_SUMMARY_QUERY, (now.strftime("%Y%m%d"), now.strftime("%Y%m%d_%H")))
+        summary = {period: {"count": 0, "avg_speed": None} for period in ("all", "day", "hour")}
+        for period, count, speed_sum in rows:
+            summary[period] = {"count": count, "avg_speed": round(speed_sum / count, 2)}
+        return {"total": summary["all"], "today": summary["day"], "this_hour": summary["hour"]}
+
+    @metrics.timed("db.get_speed_histogram")
+    def get_speed_histogram(self, period="all", bucket=""):
+        """Violations per 1 m/s speed bin for one hour, one day, or all time"""
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown rollup period: {period}")
+        conn = self.get_connection()
+        rows = conn.execute(SPEED_HISTOGRAM_QUERY, (period, "" if period == "all" else bucket))
+        return [{"speed_bin": speed_bin, "count": count} for speed_bin, count in rows]
+
+    @metrics.timed("db.get_driver_stats")
+    def get_driver_stats(self, license_plate):
+        """A driver's violation count, average speed and speed histogram, or None"""
+        driver = self.get_driver_info(license_plate)
+        if not driver:
+            return None
+        conn = self.get_connection()
+        histogram = []
+        total = 0
+        speed_sum = 0.0
+        for speed_bin, count, bin_sum in conn.execute(DRIVER_HISTOGRAM_QUERY, (driver["id"],)):
+            histogram.append({"speed_bin": speed_bin, "count": count})
+            total += count
+            speed_sum += bin_sum
+        return {
+            "name": driver["name"],
+            "license_plate": driver["license_plate"],
+            "violation_count": total,
+            "avg_speed": round(speed_sum / total, 2) if total else None,
+            "histogram": histogram
+        }
+
+    @metrics.timed("db.update_driver")
     def update_driver(self, license_plate, name=None, email=None):
         """Update driver information"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         updates = []
         params = []
@@ -191,32 +1109,378 @@ class DatabaseManager:
             updates.append("email = ?")
             params.append(email)
         if not updates:
-            conn.close()
             return False
         params.append(license_plate)
         query = f"UPDATE drivers SET {', '.join(updates)} WHERE license_plate = ?"
         cursor.execute(query, params)
         conn.commit()
+        # Cached misreads of this plate hold the old record too
+        self.plate_cache.clear()
         updated = cursor.rowcount > 0
-        conn.close()
+        if updated:
+            self._data_changed()
         return updated
 
-    def delete_driver(self, license_plate):
-        """Delete a driver by license plate"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''DELETE FROM drivers WHERE license_plate = ?''', (license_plate,))
-        conn.commit()
-        deleted = cursor.rowcount > 0
-        conn.close()
-        return deleted
+    @metrics.timed("db.delete_driver")
+    def delete_driver(self, license_plate, archive=False):
+        """Delete a driver by license plate, with their violations
+
+        The violations go in the same transaction, so none is left pointing
+        at a driver that no longer exists. They leave every rollup as
+        delete_violations does; with archive they keep counting in the
+        time rollups instead. The driver's own speed histogram is dropped
+        either way, and images nothing else uses are passed to remove_image.
+        """
+        conn = self.get_connection()
+        image_paths = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute('''SELECT id FROM drivers WHERE license_plate = ?''',
+                               (license_plate,)).fetchone()
+            if row:
+                violation_ids = [r[0] for r in conn.execute(
+                    "SELECT id FROM violations WHERE driver_id = ?", (row[0],))]
+                # Batched to stay under SQLite's bound parameter limit
+                for start in range(0, len(violation_ids), 500):
+                    batch_paths, _ = self._delete_violation_rows(
+                        conn, violation_ids[start:start + 500], archive)
+                    image_paths += batch_paths
+                conn.execute("DELETE FROM driver_speed_histogram WHERE driver_id = ?", (row[0],))
+                conn.execute("DELETE FROM drivers WHERE id = ?", (row[0],))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
+        self.plate_cache.clear()
+        if row:
+            if self._plate_index is not None:
+                self._plate_index.remove(row[0])
+            self._data_changed()
+            for image_path in set(image_paths):
+                self.release_image(image_path)
+        return row is not None
+
+    @metrics.timed("db.delete_violation")
     def delete_violation(self, violation_id):
-        """Delete a violation by id"""
-        conn = sqlite3.connect(self.db_path)
+        """Delete a violation by id, and its image if nothing else uses it"""
+        return self.delete_violations([violation_id]) > 0
+
+    @metrics.timed("db.delete_violations")
+    def delete_violations(self, violation_ids, remove_images=True, archive=False):
+        """Delete violations in one transaction; returns how many were deleted
+
+        The delete trigger updates every rollup and each driver's
+        violation_count in the same transaction. With archive, as used by
+        the retention job, the trigger is skipped and archived violations
+        keep counting in the rollups and violation_count. Images no
+        violation or pending email still uses are then passed to
+        remove_image.
+        """
+        if not violation_ids:
+            return 0
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            image_paths, deleted = self._delete_violation_rows(conn, violation_ids, archive)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if deleted:
+            if not archive:
+                # Misreads are cached under their own text as well as the
+                # registered plate, so every entry may hold an old count
+                self.plate_cache.clear()
+            self._data_changed()
+        if remove_images:
+            for image_path in set(image_paths):
+                self.release_image(image_path)
+        return deleted
+
+    @staticmethod
+    def _delete_violation_rows(conn, violation_ids, archive=False):
+        """Delete violations inside the caller's transaction
+
+        Returns (image_path of each row, number deleted).
+        """
+        placeholders = ", ".join("?" * len(violation_ids))
+        image_paths = [row[0] for row in conn.execute(
+            f"SELECT image_path FROM violations WHERE id IN ({placeholders})",
+            list(violation_ids))]
+        if archive:
+            conn.execute("INSERT INTO archiving VALUES (1)")
+        deleted = conn.execute(f"DELETE FROM violations WHERE id IN ({placeholders})",
+                               list(violation_ids)).rowcount
+        if archive:
+            conn.execute("DELETE FROM archiving")
+        return image_paths, deleted
+
+    @metrics.timed("db.recount_violations")
+    def recount_violations(self):
+        """Recompute violation_count and every rollup from the violations left
+
+        Archived violations keep counting until this drops them, e.g. after
+        the retention job has run.
+        """
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for statement in RECOUNT_STATEMENTS:
+                conn.execute(statement)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        # Cached drivers hold the old violation_count
+        self.plate_cache.clear()
+        self._data_changed()
+
+    def image_in_use(self, image_path):
+        """True if a violation or a pending email still refers to the image"""
+        conn = self.get_connection()
+        return bool(conn.execute(IMAGE_IN_USE_QUERY, (image_path, image_path)).fetchone()[0])
+
+    def release_image(self, image_path):
+        """Remove an image file if nothing refers to it any more; returns True if removed"""
+        if self.image_in_use(image_path):
+            return False
+        try:
+            self.remove_image(image_path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"Error removing image {image_path}: {str(e)}")
+            return False
+
+    @metrics.timed("db.enqueue_email")
+    def enqueue_email(self, recipient_email, speed, timestamp, image_path):
+        """Queue a violation notification for the background sender"""
+        conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''DELETE FROM violations WHERE id = ?''', (violation_id,))
+        cursor.execute('''
+        INSERT INTO email_outbox (recipient, speed, timestamp, image_path, next_attempt_at)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (recipient_email, speed, timestamp, image_path, time.time()))
         conn.commit()
-        deleted = cursor.rowcount > 0
-        conn.close()
-        return deleted 
\ No newline at end of file
+        return cursor.lastrowid
+
+    @metrics.timed("db.claim_emails")
+    def claim_emails(self, limit=10, lease=60.0, email_id=None):
+        """Claim due outbox messages by pushing their next attempt out by the lease
+
+        With email_id, only that message is claimed, if it is due.
+        """
+        conn = self.get_connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if email_id is None:
+                rows = conn.execute(DUE_EMAILS_QUERY, (now, limit)).fetchall()
+            else:
+                rows = conn.execute(DUE_EMAIL_BY_ID_QUERY, (now, email_id)).fetchall()
+            # A sender that dies mid-send leaves its claim to expire, after
+            # which the message is picked up again
+            conn.executemany('''
+            UPDATE email_outbox SET next_attempt_at = ? WHERE id = ?
+            ''', [(now + lease, row[0]) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return [{
+            "id": r[0],
+            "recipient": r[1],
+            "speed": r[2],
+            "timestamp": r[3],
+            "image_path": r[4],
+            "attempts": r[5]
+        } for r in rows]
+
+    @metrics.timed("db.mark_email_sent")
+    def mark_email_sent(self, email_id):
+        """Record a delivered outbox message"""
+        conn = self.get_connection()
+        conn.execute('''
+        UPDATE email_outbox
+        SET status = 'sent', attempts = attempts + 1, last_error = NULL
+        WHERE id = ?
+        ''', (email_id,))
+        conn.commit()
+
+    @metrics.timed("db.mark_email_failed")
+    def mark_email_failed(self, email_id, error, retry_at=None):
+        """Record a failed attempt; retry at retry_at, or give up if it is None"""
+        conn = self.get_connection()
+        conn.execute('''
+        UPDATE email_outbox
+        SET status = ?, attempts = attempts + 1, last_error = ?,
+            next_attempt_at = COALESCE(?, next_attempt_at)
+        WHERE id = ?
+        ''', ("pending" if retry_at is not None else "failed", error, retry_at, email_id))
+        conn.commit()
+
+
+class PlateCache:
+    """Bounded LRU cache of plate -> driver record with a time-to-live
+
+    version, if given, returns a counter that changes whenever the database
+    may have changed. A cached unknown plate is only trusted while it is
+    unchanged, so a driver added by another process is found on the next
+    lookup rather than after the TTL.
+    """
+
+    _MISSING = (False, None)
+
+    def __init__(self, maxsize=1024, ttl=300.0, version=None):
+        self.maxsize = maxsize
+        # Seconds before an entry is re-read, bounding staleness from writes
+        # made by other processes
+        self.ttl = ttl
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation; a lookup that raced one is not cached
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, plate):
+        """Return (found, driver); driver is None for a cached unknown plate"""
+        with self._lock:
+            entry = self._entries.get(plate)
+            if (entry is None or entry[0] < time.monotonic()
+                    or (entry[1] is None and entry[2] != self._version())):
+                if entry is not None:
+                    del self._entries[plate]
+                self.misses += 1
+                return self._MISSING
+            self._entries.move_to_end(plate)
+            self.hits += 1
+            driver = entry[1]
+            return True, dict(driver) if driver else None
+
+    def put(self, plate, driver, generation, version=None):
+        """Cache a lookup result unless an invalidation happened since it started
+
+        version is the database version read before the lookup, recorded
+        with unknown plates.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[plate] = (time.monotonic() + self.ttl,
+                                    dict(driver) if driver else None, version)
+            self._entries.move_to_end(plate)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _version(self):
+        return self.version() if self.version else None
+
+    def add_violations(self, plate, count):
+        """Keep a cached driver's violation_count in step with a committed insert"""
+        with self._lock:
+            entry = self._entries.get(plate)
+            if entry and entry[1]:
+                entry[1]["violation_count"] += count
+
+    def invalidate(self, plate):
+        """Drop a plate after its driver row changed"""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(plate, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize
+            }
+
+
+class ViolationWriter:
+    """Write-behind queue that hands violations to add_violations in batches"""
+
+    _STOP = object()
+
+    def __init__(self, db, batch_size=50, flush_interval=1.0, max_pending=10000):
+        self.db = db
+        # Flush once this many violations are queued...
+        self.batch_size = batch_size
+        # ...or once the oldest queued violation has waited this many seconds
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name="violation-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, violation_data):
+        """Queue a violation without waiting for the database"""
+        self.queue.put(violation_data)
+
+    def close(self, timeout=None):
+        """Flush everything still queued and stop the writer thread"""
+        if self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                if batch and not self._flush(batch):
+                    print(f"Dropped {len(batch)} violations that could not be written")
+                return
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                if self._flush(batch):
+                    batch = []
+                else:
+                    # Keep the batch and retry after another interval
+                    deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch):
+        try:
+            self.db.add_violations(batch)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error writing violations: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    # Query plan regression check: exits non-zero if a hot query scans a table
+    import sys
+
+    manager = DatabaseManager(sys.argv[1] if len(sys.argv) > 1 else "speed_monitor.db")
+    problems = manager.check_query_plans()
+    for name, detail in problems:
+        print(f"{name}: {detail}")
+    if problems:
+        sys.exit(1)
+    print("All hot queries are index-backed")
@@ -0,0 +1,203 @@
+"""Streaming bulk import and export of drivers as CSV or NDJSON
+
+    python driver_io.py import registry.csv --errors rejected.ndjson
+    python driver_io.py import registry.ndjson --batch-size 10000
+    python driver_io.py export drivers.csv
+    python driver_io.py export - --format ndjson
+
+Input is parsed a row at a time and written in batches, each batch one
+upsert transaction keyed on license_plate, so memory use does not grow
+with the file. Rows that fail validation or are rejected by the database
+are reported with their line number and skipped; the import carries on.
+The dashboard exposes the same functions as POST /api/drivers/import and
+GET /api/drivers/export.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from database.db_manager import DatabaseManager
+from plate_index import normalize_plate
+
+FIELDS = ("name", "license_plate", "email")
+EXPORT_FIELDS = ("id", "name", "license_plate", "email", "violation_count", "created_at")
+# Error rows kept in the returned report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def format_for(filename, default="csv"):
+    """Guess csv or ndjson from a file name"""
+    if filename and filename.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return default
+
+
+def read_rows(stream, fmt="csv"):
+    """Yield (line number, row dict or None, error or None) from a text stream"""
+    if fmt == "ndjson":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "expected a JSON object"
+                continue
+            yield line_number, row, None
+        return
+
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # line_num is the line the row ended on, which is the one to report
+        yield reader.line_num, row, None
+
+
+def validate(row):
+    """Return ((name, license_plate, email), None) or (None, error)"""
+    values = []
+    for field in FIELDS:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ""
+        if not value:
+            return None, f"missing {field}"
+        values.append(value)
+    name, license_plate, email = values
+    if not normalize_plate(license_plate):
+        return None, "license_plate has no letters or digits"
+    if "@" not in email:
+        return None, "invalid email"
+    return (name, license_plate, email), None
+
+
+def import_drivers(db, stream, fmt="csv", batch_size=5000, on_error=None):
+    """Upsert every valid row of a CSV or NDJSON stream; returns a report
+
+    on_error(line_number, message) is called for each rejected row as it is
+    found, so callers can log every error while the report keeps only the
+    first MAX_REPORTED_ERRORS.
+    """
+    report = {"rows": 0, "imported": 0, "rejected": 0, "errors": []}
+
+    def reject(line_number, message):
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "error": message})
+        if on_error:
+            on_error(line_number, message)
+
+    def flush(batch, lines):
+        written, errors = db.upsert_drivers(batch)
+        report["imported"] += written
+        for index, message in errors:
+            reject(lines[index], message)
+
+    batch = []
+    lines = []
+    for line_number, row, error in read_rows(stream, fmt):
+        report["rows"] += 1
+        if error is None:
+            record, error = validate(row)
+        if error is not None:
+            reject(line_number, error)
+            continue
+        batch.append(record)
+        lines.append(line_number)
+        if len(batch) >= batch_size:
+            flush(batch, lines)
+            batch, lines = [], []
+    flush(batch, lines)
+    return report
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back each written line"""
+
+    def __init__(self):
+        self.text = ""
+
+    def write(self, text):
+        self.text += text
+
+    def take(self):
+        text, self.text = self.text, ""
+        return text
+
+
+def export_drivers(db, fmt="csv", **filters):
+    """Yield the driver table as CSV or NDJSON text, one row at a time"""
+    rows = db.iter_drivers(**filters)
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(row) + "\n"
+        return
+
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.take()
+    for row in rows:
+        writer.writerow([row[field] for field in EXPORT_FIELDS])
+        yield buffer.take()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export drivers.")
+    parser.add_argument('--db', default="speed_monitor.db", help='Database file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='Insert or update drivers from a file')
+    import_parser.add_argument('path', help='CSV or NDJSON file, or - for standard input')
+    import_parser.add_argument('--format', choices=('csv', 'ndjson'),
+                               help='Input format (default: from the file name, else csv)')
+    import_parser.add_argument('--batch-size', type=int, default=5000, help='Rows per transaction')
+    import_parser.add_argument('--errors', help='Write every rejected row to this NDJSON file')
+
+    export_parser = commands.add_parser('export', help='Write every driver to a file')
+    export_parser.add_argument('path', help='Output file, or - for standard output')
+    export_parser.add_argument('--format', choices=('csv', 'ndjson'),
+                               help='Output format (default: from the file name, else csv)')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.db)
+    fmt = args.format or format_for(args.path)
+
+    if args.command == 'export':
+        out = sys.stdout if args.path == '-' else open(args.path, 'w', newline='', encoding='utf-8')
+        try:
+            for chunk in export_drivers(db, fmt):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    errors_file = open(args.errors, 'w', encoding='utf-8') if args.errors else None
+
+    def log_error(line_number, message):
+        if errors_file:
+            errors_file.write(json.dumps({"line": line_number, "error": message}) + "\n")
+
+    source = (io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+              if args.path == '-' else open(args.path, newline='', encoding='utf-8'))
+    try:
+        report = import_drivers(db, source, fmt, batch_size=args.batch_size, on_error=log_error)
+    finally:
+        source.close()
+        if errors_file:
+            errors_file.close()
+    print(f"Imported {report['imported']} of {report['rows']} rows, "
+          f"{report['rejected']} rejected")
+    for error in report["errors"][:10]:
+        print(f"  line {error['line']}: {error['error']}")
+    if report["rejected"] > 10:
+        print(f"  ... {report['rejected'] - 10} more" + (f" in {args.errors}" if args.errors else ""))
+
+
+if __name__ == "__main__":
+    main()
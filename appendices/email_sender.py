@@ -3,14 +3,114 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 import os
+import threading
+import time
 from datetime import datetime
+import metrics
 
 class EmailSender:
-    def __init__(self, smtp_server="smtp.gmail.com", smtp_port=587):
+    def __init__(self, smtp_server="smtp.gmail.com", smtp_port=587, use_starttls=True,
+                 idle_timeout=60.0):
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.sender_email = os.getenv("EMAIL_USER")
         self.sender_password = os.getenv("EMAIL_PASSWORD")
+        # Disable for plain local relays and test servers such as aiosmtpd
+        self.use_starttls = use_starttls
+        # Seconds an unused connection stays open before it is closed
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def build_violation_message(self, recipient_email, speed, timestamp, image_path):
+        """Build the violation notice with the image attached"""
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = self.sender_email
+        msg['To'] = recipient_email
+        msg['Subject'] = "Speed Violation Notice"
+
+        # Format timestamp
+        violation_time = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
+        formatted_time = violation_time.strftime("%Y-%m-%d %H:%M:%S")
+
+        # Create email body
+        body = f"""
+        Dear Driver,
+
+        This is an automated notification regarding a speed violation detected on {formatted_time}.
+
+        Details of the violation:
+        - Speed: {speed:.1f} m/s
+        - Time: {formatted_time}
+
+        Please find attached the violation image for your reference.
+
+        This is an automated system. If you believe this is an error, please contact the traffic department.
+
+        Best regards,
+        Traffic Monitoring System
+        """
+
+        msg.attach(MIMEText(body, 'plain'))
+
+        # Attach violation image
+        with open(image_path, 'rb') as f:
+            img = MIMEImage(f.read())
+            img.add_header('Content-Disposition', 'attachment',
+                         filename=os.path.basename(image_path))
+            msg.attach(img)
+
+        return msg
+
+    def send_message(self, msg):
+        """Send over the shared connection, reconnecting once if it was dropped"""
+        with self._lock:
+            if self._server and time.monotonic() - self._last_used > self.idle_timeout:
+                self._disconnect()
+            for attempt in range(2):
+                if self._server is None:
+                    self._connect()
+                try:
+                    with metrics.timer("email.send"):
+                        self._server.send_message(msg)
+                    self._last_used = time.monotonic()
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._server = None
+                    if attempt:
+                        raise
+
+    def close(self):
+        """Close the shared connection"""
+        with self._lock:
+            self._disconnect()
+
+    def _connect(self):
+        with metrics.timer("email.connect"):
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+            try:
+                if self.use_starttls:
+                    server.starttls()
+                if self.sender_password:
+                    server.login(self.sender_email, self.sender_password)
+            except Exception:
+                server.close()
+                raise
+        metrics.count("email.connections")
+        self._server = server
+        self._last_used = time.monotonic()
+
+    def _disconnect(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except smtplib.SMTPException:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = None
 
     def send_violation_notification(self, recipient_email, speed, timestamp, image_path):
         """Send violation notification email"""
@@ -19,52 +119,127 @@ class EmailSender:
             return False
 
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.sender_email
-            msg['To'] = recipient_email
-            msg['Subject'] = "Speed Violation Notice"
+            msg = self.build_violation_message(recipient_email, speed, timestamp, image_path)
+
+            # Send email
+            self.send_message(msg)
+
+            print(f"Violation notification sent to {recipient_email}")
+            return True
 
-            # Format timestamp
-            violation_time = datetime.strptime(timestamp, "%Y%m%d_%H%M%S")
-            formatted_time = violation_time.strftime("%Y-%m-%d %H:%M:%S")
+        except Exception as e:
+            print(f"Error sending email: {str(e)}")
+            return False
 
-            # Create email body
-            body = f"""
-            Dear Driver,
 
-            This is an automated notification regarding a speed violation detected on {formatted_time}.
+class OutboxSender:
+    """Background thread that delivers queued notifications from the database outbox"""
 
-            Details of the violation:
-            - Speed: {speed:.1f} m/s
-            - Time: {formatted_time}
+    def __init__(self, db, email_sender=None, poll_interval=2.0, max_attempts=5,
+                 base_backoff=5.0, max_backoff=900.0, max_rate=1.0):
+        self.db = db
+        self.email_sender = email_sender or EmailSender()
+        # Seconds between outbox checks when nothing wakes the sender earlier
+        self.poll_interval = poll_interval
+        # Attempts before a message is marked failed
+        self.max_attempts = max_attempts
+        # Retry delay doubles from base_backoff up to max_backoff seconds
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # Messages per second, to stay under the provider's sending limits
+        self.max_rate = max_rate
+        self._next_send = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.thread = None
 
-            Please find attached the violation image for your reference.
+    def start(self):
+        """Start delivering in the background"""
+        if not self.email_sender.sender_email:
+            # Messages stay queued in the outbox until a sender is configured
+            print("Email credentials not configured")
+            return
+        self.thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+        self.thread.start()
 
-            This is an automated system. If you believe this is an error, please contact the traffic department.
+    def notify(self):
+        """Wake the sender after queueing a message"""
+        self._wake.set()
 
-            Best regards,
-            Traffic Monitoring System
-            """
+    def stop(self, timeout=None, drain=False):
+        """Stop the background thread, optionally delivering what is still due"""
+        self._stop.set()
+        self._wake.set()
+        if self.thread:
+            self.thread.join(timeout)
+        if drain:
+            self.send_pending()
+        self.email_sender.close()
 
-            msg.attach(MIMEText(body, 'plain'))
+    def send_pending(self, stop_event=None):
+        """Deliver every message that is currently due; returns how many were sent"""
+        if not self.email_sender.sender_email:
+            print("Email credentials not configured")
+            return 0
 
-            # Attach violation image
-            with open(image_path, 'rb') as f:
-                img = MIMEImage(f.read())
-                img.add_header('Content-Disposition', 'attachment', 
-                             filename=os.path.basename(image_path))
-                msg.attach(img)
+        sent = 0
+        while stop_event is None or not stop_event.is_set():
+            messages = self.db.claim_emails()
+            if not messages:
+                break
+            for message in messages:
+                if self._deliver(message):
+                    sent += 1
+        return sent
 
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(msg)
+    def send_now(self, email_id):
+        """Deliver one queued message right away; returns True if it was sent
 
-            print(f"Violation notification sent to {recipient_email}")
-            return True
+        A message that fails stays in the outbox with its retry scheduled,
+        for the background sender to pick up.
+        """
+        if not self.email_sender.sender_email:
+            print("Email credentials not configured")
+            return False
+        messages = self.db.claim_emails(email_id=email_id)
+        return bool(messages) and self._deliver(messages[0])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.send_pending(self._stop)
+            except Exception as e:
+                print(f"Error reading email outbox: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _deliver(self, message):
+        # Rate limit
+        delay = self._next_send - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_send = time.monotonic() + 1.0 / self.max_rate
 
+        try:
+            msg = self.email_sender.build_violation_message(
+                message["recipient"],
+                message["speed"],
+                message["timestamp"],
+                message["image_path"]
+            )
+            self.email_sender.send_message(msg)
         except Exception as e:
-            print(f"Error sending email: {str(e)}")
-            return False 
\ No newline at end of file
+            attempts = message["attempts"] + 1
+            retry_at = None
+            if attempts < self.max_attempts:
+                backoff = min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff)
+                retry_at = time.time() + backoff
+            self.db.mark_email_failed(message["id"], str(e), retry_at)
+            metrics.count("email.failed")
+            print(f"Error sending email to {message['recipient']}: {str(e)}")
+            return False
+
+        self.db.mark_email_sent(message["id"])
+        metrics.count("email.sent")
+        print(f"Violation notification sent to {message['recipient']}")
+        return True
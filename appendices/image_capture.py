@@ -9,17 +9,24 @@ if platform.system() == "Linux" and ("arm" in platform.machine() or "aarch64" in
     import time
     from picamera2 import Picamera2
     from datetime import datetime
-    import os
-    import json
-    from database.db_manager import DatabaseManager
-    from notification.email_sender import EmailSender
+    from database.db_manager import DatabaseManager, ViolationWriter
+    from notification.email_sender import EmailSender, OutboxSender
+    from pipeline import MonitorPipeline, format_stats
+    from plate_recognition import PlateRecognizer
+    from preprocessing import FrameRing, Preprocessor
+    import metrics
+    from image_store import ImageStore
+    from speed_source import GpioSpeedSource, SerialSpeedSource
 
     class SpeedMonitor:
-        def __init__(self):
-            # Initialize GPIO
-            GPIO.setmode(GPIO.BCM)
+        def __init__(self, write_behind=True, ocr_workers=2, stats_interval=30.0,
+                     recognizer_options=None, preprocess_options=None,
+                     image_store_options=None, speed_source=None, speed_port="/dev/ttyACM0"):
             self.speed_pin = 17  # GPIO pin for speed data
-            GPIO.setup(self.speed_pin, GPIO.IN)
+            # The Arduino's signal pin triggers capture through an edge
+            # interrupt, and its serial output gives the speed of each frame
+            self.speed_source = speed_source or GpioSpeedSource(
+                self.speed_pin, speeds=SerialSpeedSource(speed_port, triggers=False))
             
             # Initialize camera
             self.picam2 = Picamera2()
@@ -29,62 +36,70 @@ if platform.system() == "Linux" and ("arm" in platform.machine() or "aarch64" in
             
             # Initialize OCR
             self.reader = easyocr.Reader(['en'])
+            # Edges are found at the detection resolution inside the road ROI;
+            # OCR crops still come from the full-resolution frame
+            self.preprocessor = Preprocessor(**(preprocess_options or {}))
+            self.recognizer = PlateRecognizer(self.reader, preprocessor=self.preprocessor,
+                                              **(recognizer_options or {}))
             
             # Initialize database and email sender
             self.db = DatabaseManager()
             self.email_sender = EmailSender()
+            # Emails go through the database outbox and a background sender
+            # that keeps one SMTP connection open
+            self.outbox_sender = OutboxSender(self.db, self.email_sender)
             
-            # Create directory for captured images
-            self.image_dir = "captured_images"
-            os.makedirs(self.image_dir, exist_ok=True)
+            # Hand violations to a background writer instead of blocking on SQLite
+            self.violation_writer = ViolationWriter(self.db) if write_behind else None
+            
+            # Evidence JPEGs and thumbnails are encoded and written off the
+            # pipeline threads
+            self.image_store = ImageStore(**(image_store_options or {}))
             
             # Speed threshold (m/s)
             self.speed_threshold = 7.0
+            
+            # Capture, OCR and persistence run as separate stages so a slow
+            # readtext call or email never holds up the camera
+            self.pipeline = MonitorPipeline(self.capture_frame, self.recognize,
+                                            self.persist, ocr_workers=ocr_workers)
+            
+            # Capture writes into a ring of preallocated frames, sized to outlast
+            # every frame that can be queued, in OCR or on screen at once
+            self.frame_ring = FrameRing(self.pipeline.ocr_queue.maxsize + ocr_workers + 4)
+            
+            # Stage timings go to the stats log line and to a snapshot file that
+            # the dashboard's /metrics route serves
+            metrics.set_process("monitor")
+            metrics.gauge("ocr_queue.depth", self.pipeline.ocr_queue.qsize)
+            metrics.gauge("persist_queue.depth", self.pipeline.persist_queue.qsize)
+            metrics.gauge("image_store.pending", self.image_store.queue.qsize)
+            # Seconds between pipeline stats log lines
+            self.stats_interval = stats_interval
 
         def capture_image(self):
             """Capture image from PiCamera"""
-            frame = self.picam2.capture_array()
-            return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            with metrics.timer("capture"):
+                frame = self.picam2.capture_array()
+            buffer = self.frame_ring.next((frame.shape[0], frame.shape[1], 3))
+            return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=buffer)
 
         def process_license_plate(self, image):
             """Process image to detect and read license plate"""
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Apply Gaussian blur
-            blur = cv2.GaussianBlur(gray, (5, 5), 0)
-            
-            # Edge detection
-            edges = cv2.Canny(blur, 50, 150)
-            
-            # Find contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Find potential license plate regions
-            for contour in contours:
-                x, y, w, h = cv2.boundingRect(contour)
-                aspect_ratio = w / float(h)
-                
-                # License plates typically have aspect ratios between 2.0 and 5.0
-                if 2.0 < aspect_ratio < 5.0:
-                    plate_region = image[y:y+h, x:x+w]
-                    # Perform OCR on the region
-                    results = self.reader.readtext(plate_region)
-                    
-                    if results:
-                        return results[0][1]  # Return the detected text
-            
-            return None
+            return self.recognizer.read_plate(image)
 
-        def save_violation(self, speed, license_plate, image):
+        def save_violation(self, speed, license_plate, image, captured_at):
             """Save violation details and image"""
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            image_path = os.path.join(self.image_dir, f"violation_{timestamp}.jpg")
-            
-            # Save image
-            cv2.imwrite(image_path, image)
+            # Dated when the frame was captured, not when persist reached it
+            timestamp = datetime.fromtimestamp(captured_at).strftime("%Y%m%d_%H%M%S")
             
-            # Save to database
+            # The image store encodes and writes the frame on its own thread;
+            # the violation is recorded once the file exists
+            self.image_store.submit(image, lambda image_path: self.record_violation(
+                timestamp, speed, license_plate, image_path))
+    
+        def record_violation(self, timestamp, speed, license_plate, image_path):
+            """Store a violation whose image has been saved and queue the driver's email"""
             violation_data = {
                 "timestamp": timestamp,
                 "speed": speed,
@@ -92,43 +107,88 @@ if platform.system() == "Linux" and ("arm" in platform.machine() or "aarch64" in
                 "image_path": image_path
             }
             
-            self.db.add_violation(violation_data)
+            # add_violation returns the driver it matched; the write-behind path
+            # looks it up here, and the writer then reuses the cached record
+            if self.violation_writer:
+                self.violation_writer.put(violation_data)
+                driver_info = self.db.get_driver_info(license_plate)
+            else:
+                driver_info = self.db.add_violation(violation_data)
             
-            # Get driver info and send email
-            driver_info = self.db.get_driver_info(license_plate)
+            # Queue email
             if driver_info:
-                self.email_sender.send_violation_notification(
+                self.db.enqueue_email(
                     driver_info["email"],
                     speed,
                     timestamp,
                     image_path
                 )
+                self.outbox_sender.notify()
+
+        def capture_frame(self):
+            """Capture stage: grab a frame as soon as the speed source triggers"""
+            # Waits on the trigger event rather than polling the pin; the
+            # timeout only lets the pipeline notice a stop
+            if self.speed_source.wait_trigger(timeout=0.5) is None:
+                return None
+            image = self.capture_image()
+            # Monotonic time to match speed readings, wall-clock time to date
+            # the violation
+            return image, time.monotonic(), time.time()
+
+        def recognize(self, item):
+            """OCR stage: read the plate and return a violation, if any"""
+            image, captured_at, captured_time = item
+            license_plate = self.process_license_plate(image)
+            
+            if license_plate:
+                # The reading nearest the frame; by now any reading taken
+                # just after it has arrived as well
+                speed = self.speed_source.speed_at(captured_at)
+                if speed is None:
+                    metrics.count("speed.missing")
+                    print(f"No speed reading near the frame of {license_plate}")
+                    return None
+                
+                if speed > self.speed_threshold:
+                    # The frame's capture buffer is reused, so keep a copy
+                    return speed, license_plate, image.copy(), captured_time
+            return None
+
+        def persist(self, violation):
+            """Persistence stage: store the violation and notify the driver"""
+            speed, license_plate, image, captured_time = violation
+            self.save_violation(speed, license_plate, image, captured_time)
+
+        def print_stats(self):
+            """Log pipeline counters and per-stage timings"""
+            print(format_stats(self.pipeline.stats()))
+            print(metrics.registry.format_line())
+            if metrics.registry.enabled:
+                metrics.registry.write_snapshot()
 
         def run(self):
             """Main monitoring loop"""
             print("Starting speed monitoring system...")
             
+            self.speed_source.start()
+            self.pipeline.start()
+            self.outbox_sender.start()
             try:
-                while True:
-                    # Check if speed exceeds threshold
-                    if GPIO.input(self.speed_pin):
-                        # Capture image
-                        image = self.capture_image()
-                        
-                        # Process license plate
-                        license_plate = self.process_license_plate(image)
-                        
-                        if license_plate:
-                            # Get speed from Arduino (implement serial communication)
-                            speed = 0  # TODO: Implement serial communication
-                            
-                            if speed > self.speed_threshold:
-                                self.save_violation(speed, license_plate, image)
-                    
-                    time.sleep(0.1)  # Small delay to prevent CPU overload
+                while not self.pipeline.wait(self.stats_interval):
+                    self.print_stats()
                     
             except KeyboardInterrupt:
                 print("\nStopping speed monitoring system...")
+            finally:
+                self.pipeline.stop()
+                self.print_stats()
+                # Queued images are written first, since each one records its violation
+                self.image_store.close()
+                if self.violation_writer:
+                    self.violation_writer.close()
+                self.outbox_sender.stop()
+                self.speed_source.stop()
                 GPIO.cleanup()
                 self.picam2.stop()
 
@@ -138,7 +198,7 @@ if platform.system() == "Linux" and ("arm" in platform.machine() or "aarch64" in
 else:
     # Dummy class for non-Raspberry Pi systems to avoid import errors
     class SpeedMonitor:
-        def __init__(self):
+        def __init__(self, *args, **kwargs):
             print("SpeedMonitor is only supported on Raspberry Pi (Linux, ARM). This is a dummy class.")
         def run(self):
             print("SpeedMonitor cannot run on this platform.") 
\ No newline at end of file
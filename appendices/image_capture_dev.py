@@ -1,15 +1,24 @@
 import cv2
+import argparse
 import numpy as np
 import easyocr
 import time
 from datetime import datetime
-import os
-import json
-from database.db_manager import DatabaseManager
-from notification.email_sender import EmailSender
+from database.db_manager import DatabaseManager, ViolationWriter
+from notification.email_sender import EmailSender, OutboxSender
+from pipeline import MonitorPipeline, format_stats
+from plate_recognition import PlateRecognizer
+from preprocessing import FrameRing, Preprocessor
+from image_store import ImageStore
+from motion_gate import MotionGate
+from plate_tracker import PlateTracker
+from speed_source import SerialSpeedSource
+import metrics
 
 class SpeedMonitorDev:
-    def __init__(self):
+    def __init__(self, write_behind=True, ocr_workers=2, stats_interval=30.0,
+                 recognizer_options=None, motion_options=None, tracker_options=None,
+                 preprocess_options=None, image_store_options=None, speed_source=None):
         # Initialize camera (using webcam for development)
         self.cap = cv2.VideoCapture(0)
         if not self.cap.isOpened():
@@ -17,64 +26,86 @@ class SpeedMonitorDev:
         
         # Initialize OCR
         self.reader = easyocr.Reader(['en'])
+        # Edges are found at the detection resolution inside the road ROI;
+        # OCR crops still come from the full-resolution frame
+        self.preprocessor = Preprocessor(**(preprocess_options or {}))
+        self.recognizer = PlateRecognizer(self.reader, preprocessor=self.preprocessor,
+                                          **(recognizer_options or {}))
+        
+        # Skip OCR on static frames and crop it to the moving region otherwise
+        self.motion_gate = MotionGate(**(motion_options or {}))
+        
+        # Follow each vehicle across frames so it yields one violation
+        self.tracker = PlateTracker(**(tracker_options or {}))
         
         # Initialize database and email sender
         self.db = DatabaseManager()
         self.email_sender = EmailSender()
+        # Emails go through the database outbox and a background sender
+        # that keeps one SMTP connection open
+        self.outbox_sender = OutboxSender(self.db, self.email_sender)
+        
+        # Hand violations to a background writer instead of blocking on SQLite
+        self.violation_writer = ViolationWriter(self.db) if write_behind else None
         
-        # Create directory for captured images
-        self.image_dir = "captured_images"
-        os.makedirs(self.image_dir, exist_ok=True)
+        # Evidence JPEGs and thumbnails are encoded and written off the
+        # pipeline threads
+        self.image_store = ImageStore(**(image_store_options or {}))
         
         # Speed threshold (m/s)
         self.speed_threshold = 7.0
+        
+        # Speeds come from a speed source (e.g. the Arduino, or the pty
+        # stand-in from speed_source.py) if one is given, else are simulated
+        self.speed_source = speed_source
+        self.simulated_speed = 10.0
+        
+        # Capture, OCR and persistence run as separate stages so a slow
+        # readtext call or email never holds up the camera
+        self.pipeline = MonitorPipeline(self.capture_frame, self.recognize,
+                                        self.persist, ocr_workers=ocr_workers)
+        
+        # Capture writes into a ring of preallocated frames, sized to outlast
+        # every frame that can be queued, in OCR or on screen at once
+        self.frame_ring = FrameRing(self.pipeline.ocr_queue.maxsize + ocr_workers + 4)
+        
+        # Stage timings go to the stats log line and to a snapshot file that
+        # the dashboard's /metrics route serves
+        metrics.set_process("monitor-dev")
+        metrics.gauge("ocr_queue.depth", self.pipeline.ocr_queue.qsize)
+        metrics.gauge("persist_queue.depth", self.pipeline.persist_queue.qsize)
+        metrics.gauge("image_store.pending", self.image_store.queue.qsize)
+        self.latest_frame = None
+        self.frame_shape = None
+        # Seconds between pipeline stats log lines
+        self.stats_interval = stats_interval
 
     def capture_image(self):
         """Capture image from webcam"""
-        ret, frame = self.cap.read()
+        buffer = self.frame_ring.next(self.frame_shape) if self.frame_shape else None
+        with metrics.timer("capture"):
+            ret, frame = self.cap.read(buffer)
         if not ret:
             raise Exception("Failed to capture image")
+        self.frame_shape = frame.shape
         return frame
 
     def process_license_plate(self, image):
         """Process image to detect and read license plate"""
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply Gaussian blur
-        blur = cv2.GaussianBlur(gray, (5, 5), 0)
-        
-        # Edge detection
-        edges = cv2.Canny(blur, 50, 150)
-        
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Find potential license plate regions
-        for contour in contours:
-            x, y, w, h = cv2.boundingRect(contour)
-            aspect_ratio = w / float(h)
-            
-            # License plates typically have aspect ratios between 2.0 and 5.0
-            if 2.0 < aspect_ratio < 5.0:
-                plate_region = image[y:y+h, x:x+w]
-                # Perform OCR on the region
-                results = self.reader.readtext(plate_region)
-                
-                if results:
-                    return results[0][1]  # Return the detected text
-        
-        return None
+        return self.recognizer.read_plate(image)
 
-    def save_violation(self, speed, license_plate, image):
+    def save_violation(self, speed, license_plate, image, captured_at):
         """Save violation details and image"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        image_path = os.path.join(self.image_dir, f"violation_{timestamp}.jpg")
-        
-        # Save image
-        cv2.imwrite(image_path, image)
+        # Dated when the vehicle was first seen, not when the track expired
+        timestamp = datetime.fromtimestamp(captured_at).strftime("%Y%m%d_%H%M%S")
         
-        # Save to database
+        # The image store encodes and writes the frame on its own thread;
+        # the violation is recorded once the file exists
+        self.image_store.submit(image, lambda image_path: self.record_violation(
+            timestamp, speed, license_plate, image_path))
+
+    def record_violation(self, timestamp, speed, license_plate, image_path):
+        """Store a violation whose image has been saved and queue the driver's email"""
         violation_data = {
             "timestamp": timestamp,
             "speed": speed,
@@ -82,54 +113,127 @@ class SpeedMonitorDev:
             "image_path": image_path
         }
         
-        self.db.add_violation(violation_data)
+        # add_violation returns the driver it matched; the write-behind path
+        # looks it up here, and the writer then reuses the cached record
+        if self.violation_writer:
+            self.violation_writer.put(violation_data)
+            driver_info = self.db.get_driver_info(license_plate)
+        else:
+            driver_info = self.db.add_violation(violation_data)
         
-        # Get driver info and send email
-        driver_info = self.db.get_driver_info(license_plate)
+        # Queue email
         if driver_info:
-            self.email_sender.send_violation_notification(
+            self.db.enqueue_email(
                 driver_info["email"],
                 speed,
                 timestamp,
                 image_path
             )
+            self.outbox_sender.notify()
+
+    def capture_frame(self):
+        """Capture stage: grab the next frame and pass it on only if it needs OCR"""
+        image = self.capture_image()
+        captured_at = time.monotonic()
+        now = time.time()
+        self.latest_frame = image
+        
+        # Vehicles that have left the scene become one violation each
+        for track in self.tracker.expire(now):
+            self.pipeline.submit(track)
+        
+        with metrics.timer("motion_gate"):
+            region = self.motion_gate.check(image)
+        if region is None:
+            return None
+        
+        # Each plate candidate in the moving region follows its own track;
+        # tracks that already have a confident plate are not read again
+        jobs = self.tracker.assign(self.recognizer.find_candidates(image, region), now)
+        if not jobs:
+            return None
+        return image, jobs, captured_at
+
+    def recognize(self, item):
+        """OCR stage: add each candidate's plate read to its track"""
+        image, jobs, captured_at = item
+        plates = self.recognizer.read_each(image, [candidate for _, candidate in jobs])
+        if self.speed_source:
+            speed = self.speed_source.speed_at(captured_at)
+        else:
+            speed = self.simulated_speed
+        
+        for (track_id, _), plate in zip(jobs, plates):
+            if plate:
+                print(f"Detected license plate: {plate.text} (track {track_id})")
+                self.tracker.add_read(track_id, plate.text, plate.confidence, image, speed)
+        return None
+
+    def persist(self, track):
+        """Persistence stage: store a finished track's violation and notify the driver"""
+        if track.speed is not None and track.speed > self.speed_threshold:
+            self.save_violation(track.speed, track.plate(), track.best_frame, track.first_seen)
+
+    def print_stats(self):
+        """Log pipeline, motion gate and tracker counters"""
+        gate = self.motion_gate.stats()
+        tracks = self.tracker.stats()
+        print(f"{format_stats(self.pipeline.stats())} "
+              f"motion processed={gate['processed']} skipped={gate['skipped']} "
+              f"tracks open={tracks['open_tracks']} emitted={tracks['emitted']} "
+              f"ocr_skipped={tracks['ocr_skipped']}")
+        print(metrics.registry.format_line())
+        if metrics.registry.enabled:
+            metrics.registry.write_snapshot()
 
     def run(self):
         """Main monitoring loop"""
         print("Starting speed monitoring system (Development Mode)...")
         print("Press 'q' to quit")
         
+        if self.speed_source:
+            self.speed_source.start()
+        self.pipeline.start()
+        self.outbox_sender.start()
+        last_stats = time.time()
         try:
-            while True:
-                # Capture image
-                image = self.capture_image()
-                
-                # Display the image
-                cv2.imshow('Speed Monitor', image)
-                
-                # Process license plate
-                license_plate = self.process_license_plate(image)
-                
-                if license_plate:
-                    print(f"Detected license plate: {license_plate}")
-                    # For development, simulate speed detection
-                    speed = 10.0  # Simulated speed
-                    
-                    if speed > self.speed_threshold:
-                        self.save_violation(speed, license_plate, image)
+            # Capture runs on the pipeline thread; the main thread only
+            # displays frames, since HighGUI must stay on one thread
+            while self.pipeline.is_running():
+                if self.latest_frame is not None:
+                    cv2.imshow('Speed Monitor', self.latest_frame)
                 
                 # Check for quit command
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                if cv2.waitKey(30) & 0xFF == ord('q'):
                     break
                 
-                time.sleep(0.1)  # Small delay to prevent CPU overload
+                if time.time() - last_stats >= self.stats_interval:
+                    self.print_stats()
+                    last_stats = time.time()
                 
         except KeyboardInterrupt:
             print("\nStopping speed monitoring system...")
         finally:
+            self.pipeline.stop()
+            # Vehicles still in view when stopping get their violation too
+            for track in self.tracker.flush():
+                self.persist(track)
+            self.print_stats()
+            # Queued images are written first, since each one records its violation
+            self.image_store.close()
+            if self.violation_writer:
+                self.violation_writer.close()
+            self.outbox_sender.stop()
+            if self.speed_source:
+                self.speed_source.stop()
             self.cap.release()
             cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    monitor = SpeedMonitorDev()
-    monitor.run() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Speed monitor using a webcam.")
+    parser.add_argument('--speed-port',
+                        help='Serial port (or pty from speed_source.py simulate) to read speeds from')
+    args = parser.parse_args()
+    monitor = SpeedMonitorDev(
+        speed_source=SerialSpeedSource(args.speed_port) if args.speed_port else None)
+    monitor.run()
\ No newline at end of file
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import queue
+import threading
+import atexit
+import cv2
+import numpy as np
+import metrics
+
+# Leading bytes of the encoded formats that are stored as they are
+SIGNATURES = [
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"BM", ".bmp"),
+]
+
+
+def sniff_extension(data):
+    """Return the file extension for encoded image bytes, or None"""
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return None
+
+
+class ImageStore:
+    """Content-addressed storage for violation images and their thumbnails
+
+    Files are named after the SHA-256 of their bytes, so paths never collide
+    and storing the same image twice writes it once. Frames are JPEG-encoded
+    on a worker thread; inputs that are already encoded are copied byte for
+    byte.
+    """
+
+    _STOP = object()
+
+    def __init__(self, root="captured_images", quality=90, thumb_width=320,
+                 thumb_quality=75, max_pending=64):
+        self.root = root
+        self.thumb_root = os.path.join(root, "thumbs")
+        # JPEG quality (0-100) for evidence frames and thumbnails
+        self.quality = quality
+        self.thumb_quality = thumb_quality
+        # Thumbnails are scaled down to this width; smaller images are kept as is
+        self.thumb_width = thumb_width
+        os.makedirs(self.thumb_root, exist_ok=True)
+
+        self.saved = 0
+        self.deduplicated = 0
+        self.errors = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        # The worker starts with the first submit(), so readers such as the
+        # dashboard never run one
+        self.thread = None
+        self._start_lock = threading.Lock()
+
+    def path_for(self, data, extension=".jpg"):
+        """Content-addressed path for encoded bytes, fanned out by hash prefix"""
+        digest = hashlib.sha256(data).hexdigest()
+        return os.path.join(self.root, digest[:2], digest + extension)
+
+    def thumbnail_name(self, image_path):
+        """Thumbnail file name, relative to thumb_root, for a stored image"""
+        relative = os.path.relpath(image_path, self.root)
+        if relative.startswith(os.pardir):
+            relative = os.path.basename(image_path)
+        return os.path.splitext(relative)[0].replace(os.sep, "/") + ".jpg"
+
+    def thumbnail_path(self, image_path):
+        """Path of the JPEG thumbnail that belongs to a stored image"""
+        return os.path.join(self.thumb_root, self.thumbnail_name(image_path))
+
+    def image_for_thumbnail(self, thumbnail_name):
+        """Find the stored image a thumbnail name was made from, or None"""
+        stem = os.path.join(self.root, os.path.splitext(thumbnail_name)[0])
+        for _, extension in SIGNATURES:
+            if os.path.isfile(stem + extension):
+                return stem + extension
+        return None
+
+    def encode(self, image, quality=None):
+        """Encode a BGR frame as JPEG bytes"""
+        with metrics.timer("image_store.encode"):
+            ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY,
+                                                     quality or self.quality])
+        if not ok:
+            raise ValueError("Could not encode image")
+        return buffer.tobytes()
+
+    def write(self, data, extension=None, image=None):
+        """Store encoded bytes and a thumbnail; returns the image path
+
+        image is the decoded frame if the caller already has it, which saves
+        decoding the bytes again for the thumbnail.
+        """
+        extension = extension or sniff_extension(data) or ".jpg"
+        path = self.path_for(data, extension)
+        if os.path.exists(path):
+            self.deduplicated += 1
+        else:
+            with metrics.timer("image_store.write"):
+                self._write_file(path, data)
+            self.saved += 1
+        with metrics.timer("image_store.thumbnail"):
+            self.make_thumbnail(path, image=image, data=data)
+        return path
+
+    def save(self, image):
+        """Encode and store a frame on the calling thread; returns the image path"""
+        return self.write(self.encode(image), ".jpg", image=image)
+
+    def save_file(self, source_path, data=None, image=None):
+        """Copy an encoded image file byte for byte; returns the stored path
+
+        data is the file's bytes if the caller has already read them.
+        """
+        if data is None:
+            with open(source_path, "rb") as f:
+                data = f.read()
+        extension = sniff_extension(data)
+        if extension is None:
+            # Formats we do not recognise are normalised to JPEG
+            if image is None:
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"Could not read image: {source_path}")
+            return self.save(image)
+        return self.write(data, extension, image=image)
+
+    def submit(self, image, callback=None):
+        """Queue a frame for encoding; callback(image_path) runs once it is on disk
+
+        The frame must not be modified afterwards, so pass a copy of any
+        buffer that will be reused.
+        """
+        with self._start_lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="image-store", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+        self.queue.put((image, callback))
+
+    def make_thumbnail(self, image_path, image=None, data=None):
+        """Write the thumbnail for a stored image if it does not exist yet"""
+        thumb_path = self.thumbnail_path(image_path)
+        if os.path.exists(thumb_path):
+            return thumb_path
+        if image is None:
+            if data is None:
+                with open(image_path, "rb") as f:
+                    data = f.read()
+            # JPEG decoders can scale by 1/2-1/8 while decoding, which is far
+            # cheaper than a full decode for an image that is shrunk anyway
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+            if image is None:
+                raise ValueError(f"Could not read image: {image_path}")
+        height, width = image.shape[:2]
+        if width > self.thumb_width:
+            size = (self.thumb_width, max(1, int(height * self.thumb_width / float(width))))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        self._write_file(thumb_path, self.encode(image, self.thumb_quality))
+        return thumb_path
+
+    def remove(self, image_path):
+        """Delete a stored image and its thumbnail"""
+        try:
+            os.remove(self.thumbnail_path(image_path))
+        except FileNotFoundError:
+            pass
+        os.remove(image_path)
+
+    def disk_usage(self, image_path):
+        """Bytes used by an image and its thumbnail; 0 for files that are gone"""
+        total = 0
+        for path in (image_path, self.thumbnail_path(image_path)):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    def iter_images(self):
+        """Yield the path of every stored image, skipping thumbnails"""
+        for directory, subdirs, files in os.walk(self.root):
+            if os.path.abspath(directory) == os.path.abspath(self.root):
+                subdirs[:] = [d for d in subdirs if d != os.path.basename(self.thumb_root)]
+            for name in files:
+                if not name.endswith(".tmp"):
+                    yield os.path.join(directory, name)
+
+    def close(self, timeout=None):
+        """Write everything still queued and stop the worker thread"""
+        if self.thread and self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            "pending": self.queue.qsize(),
+            "saved": self.saved,
+            "deduplicated": self.deduplicated,
+            "errors": self.errors
+        }
+
+    def _write_file(self, path, data):
+        # Write to a temporary name and rename, so readers never see a
+        # partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            image, callback = item
+            try:
+                path = self.save(image)
+            except Exception as e:
+                self.errors += 1
+                metrics.count("image_store.errors")
+                print(f"Error saving image: {str(e)}")
+                continue
+            if callback:
+                try:
+                    callback(path)
+                except Exception as e:
+                    print(f"Error recording saved image: {str(e)}")
@@ -0,0 +1,289 @@
+"""Stage timers and counters, exported in the Prometheus text format
+
+Code under measurement uses the module-level helpers:
+
+    with metrics.timer("ocr"):
+        ...
+
+    @metrics.timed("db.add_violation")
+    def add_violation(...):
+
+    metrics.count("email.sent")
+
+Set SPEED_MONITOR_METRICS=0 (or call disable()) to turn collection off;
+timers then return a shared no-op object and cost one attribute check.
+
+Each process keeps its own registry. Processes without an HTTP server,
+such as the camera monitors, write a snapshot file that the dashboard's
+/metrics route serves alongside its own.
+"""
+import bisect
+import functools
+import glob
+import os
+import threading
+import time
+from collections import deque
+
+# Upper bounds, in seconds, of the exported latency buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "speed_monitor"
+# Where monitor processes write snapshots for the dashboard to pick up
+SNAPSHOT_DIR = os.getenv("SPEED_MONITOR_METRICS_DIR", "metrics")
+# Exported metric families: name -> (Prometheus type, help text)
+FAMILIES = {
+    "stage_seconds": ("histogram", "Time spent in each processing stage"),
+    "stage_quantile_seconds": ("gauge", "Recent p50/p95/p99 of each stage"),
+    "events_total": ("counter", "Events counted by each component"),
+    "gauge": ("gauge", "Current values such as queue depths"),
+}
+# Snapshots older than this many seconds belong to a stopped process
+SNAPSHOT_MAX_AGE = 300.0
+
+
+class Histogram:
+    """Cumulative latency buckets plus a window of recent samples for quantiles"""
+
+    def __init__(self, buckets=BUCKETS, window=1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+            self.recent.append(seconds)
+
+    def snapshot(self):
+        """Return (cumulative bucket counts, sum, count, {quantile: seconds})"""
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+            recent = sorted(self.recent)
+        cumulative = []
+        running = 0
+        for n in counts:
+            running += n
+            cumulative.append(running)
+        quantiles = {}
+        if recent:
+            for q in QUANTILES:
+                quantiles[q] = recent[min(len(recent) - 1, int(q * len(recent)))]
+        return cumulative, total, count, quantiles
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "started")
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Registry of stage histograms, event counters and gauges for one process"""
+
+    def __init__(self, enabled=True, process="app"):
+        self.enabled = enabled
+        # Label that keeps series from different processes apart
+        self.process = process
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(seconds)
+
+    def timer(self, name):
+        """Context manager that records the time spent in its block"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, callback):
+        """Export callback()'s current value, read whenever metrics are rendered"""
+        with self._lock:
+            self.gauges[name] = callback
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def render(self, snapshots=()):
+        """Return every metric in the Prometheus text exposition format
+
+        snapshots are render() outputs of other processes; their samples are
+        merged in so each metric family is declared once.
+        """
+        process = self.process
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+        samples = {family: [] for family in FAMILIES}
+
+        for name, histogram in histograms:
+            cumulative, total, count, quantiles = histogram.snapshot()
+            labels = f'process="{process}",stage="{name}"'
+            lines = samples["stage_seconds"]
+            for bound, n in zip(histogram.buckets, cumulative):
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{{labels},le="+Inf"}} {cumulative[-1]}')
+            lines.append(f"{PREFIX}_stage_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_count{{{labels}}} {count}")
+            for q, value in quantiles.items():
+                samples["stage_quantile_seconds"].append(
+                    f'{PREFIX}_stage_quantile_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+        for name, n in counters:
+            samples["events_total"].append(
+                f'{PREFIX}_events_total{{process="{process}",event="{name}"}} {n}')
+        for name, callback in gauges:
+            try:
+                value = float(callback())
+            except Exception:
+                continue
+            samples["gauge"].append(f'{PREFIX}_gauge{{process="{process}",name="{name}"}} {value:g}')
+
+        for text in snapshots:
+            for line in text.splitlines():
+                if not line or line.startswith("#"):
+                    continue
+                family = line.split("{", 1)[0][len(PREFIX) + 1:]
+                for suffix in ("_bucket", "_sum", "_count"):
+                    if family.startswith("stage_seconds") and family.endswith(suffix):
+                        family = "stage_seconds"
+                if family in samples:
+                    samples[family].append(line)
+
+        output = []
+        for family, (kind, description) in FAMILIES.items():
+            output.append(f"# HELP {PREFIX}_{family} {description}")
+            output.append(f"# TYPE {PREFIX}_{family} {kind}")
+            output += samples[family]
+        return "\n".join(output) + "\n"
+
+    def format_line(self):
+        """One log line with each stage's count and p50/p95/p99 in milliseconds"""
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        parts = []
+        for name, histogram in histograms:
+            _, _, count, quantiles = histogram.snapshot()
+            if quantiles:
+                p50, p95, p99 = (quantiles[q] * 1000.0 for q in QUANTILES)
+                parts.append(f"{name}={count}x {p50:.1f}/{p95:.1f}/{p99:.1f}ms")
+        parts += [f"{name}={n}" for name, n in counters]
+        return "metrics " + " ".join(parts) if parts else "metrics (none recorded)"
+
+    def write_snapshot(self, path=None):
+        """Write render() to a file for another process to serve"""
+        path = path or os.path.join(SNAPSHOT_DIR, f"{self.process}.prom")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+        return path
+
+
+def read_snapshots(directory=None, exclude=None):
+    """Return the text of recent snapshot files, skipping the named process"""
+    directory = directory or SNAPSHOT_DIR
+    texts = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.prom"))):
+        if exclude and os.path.basename(path) == f"{exclude}.prom":
+            continue
+        try:
+            if time.time() - os.path.getmtime(path) > SNAPSHOT_MAX_AGE:
+                continue
+            with open(path) as f:
+                texts.append(f.read())
+        except OSError:
+            continue
+    return texts
+
+
+registry = Metrics(enabled=os.getenv("SPEED_MONITOR_METRICS", "1") != "0")
+
+
+def timer(name):
+    return registry.timer(name)
+
+
+def timed(name):
+    """Decorator form of timer(); checks enabled on every call"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    registry.count(name, n)
+
+
+def gauge(name, callback):
+    registry.gauge(name, callback)
+
+
+def set_process(name):
+    """Name this process in exported labels and its snapshot file"""
+    registry.process = name
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
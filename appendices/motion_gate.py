@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap motion check on a downscaled frame, run before plate recognition
+
+    check() returns the moving region in full-resolution coordinates, or None
+    when the scene is static and OCR can be skipped.
+    """
+
+    def __init__(self, detect_width=160, method="diff", diff_threshold=25,
+                 min_motion_fraction=0.005, background_alpha=0.05, padding=0.15,
+                 warmup_frames=5):
+        # Width of the frame the gate works on; height keeps the aspect ratio
+        self.detect_width = detect_width
+        # "diff" compares against a running-average background; "mog2" uses
+        # OpenCV's Gaussian-mixture background subtractor
+        self.method = method
+        # Per-pixel brightness change (0-255) that counts as motion
+        self.diff_threshold = diff_threshold
+        # Fraction of the downscaled frame that must move to pass the gate
+        self.min_motion_fraction = min_motion_fraction
+        # How quickly the running-average background absorbs scene changes
+        self.background_alpha = background_alpha
+        # Extra margin around the moving region, as a fraction of its size
+        self.padding = padding
+        # Frames used to settle the background before the gate can skip
+        self.warmup_frames = warmup_frames
+
+        self.processed = 0
+        self.skipped = 0
+        self._frames = 0
+        self._background = None
+        self._subtractor = None
+        if method == "mog2":
+            self._subtractor = cv2.createBackgroundSubtractorMOG2(
+                history=200, varThreshold=diff_threshold * 2, detectShadows=False)
+        self._kernel = np.ones((3, 3), np.uint8)
+
+    def motion_mask(self, small_gray):
+        """Return a binary mask of moving pixels in the downscaled frame"""
+        if self._subtractor is not None:
+            return self._subtractor.apply(small_gray)
+
+        if self._background is None:
+            self._background = small_gray.astype(np.float32)
+        diff = cv2.absdiff(small_gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(small_gray, self._background, self.background_alpha)
+        _, mask = cv2.threshold(diff, self.diff_threshold, 255, cv2.THRESH_BINARY)
+        return mask
+
+    def check(self, frame):
+        """Return the moving region (x, y, w, h) at full resolution, or None"""
+        height, width = frame.shape[:2]
+        scale = self.detect_width / float(width)
+        small = cv2.resize(frame, (self.detect_width, max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        small_gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small_gray = cv2.GaussianBlur(small_gray, (5, 5), 0)
+
+        mask = self.motion_mask(small_gray)
+        mask = cv2.dilate(mask, self._kernel, iterations=2)
+        self._frames += 1
+
+        moving = cv2.countNonZero(mask)
+        if self._frames > self.warmup_frames and moving < self.min_motion_fraction * mask.size:
+            self.skipped += 1
+            return None
+        self.processed += 1
+
+        if self._frames <= self.warmup_frames or not moving:
+            return (0, 0, width, height)
+
+        # Map the moving area back to full resolution, with some margin so a
+        # plate at the edge of the motion is not clipped
+        x, y, w, h = cv2.boundingRect(cv2.findNonZero(mask))
+        pad_x = int(w * self.padding) + 1
+        pad_y = int(h * self.padding) + 1
+        x0 = max(0, int((x - pad_x) / scale))
+        y0 = max(0, int((y - pad_y) / scale))
+        x1 = min(width, int((x + w + pad_x) / scale))
+        y1 = min(height, int((y + h + pad_y) / scale))
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def stats(self):
+        """Return processed and skipped frame counters"""
+        total = self.processed + self.skipped
+        return {
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / total, 3) if total else 0.0
+        }
@@ -0,0 +1,365 @@
+"""Monitor several cameras in one process with a shared OCR worker pool
+
+    python multi_camera.py lane1=0 lane2=rtsp://localhost:8554/lane2 lane3=clip.mp4
+    python multi_camera.py --config cameras.json
+
+Each source is a device index, a video file or a stream URL, optionally
+prefixed with a camera name. The config file is a JSON list of camera
+objects with "name" and "source" plus any Camera options, e.g.
+
+    [{"name": "lane1", "source": 0, "speed_threshold": 7.0, "speed_port": "/dev/ttyACM0"},
+     {"name": "lane2", "source": "rtsp://localhost:8554/lane2",
+      "speed_threshold": 9.0, "motion_options": {"min_motion_fraction": 0.01}}]
+
+Every camera has its own capture thread, motion gate, plate tracker,
+threshold, speed detector and counters. A camera's speeds come from the
+serial port given as "speed_port" (or --speed-port lane1=/dev/ttyACM0);
+cameras without one treat every vehicle as moving at "simulated_speed".
+They share one EasyOCR model and a fixed set of OCR workers, whose queue
+serves the cameras in turn so a busy lane cannot starve a quiet one. For
+testing without an RTSP camera, any RTSP server can stand in, e.g.
+mediamtx fed by
+ffmpeg -re -stream_loop -1 -i clip.mp4 -f rtsp rtsp://localhost:8554/lane2
+"""
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import cv2
+import easyocr
+from database.db_manager import DatabaseManager, ViolationWriter
+from notification.email_sender import EmailSender, OutboxSender
+from pipeline import MonitorPipeline, format_stats
+from plate_recognition import PlateRecognizer
+from preprocessing import FrameRing, Preprocessor
+from image_store import ImageStore
+from motion_gate import MotionGate
+from plate_tracker import PlateTracker
+from speed_source import SerialSpeedSource
+import metrics
+
+
+def parse_source(source):
+    """Device indexes are given as digits; anything else is a path or URL"""
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class Camera:
+    """One capture source with its own gate, tracker, threshold and counters"""
+
+    def __init__(self, name, source, reader, speed_threshold=7.0, speed_port=None,
+                 simulated_speed=10.0, loop=False, reconnect_delay=2.0, ring_size=8,
+                 recognizer_options=None, motion_options=None, tracker_options=None,
+                 preprocess_options=None):
+        self.name = name
+        self.source = parse_source(source)
+        # Speed threshold (m/s)
+        self.speed_threshold = speed_threshold
+        # Speeds come from this lane's Arduino (or a pty from
+        # speed_source.py simulate). Without one, every vehicle is treated
+        # as moving at simulated_speed (m/s), as in development setups.
+        self.speed_source = SerialSpeedSource(speed_port) if speed_port else None
+        self.simulated_speed = simulated_speed
+        # Video files restart from the beginning instead of ending the camera
+        self.loop = loop
+        # Seconds to wait before reopening a device or stream that stopped
+        self.reconnect_delay = reconnect_delay
+        self.is_file = isinstance(self.source, str) and os.path.isfile(self.source)
+
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            raise Exception(f"Could not open camera {name}: {source}")
+
+        # ROI and detection width are per camera; the OCR model is shared
+        self.preprocessor = Preprocessor(**(preprocess_options or {}))
+        self.recognizer = PlateRecognizer(reader, preprocessor=self.preprocessor,
+                                          **(recognizer_options or {}))
+        self.motion_gate = MotionGate(**(motion_options or {}))
+        self.tracker = PlateTracker(**(tracker_options or {}))
+        self.frame_ring = FrameRing(ring_size)
+        self.frame_shape = None
+
+        self.counters = {
+            "frames": 0,
+            "ocr_frames": 0,
+            "reads": 0,
+            "violations": 0,
+            "reconnects": 0
+        }
+        self._counters_lock = threading.Lock()
+        self._last_frames = 0
+        self._last_time = time.time()
+
+    def read(self):
+        """Grab the next frame, or None while a stream reconnects"""
+        buffer = self.frame_ring.next(self.frame_shape) if self.frame_shape else None
+        with metrics.timer(f"camera.{self.name}.capture"):
+            ret, frame = self.cap.read(buffer)
+        if ret:
+            self.frame_shape = frame.shape
+            self.count("frames")
+            return frame
+
+        if self.is_file:
+            if not self.loop:
+                raise Exception("End of video")
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return None
+        # Devices and network streams drop out; reopen rather than give up
+        self.count("reconnects")
+        print(f"Camera {self.name} stopped delivering frames, reconnecting")
+        self.cap.release()
+        time.sleep(self.reconnect_delay)
+        self.cap = cv2.VideoCapture(self.source)
+        return None
+
+    def speed_at(self, captured_at):
+        """Speed (m/s) of the vehicle in a frame captured at this monotonic time"""
+        if self.speed_source is None:
+            return self.simulated_speed
+        return self.speed_source.speed_at(captured_at)
+
+    def count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def fps(self):
+        """Frames per second captured since the previous call"""
+        now = time.time()
+        frames = self.counters["frames"]
+        rate = (frames - self._last_frames) / max(now - self._last_time, 1e-6)
+        self._last_frames, self._last_time = frames, now
+        return rate
+
+    def release(self):
+        self.cap.release()
+        if self.speed_source:
+            self.speed_source.stop()
+
+
+class MultiCameraMonitor:
+    """Runs several cameras through one OCR pool, database writer and mailer"""
+
+    def __init__(self, cameras, write_behind=True, ocr_workers=2, ocr_queue_size=2,
+                 stats_interval=30.0, image_store_options=None):
+        # One model in memory however many cameras there are
+        self.reader = easyocr.Reader(['en'])
+
+        # Each camera's ring outlasts its queued frames, the frames in OCR
+        # and the one being captured
+        self.cameras = {}
+        for config in cameras:
+            config = dict(config)
+            name = str(config.pop("name"))
+            if name in self.cameras:
+                raise ValueError(f"Duplicate camera name: {name}")
+            config.setdefault("ring_size", ocr_queue_size + ocr_workers + 2)
+            self.cameras[name] = Camera(name, config.pop("source"), self.reader, **config)
+        if not self.cameras:
+            raise ValueError("No cameras configured")
+
+        # Initialize database and email sender
+        self.db = DatabaseManager()
+        self.email_sender = EmailSender()
+        self.outbox_sender = OutboxSender(self.db, self.email_sender)
+        self.violation_writer = ViolationWriter(self.db) if write_behind else None
+        self.image_store = ImageStore(**(image_store_options or {}))
+
+        captures = {name: functools.partial(self.capture_frame, camera)
+                    for name, camera in self.cameras.items()}
+        self.pipeline = MonitorPipeline(captures, self.recognize, self.persist,
+                                        ocr_workers=ocr_workers, ocr_queue_size=ocr_queue_size)
+
+        metrics.set_process("monitor-multi")
+        metrics.gauge("ocr_queue.depth", self.pipeline.ocr_queue.qsize)
+        metrics.gauge("persist_queue.depth", self.pipeline.persist_queue.qsize)
+        metrics.gauge("image_store.pending", self.image_store.queue.qsize)
+        for name in self.cameras:
+            metrics.gauge(f"camera.{name}.ocr_queue.depth",
+                          functools.partial(self.pipeline.ocr_queue.qsize, name))
+        # Seconds between stats log lines
+        self.stats_interval = stats_interval
+
+    def capture_frame(self, camera):
+        """Capture stage for one camera: pass a frame on only if it needs OCR"""
+        image = camera.read()
+        if image is None:
+            return None
+        captured_at = time.monotonic()
+        now = time.time()
+
+        for track in camera.tracker.expire(now):
+            self.pipeline.submit((camera, track))
+
+        with metrics.timer("motion_gate"):
+            region = camera.motion_gate.check(image)
+        if region is None:
+            return None
+
+        # Each plate candidate follows its own track, so vehicles in view
+        # together are read and reported separately
+        jobs = camera.tracker.assign(camera.recognizer.find_candidates(image, region), now)
+        if not jobs:
+            return None
+        camera.count("ocr_frames")
+        return camera, image, jobs, captured_at
+
+    def recognize(self, item):
+        """OCR stage: add each candidate's plate read to its camera's track"""
+        camera, image, jobs, captured_at = item
+        with metrics.timer(f"camera.{camera.name}.ocr"):
+            plates = camera.recognizer.read_each(image, [candidate for _, candidate in jobs])
+        speed = camera.speed_at(captured_at)
+
+        for (track_id, _), plate in zip(jobs, plates):
+            if plate:
+                camera.count("reads")
+                print(f"[{camera.name}] Detected license plate: {plate.text} (track {track_id})")
+                camera.tracker.add_read(track_id, plate.text, plate.confidence, image, speed)
+        return None
+
+    def persist(self, item):
+        """Persistence stage: store a finished track's violation if it broke its camera's threshold"""
+        camera, track = item
+        if track.speed is not None and track.speed > camera.speed_threshold:
+            camera.count("violations")
+            self.save_violation(track.speed, track.plate(), track.best_frame, track.first_seen)
+
+    def save_violation(self, speed, license_plate, image, captured_at):
+        """Save violation details and image"""
+        # Dated when the vehicle was first seen, not when the track expired
+        timestamp = datetime.fromtimestamp(captured_at).strftime("%Y%m%d_%H%M%S")
+        self.image_store.submit(image, lambda image_path: self.record_violation(
+            timestamp, speed, license_plate, image_path))
+
+    def record_violation(self, timestamp, speed, license_plate, image_path):
+        """Store a violation whose image has been saved and queue the driver's email"""
+        violation_data = {
+            "timestamp": timestamp,
+            "speed": speed,
+            "license_plate": license_plate,
+            "image_path": image_path
+        }
+
+        if self.violation_writer:
+            self.violation_writer.put(violation_data)
+            driver_info = self.db.get_driver_info(license_plate)
+        else:
+            driver_info = self.db.add_violation(violation_data)
+
+        if driver_info:
+            self.db.enqueue_email(driver_info["email"], speed, timestamp, image_path)
+            self.outbox_sender.notify()
+
+    def camera_stats(self):
+        """Per-camera counters, capture rate and OCR queue share"""
+        queues = self.pipeline.ocr_queue.stats()["sources"]
+        stats = {}
+        for name, camera in self.cameras.items():
+            with camera._counters_lock:
+                counters = dict(camera.counters)
+            queue_stats = queues.get(name, {"depth": 0, "dropped": 0})
+            tracks = camera.tracker.stats()
+            stats[name] = dict(counters,
+                               fps=round(camera.fps(), 1),
+                               speed_threshold=camera.speed_threshold,
+                               ocr_queue=queue_stats["depth"],
+                               ocr_dropped=queue_stats["dropped"],
+                               motion_skipped=camera.motion_gate.stats()["skipped"],
+                               open_tracks=tracks["open_tracks"])
+        return stats
+
+    def print_stats(self):
+        """Log the shared pipeline line, then one line per camera"""
+        print(format_stats(self.pipeline.stats()))
+        for name, stats in self.camera_stats().items():
+            print(f"camera {name} fps={stats['fps']} frames={stats['frames']} "
+                  f"motion_skipped={stats['motion_skipped']} ocr={stats['ocr_frames']} "
+                  f"reads={stats['reads']} ocr_queue={stats['ocr_queue']} "
+                  f"(dropped {stats['ocr_dropped']}) tracks={stats['open_tracks']} "
+                  f"violations={stats['violations']} threshold={stats['speed_threshold']} "
+                  f"reconnects={stats['reconnects']}")
+        print(metrics.registry.format_line())
+        if metrics.registry.enabled:
+            metrics.registry.write_snapshot()
+
+    def run(self):
+        """Run until every camera has stopped or the process is interrupted"""
+        print(f"Starting speed monitoring on {len(self.cameras)} cameras: "
+              f"{', '.join(self.cameras)}")
+
+        for camera in self.cameras.values():
+            if camera.speed_source:
+                camera.speed_source.start()
+        self.pipeline.start()
+        self.outbox_sender.start()
+        try:
+            while not self.pipeline.wait(self.stats_interval):
+                self.print_stats()
+        except KeyboardInterrupt:
+            print("\nStopping speed monitoring system...")
+        finally:
+            self.pipeline.stop()
+            for camera in self.cameras.values():
+                for track in camera.tracker.flush():
+                    self.persist((camera, track))
+            self.print_stats()
+            self.image_store.close()
+            if self.violation_writer:
+                self.violation_writer.close()
+            self.outbox_sender.stop()
+            for camera in self.cameras.values():
+                camera.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor several cameras with a shared OCR pool.")
+    parser.add_argument('sources', nargs='*',
+                        help='Cameras as [name=]source: a device index, video file or stream URL')
+    parser.add_argument('--config', help='JSON file listing cameras and their options')
+    parser.add_argument('--threshold', type=float, default=7.0,
+                        help='Speed threshold (m/s) for cameras that do not set one')
+    parser.add_argument('--ocr-workers', type=int, default=2, help='OCR threads shared by all cameras')
+    parser.add_argument('--ocr-queue-size', type=int, default=2,
+                        help='Frames each camera may have waiting for OCR')
+    parser.add_argument('--speed-port', action='append', default=[], metavar='NAME=PORT',
+                        help="Serial port of a camera's speed detector; cameras without one "
+                             "use a simulated speed")
+    parser.add_argument('--loop', action='store_true', help='Replay video files from the start when they end')
+    parser.add_argument('--stats-interval', type=float, default=30.0, help='Seconds between stats lines')
+    args = parser.parse_args()
+
+    cameras = []
+    if args.config:
+        with open(args.config) as f:
+            cameras = json.load(f)
+    for index, source in enumerate(args.sources):
+        name, separator, value = source.partition("=")
+        # Stream URLs may contain "=", so only a plain leading word is a name
+        if not separator or not name or "/" in name or ":" in name:
+            name, value = f"cam{index}", source
+        cameras.append({"name": name, "source": value})
+    if not cameras:
+        parser.error("give at least one source or --config")
+    if any("=" not in option for option in args.speed_port):
+        parser.error("--speed-port takes NAME=PORT")
+    speed_ports = dict(option.split("=", 1) for option in args.speed_port)
+    for camera in cameras:
+        camera.setdefault("speed_threshold", args.threshold)
+        camera.setdefault("loop", args.loop)
+        if str(camera["name"]) in speed_ports:
+            camera["speed_port"] = speed_ports[str(camera["name"])]
+
+    monitor = MultiCameraMonitor(cameras, ocr_workers=args.ocr_workers,
+                                 ocr_queue_size=args.ocr_queue_size,
+                                 stats_interval=args.stats_interval)
+    monitor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import queue
+import threading
+from collections import deque
+import metrics
+
+
+class BlockingQueue:
+    """Bounded FIFO whose producers wait for room instead of losing items"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.blocked = 0
+        self.high_water = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        """Add an item, waiting while the queue is full"""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self.blocked += 1
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize)
+            self._items.append(item)
+            self.high_water = max(self.high_water, len(self._items))
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, raising queue.Empty on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        """Return current depth, capacity, high-water mark and how often a put waited"""
+        with self._cond:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "high_water": self.high_water,
+                "blocked": self.blocked
+            }
+
+
+class FairQueue:
+    """Per-source drop-oldest queues, served to consumers in round-robin order
+
+    Each source keeps up to maxsize items of its own, so a camera that sees
+    constant traffic sheds its own stale frames instead of crowding out the
+    others, and every source with work waiting gets the next free worker in
+    turn. With a single source it is a bounded FIFO whose put discards the
+    oldest item instead of blocking the producer.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.high_water = 0
+        self._queues = {}
+        self._dropped = {}
+        # Sources with items waiting, in the order they will be served
+        self._ready = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def put(self, item, source=None):
+        """Add an item for a source, dropping that source's oldest item if it is full"""
+        with self._cond:
+            items = self._queues.get(source)
+            if items is None:
+                items = self._queues[source] = deque()
+                self._dropped[source] = 0
+            if not items:
+                self._ready.append(source)
+            elif len(items) >= self.maxsize:
+                items.popleft()
+                self._size -= 1
+                self.dropped += 1
+                self._dropped[source] += 1
+            items.append(item)
+            self._size += 1
+            self.high_water = max(self.high_water, self._size)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Remove the oldest item of the next source in turn, raising queue.Empty on timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._size, timeout):
+                raise queue.Empty
+            source = self._ready.popleft()
+            items = self._queues[source]
+            item = items.popleft()
+            self._size -= 1
+            if items:
+                self._ready.append(source)
+            return item
+
+    def qsize(self, source=None):
+        """Items waiting in total, or for one source"""
+        with self._cond:
+            if source is None:
+                return self._size
+            return len(self._queues.get(source, ()))
+
+    def stats(self):
+        """Return total depth, capacity, high-water mark and drops, plus each source's share"""
+        with self._cond:
+            return {
+                "depth": self._size,
+                "maxsize": self.maxsize * max(1, len(self._queues)),
+                "high_water": self.high_water,
+                "dropped": self.dropped,
+                "sources": {source: {"depth": len(items), "dropped": self._dropped[source]}
+                            for source, items in self._queues.items()}
+            }
+
+
+class MonitorPipeline:
+    """Capture -> OCR -> persist stages joined by bounded queues
+
+    capture() is called in a loop on its own thread and returns a work item,
+    or None when there is nothing to process. capture may also be a dict of
+    named capture functions, one per camera; each gets its own thread and
+    the OCR workers take their frames in turn. recognize(item) runs on a pool
+    of OCR workers and returns a result for persistence, or None. persist(result)
+    runs on a single worker so database writes and emails stay ordered.
+    Frames waiting for OCR may be dropped; results waiting to be persisted
+    never are.
+    """
+
+    def __init__(self, capture, recognize, persist, ocr_workers=2,
+                 ocr_queue_size=4, persist_queue_size=32):
+        self.captures = capture if isinstance(capture, dict) else {"capture": capture}
+        self.recognize = recognize
+        self.persist = persist
+        self.ocr_workers = ocr_workers
+
+        # Stale frames are worth less than fresh ones, so a slow OCR stage
+        # sheds its oldest backlog rather than stalling capture. ocr_queue_size
+        # is per capture source.
+        self.ocr_queue = FairQueue(ocr_queue_size)
+        # Results are finished tracks and violations, so a slow database
+        # holds up the OCR workers instead; their backlog is the one to shed.
+        self.persist_queue = BlockingQueue(persist_queue_size)
+
+        self.counters = {
+            "captured": 0,
+            "recognized": 0,
+            "persisted": 0,
+            "errors": 0
+        }
+        self._counters_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._capture_done = threading.Event()
+        self._ocr_done = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the capture threads, OCR workers and persistence worker"""
+        capture_threads = [threading.Thread(target=self._capture_loop, args=(name, capture),
+                                            name=name, daemon=True)
+                           for name, capture in self.captures.items()]
+        ocr_threads = [threading.Thread(target=self._ocr_loop, name=f"ocr-{i}", daemon=True)
+                       for i in range(self.ocr_workers)]
+        persist_thread = threading.Thread(target=self._persist_loop, name="persist", daemon=True)
+        self._threads = capture_threads + ocr_threads + [persist_thread]
+        for thread in self._threads:
+            thread.start()
+
+        # Capture is done once every source has stopped
+        def watch_capture():
+            for thread in capture_threads:
+                thread.join()
+            self._capture_done.set()
+        threading.Thread(target=watch_capture, daemon=True).start()
+
+        # Release the persist worker once every OCR worker has finished
+        def watch_ocr():
+            for thread in ocr_threads:
+                thread.join()
+            self._ocr_done.set()
+        threading.Thread(target=watch_ocr, daemon=True).start()
+
+    def stop(self, timeout=None):
+        """Stop capturing and let queued work drain through the later stages"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, result):
+        """Hand a result straight to the persistence stage, waiting if it is full"""
+        self.persist_queue.put(result)
+
+    def is_running(self):
+        return not self._capture_done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the capture stage ends; return False on timeout"""
+        return self._capture_done.wait(timeout)
+
+    def stats(self):
+        """Return per-stage counters and queue depths"""
+        with self._counters_lock:
+            counters = dict(self.counters)
+        counters["ocr_queue"] = self.ocr_queue.stats()
+        counters["persist_queue"] = self.persist_queue.stats()
+        return counters
+
+    def _count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def _capture_loop(self, name, capture):
+        while not self._stop.is_set():
+            try:
+                item = capture()
+            except Exception as e:
+                print(f"Capture stage stopped ({name}): {str(e)}")
+                self._count("errors")
+                break
+            if item is not None:
+                self._count("captured")
+                metrics.count("pipeline.captured")
+                self.ocr_queue.put(item, name)
+
+    def _ocr_loop(self):
+        while True:
+            try:
+                item = self.ocr_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._capture_done.is_set() and not self.ocr_queue.qsize():
+                    return
+                continue
+            try:
+                with metrics.timer("pipeline.recognize"):
+                    result = self.recognize(item)
+            except Exception as e:
+                print(f"Error in OCR stage: {str(e)}")
+                self._count("errors")
+                continue
+            if result is not None:
+                self._count("recognized")
+                self.persist_queue.put(result)
+
+    def _persist_loop(self):
+        while True:
+            try:
+                result = self.persist_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._ocr_done.is_set() and not self.persist_queue.qsize():
+                    return
+                continue
+            try:
+                with metrics.timer("pipeline.persist"):
+                    self.persist(result)
+                self._count("persisted")
+            except Exception as e:
+                print(f"Error in persistence stage: {str(e)}")
+                self._count("errors")
+
+
+def format_stats(stats):
+    """Render pipeline stats as a single log line"""
+    return (f"captured={stats['captured']} recognized={stats['recognized']} "
+            f"persisted={stats['persisted']} errors={stats['errors']} "
+            f"ocr_queue={stats['ocr_queue']['depth']}/{stats['ocr_queue']['maxsize']} "
+            f"(dropped {stats['ocr_queue']['dropped']}) "
+            f"persist_queue={stats['persist_queue']['depth']}/{stats['persist_queue']['maxsize']} "
+            f"(blocked {stats['persist_queue']['blocked']})")
@@ -0,0 +1,148 @@
+"""Plate normalization and approximate plate lookup for OCR misreads
+
+OCR output is first reduced to a plate key: letters and digits only, with
+characters OCR commonly confuses folded onto one of each pair. Reads that
+still differ from every registered key are matched by edit distance with
+a symmetric-delete index: each key is stored under every string obtained
+by deleting up to max_distance characters from it, so a lookup only has to
+generate the query's own deletes and check the few keys they lead to.
+"""
+import threading
+from plate_tracker import clean_plate
+
+# Characters OCR mistakes for one another, folded onto the digit
+CONFUSABLES = str.maketrans({
+    "O": "0",
+    "Q": "0",
+    "I": "1",
+    "B": "8",
+    "S": "5",
+})
+
+
+def normalize_plate(text):
+    """Plate key: uppercase letters and digits, with confusable characters folded"""
+    if text is None:
+        return None
+    return clean_plate(text).translate(CONFUSABLES)
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def deletes(key, distance):
+    """Every string made by deleting up to distance characters from key"""
+    variants = {key}
+    frontier = {key}
+    for _ in range(distance):
+        frontier = {v[:i] + v[i + 1:] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+
+class PlateIndex:
+    """Finds the registered plate key nearest a misread key within max_distance
+
+    Memory grows with the number of deletes per key: a 7-character key has
+    8 variants at distance 1 and 29 at distance 2.
+    """
+
+    def __init__(self, max_distance=1):
+        self.max_distance = max_distance
+        self.keys = {}
+        # Delete variant -> driver id, or a list of ids when keys share it
+        self._variants = {}
+        # Highest driver id loaded, so later drivers can be added incrementally
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, driver_id, key):
+        """Index a driver's plate key"""
+        self.add_many([(driver_id, key)])
+
+    def add_many(self, rows):
+        """Index (driver_id, key) pairs under one lock acquisition"""
+        with self._lock:
+            for driver_id, key in rows:
+                self.last_id = max(self.last_id, driver_id)
+                if not key:
+                    continue
+                if driver_id in self.keys:
+                    self._remove(driver_id)
+                self.keys[driver_id] = key
+                for variant in deletes(key, self.max_distance):
+                    ids = self._variants.get(variant)
+                    if ids is None:
+                        self._variants[variant] = driver_id
+                    elif isinstance(ids, list):
+                        ids.append(driver_id)
+                    else:
+                        self._variants[variant] = [ids, driver_id]
+
+    def remove(self, driver_id):
+        """Drop a driver from the index"""
+        with self._lock:
+            self._remove(driver_id)
+
+    def _remove(self, driver_id):
+        key = self.keys.pop(driver_id, None)
+        if key is None:
+            return
+        for variant in deletes(key, self.max_distance):
+            ids = self._variants.get(variant)
+            if ids == driver_id:
+                del self._variants[variant]
+            elif isinstance(ids, list) and driver_id in ids:
+                ids.remove(driver_id)
+                if len(ids) == 1:
+                    self._variants[variant] = ids[0]
+
+    def lookup(self, key, max_distance=None):
+        """Return (driver_id, distance) of the single nearest key, or None
+
+        Reads equally close to two registered plates are ambiguous and
+        match neither, since a violation must not go to the wrong driver.
+        """
+        if not key:
+            return None
+        limit = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        with self._lock:
+            candidates = set()
+            for variant in deletes(key, limit):
+                ids = self._variants.get(variant)
+                if ids is None:
+                    continue
+                if isinstance(ids, list):
+                    candidates.update(ids)
+                else:
+                    candidates.add(ids)
+            keys = [(driver_id, self.keys[driver_id]) for driver_id in candidates]
+
+        best = None
+        best_distance = limit + 1
+        ambiguous = False
+        for driver_id, candidate in keys:
+            distance = edit_distance(key, candidate, limit)
+            if distance < best_distance:
+                best, best_distance, ambiguous = driver_id, distance, False
+            elif distance == best_distance:
+                ambiguous = True
+        if best is None or ambiguous:
+            return None
+        return best, best_distance
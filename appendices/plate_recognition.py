@@ -0,0 +1,120 @@
+import cv2
+from collections import namedtuple
+import metrics
+from preprocessing import Preprocessor
+
+# A ranked plate-shaped region; box is (x, y, w, h) in image coordinates
+PlateCandidate = namedtuple("PlateCandidate", ["box", "score"])
+
+# The best OCR read of a frame
+PlateRead = namedtuple("PlateRead", ["text", "confidence", "box"])
+
+
+class PlateRecognizer:
+    """Find plate-shaped regions in a frame and OCR the most promising ones"""
+
+    def __init__(self, reader, min_aspect=2.0, max_aspect=5.0, min_area=600,
+                 top_k=3, edge_density_target=0.25, size_target=0.02,
+                 weights=(0.4, 0.4, 0.2), ocr_size=(256, 64), preprocessor=None):
+        self.reader = reader
+        # Edge detection, optionally at a lower resolution and inside a road ROI
+        self.preprocessor = preprocessor or Preprocessor()
+        # License plates typically have aspect ratios between 2.0 and 5.0
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        # Bounding boxes smaller than this many full-resolution pixels are
+        # noise, not plates
+        self.min_area = min_area
+        # Number of best-scoring candidates sent to OCR per frame
+        self.top_k = top_k
+        # Edge density (edge pixels / box area) at which a region scores fully;
+        # plate characters make plates much busier than painted body panels
+        self.edge_density_target = edge_density_target
+        # Fraction of the frame a box must cover to get the full size score
+        self.size_target = size_target
+        # Relative weights of rectangularity, edge density and size
+        self.weights = weights
+        # Every crop is resized to this (width, height) for one batched OCR call
+        self.ocr_size = ocr_size
+
+    def find_candidates(self, image, region=None):
+        """Return the top-K plate candidates, best first, in full-resolution coordinates"""
+        with metrics.timer("recognition.preprocess"):
+            edges, scale = self.preprocessor.edges(image, region)
+        with metrics.timer("recognition.contours"):
+            return self.candidates_from_edges(edges, scale)
+
+    def candidates_from_edges(self, edges, scale=1.0):
+        """Contour search and scoring on an edge map from the preprocessor"""
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        # Summed-area table of edge pixels gives each box's density in O(1)
+        edge_sums = self.preprocessor.edge_integral(edges)
+        image_area = float(edges.shape[0] * edges.shape[1])
+        min_area = self.min_area * scale * scale
+        w_rect, w_edge, w_size = self.weights
+
+        candidates = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            area = w * h
+            if area < min_area:
+                continue
+            aspect_ratio = w / float(h)
+            if not self.min_aspect < aspect_ratio < self.max_aspect:
+                continue
+
+            # Canny contours are often open, so measure how well the convex
+            # hull fills the bounding box rather than the raw contour area
+            rectangularity = cv2.contourArea(cv2.convexHull(contour)) / area
+            edge_count = (edge_sums[y + h, x + w] - edge_sums[y, x + w]
+                          - edge_sums[y + h, x] + edge_sums[y, x]) / 255.0
+            edge_density = min(edge_count / area / self.edge_density_target, 1.0)
+            size = min(area / image_area / self.size_target, 1.0)
+
+            score = w_rect * rectangularity + w_edge * edge_density + w_size * size
+            box = self.preprocessor.to_full((x, y, w, h), scale)
+            candidates.append(PlateCandidate(box, score))
+
+        candidates.sort(key=lambda c: c.score, reverse=True)
+        return candidates[:self.top_k]
+
+    def ocr_candidates(self, image, candidates):
+        """OCR every candidate crop in one batched call; one result list per crop"""
+        crops = [image[y:y+h, x:x+w] for x, y, w, h in (c.box for c in candidates)]
+        if not crops:
+            return []
+        with metrics.timer("recognition.ocr"):
+            if hasattr(self.reader, "readtext_batched"):
+                width, height = self.ocr_size
+                return self.reader.readtext_batched(crops, n_width=width, n_height=height)
+            return [self.reader.readtext(crop) for crop in crops]
+
+    def read_each(self, image, candidates):
+        """OCR the candidates in one batch; a PlateRead or None per candidate"""
+        reads = []
+        for candidate, detections in zip(candidates, self.ocr_candidates(image, candidates)):
+            if detections:
+                _, text, confidence = max(detections, key=lambda d: d[2])
+                reads.append(PlateRead(text, float(confidence), candidate.box))
+            else:
+                reads.append(None)
+        return reads
+
+    def read(self, image, region=None):
+        """Return the best PlateRead for the frame, or None
+
+        region limits the search to an (x, y, w, h) part of the frame, while
+        crops for OCR still come from the full-resolution image.
+        """
+        candidates = self.find_candidates(image, region)
+        # Candidates are ranked, so the first one with any text wins
+        for plate in self.read_each(image, candidates):
+            if plate:
+                return plate
+        return None
+
+    def read_plate(self, image):
+        """Process image to detect and read license plate"""
+        plate = self.read(image)
+        return plate.text if plate else None
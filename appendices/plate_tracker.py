@@ -0,0 +1,176 @@
+import itertools
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def clean_plate(text):
+    """Uppercase and strip everything but letters and digits before voting"""
+    return re.sub(r"[^A-Z0-9]", "", text.upper())
+
+
+class Track:
+    """One vehicle followed across consecutive frames"""
+
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.votes = Counter()
+        self.confidence = defaultdict(float)
+        self.reads = 0
+        self.best_frame = None
+        self.best_confidence = -1.0
+        self.best_text = None
+        self.speed = None
+
+    def plate(self):
+        """Majority plate across frames, ties broken by summed confidence"""
+        if not self.votes:
+            return None
+        return max(self.votes, key=lambda text: (self.votes[text], self.confidence[text]))
+
+
+class PlateTracker:
+    """Groups per-frame detections into tracks and emits one result per vehicle"""
+
+    def __init__(self, iou_threshold=0.2, max_distance=1.0, max_age=2.0,
+                 min_votes=3, confident_score=0.9):
+        # A plate box joins a track when it overlaps the track's last box by
+        # this IoU, or its centre is within max_distance box sizes of it
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        # Seconds without a sighting before a track is finished
+        self.max_age = max_age
+        # A track stops asking for OCR once its leading plate has this many
+        # votes, or once a single read reaches confident_score
+        self.min_votes = min_votes
+        self.confident_score = confident_score
+
+        self.emitted = 0
+        self.ocr_skipped = 0
+        self._tracks = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _matches(self, track, box):
+        if box_iou(track.box, box) >= self.iou_threshold:
+            return True
+        tx, ty, tw, th = track.box
+        x, y, w, h = box
+        dx = (x + w / 2.0) - (tx + tw / 2.0)
+        dy = (y + h / 2.0) - (ty + th / 2.0)
+        return (dx * dx + dy * dy) ** 0.5 <= self.max_distance * max(tw, th, w, h)
+
+    def update(self, box, now=None):
+        """Assign a plate box to a track; return (track_id, needs_ocr)"""
+        return self.update_boxes([box], now)[0]
+
+    def update_boxes(self, boxes, now=None):
+        """Assign one frame's plate boxes to tracks, best candidate first
+
+        Returns (track_id, needs_ocr) per box, or None for a box whose track
+        an earlier box of the same frame already claimed (an overlapping
+        contour of the same plate). Each plate gets its own track, so
+        vehicles in view together are followed and read separately.
+        """
+        now = time.time() if now is None else now
+        results = []
+        with self._lock:
+            live = [t for t in self._tracks.values() if now - t.last_seen <= self.max_age]
+            claimed = set()
+            for box in boxes:
+                candidates = [t for t in live if self._matches(t, box)]
+                if candidates:
+                    track = max(candidates, key=lambda t: box_iou(t.box, box))
+                    if track.id in claimed:
+                        results.append(None)
+                        continue
+                else:
+                    track = Track(next(self._ids), box, now)
+                    self._tracks[track.id] = track
+                    live.append(track)
+                claimed.add(track.id)
+                track.box = box
+                track.last_seen = now
+
+                needs_ocr = not self._confident(track)
+                if not needs_ocr:
+                    self.ocr_skipped += 1
+                results.append((track.id, needs_ocr))
+        return results
+
+    def assign(self, candidates, now=None):
+        """Track a frame's plate candidates; return (track_id, candidate) for those to OCR"""
+        assigned = self.update_boxes([c.box for c in candidates], now)
+        return [(result[0], candidate) for candidate, result in zip(candidates, assigned)
+                if result and result[1]]
+
+    def add_read(self, track_id, text, confidence, frame, speed=None):
+        """Record one OCR read for a track"""
+        text = clean_plate(text)
+        if not text:
+            return
+        with self._lock:
+            track = self._tracks.get(track_id)
+            if track is None:
+                return
+            track.votes[text] += 1
+            track.confidence[text] += confidence
+            track.reads += 1
+            if speed is not None:
+                track.speed = speed if track.speed is None else max(track.speed, speed)
+            if confidence > track.best_confidence:
+                track.best_confidence = confidence
+                track.best_text = text
+                # Frames may live in a reused capture buffer, so keep a copy
+                track.best_frame = frame.copy()
+
+    def _confident(self, track):
+        plate = track.plate()
+        if plate is None:
+            return False
+        return track.votes[plate] >= self.min_votes or track.best_confidence >= self.confident_score
+
+    def expire(self, now=None):
+        """Remove tracks that left the scene; return those that have a plate"""
+        now = time.time() if now is None else now
+        with self._lock:
+            finished = [t for t in self._tracks.values() if now - t.last_seen > self.max_age]
+            return self._finish(finished)
+
+    def flush(self):
+        """Finish every open track, e.g. on shutdown"""
+        with self._lock:
+            return self._finish(list(self._tracks.values()))
+
+    def _finish(self, tracks):
+        results = []
+        for track in tracks:
+            del self._tracks[track.id]
+            if track.plate():
+                results.append(track)
+        self.emitted += len(results)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open_tracks": len(self._tracks),
+                "emitted": self.emitted,
+                "ocr_skipped": self.ocr_skipped
+            }
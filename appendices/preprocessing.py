@@ -0,0 +1,171 @@
+import threading
+import cv2
+import numpy as np
+
+
+class FrameRing:
+    """Fixed set of preallocated frame buffers that capture writes into in turn
+
+    A buffer is reused after `size` more frames, so size must exceed the
+    number of frames that can be in flight at once (queued, being OCR'd or
+    on screen). Anything kept longer, such as evidence frames, must be copied.
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self._buffers = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def next(self, shape, dtype=np.uint8):
+        """Return the next buffer of the given shape, allocating the ring on first use"""
+        with self._lock:
+            if not self._buffers or self._buffers[0].shape != tuple(shape):
+                self._buffers = [np.empty(shape, dtype) for _ in range(self.size)]
+                self._next = 0
+            buffer = self._buffers[self._next]
+            self._next = (self._next + 1) % self.size
+            return buffer
+
+
+def _prefix(buffer, shape):
+    """A contiguous array of the given shape over the start of a scratch buffer"""
+    return buffer.reshape(-1)[:int(np.prod(shape))].reshape(shape)
+
+
+class _Scratch:
+    """Working buffers for one thread at one input resolution"""
+
+    def __init__(self, frame_shape, detect_size):
+        width, height = detect_size
+        self.frame_shape = frame_shape
+        self.small = np.empty((height, width, 3), np.uint8)
+        self.gray = np.empty((height, width), np.uint8)
+        self.blur = np.empty((height, width), np.uint8)
+        self.edges = np.empty((height, width), np.uint8)
+        self.mask = np.empty((height, width), np.uint8)
+        self.integral = np.empty((height + 1, width + 1), np.int32)
+
+
+class Preprocessor:
+    """Grayscale -> blur -> Canny at a configurable detection resolution
+
+    Every step writes into preallocated buffers through OpenCV's dst
+    arguments. Each thread gets its own set, so OCR workers can share one
+    Preprocessor.
+    """
+
+    def __init__(self, detect_width=None, roi_mask=None, blur_kernel=(5, 5),
+                 canny_low=50, canny_high=150):
+        # Width edges are computed at; None keeps the capture resolution
+        self.detect_width = detect_width
+        # Static road mask (path or array, non-zero = road) at any resolution
+        self.roi_mask = roi_mask
+        self.blur_kernel = blur_kernel
+        self.canny_low = canny_low
+        self.canny_high = canny_high
+        self._roi_cache = {}
+        self._local = threading.local()
+
+    def detect_size(self, frame_shape):
+        """Return (width, height, scale) of the detection frame"""
+        height, width = frame_shape[:2]
+        if not self.detect_width or self.detect_width >= width:
+            return width, height, 1.0
+        scale = self.detect_width / float(width)
+        return self.detect_width, max(1, int(round(height * scale))), scale
+
+    def _scratch(self, frame_shape):
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None or scratch.frame_shape != frame_shape:
+            width, height, _ = self.detect_size(frame_shape)
+            scratch = _Scratch(frame_shape, (width, height))
+            self._local.scratch = scratch
+        return scratch
+
+    def _roi(self, size):
+        """Road mask resized to the detection resolution, or None"""
+        if self.roi_mask is None:
+            return None
+        if size not in self._roi_cache:
+            mask = self.roi_mask
+            if isinstance(mask, str):
+                mask = cv2.imread(mask, cv2.IMREAD_GRAYSCALE)
+                if mask is None:
+                    raise ValueError(f"Could not read ROI mask: {self.roi_mask}")
+            elif mask.ndim == 3:
+                mask = cv2.cvtColor(mask, cv2.COLOR_BGR2GRAY)
+            mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+            self._roi_cache[size] = np.where(mask > 0, 255, 0).astype(np.uint8)
+        return self._roi_cache[size]
+
+    def edges(self, image, region=None):
+        """Return (edges, scale) for the frame, limited to the ROI and region
+
+        region is an optional (x, y, w, h) at full resolution, such as the
+        motion gate's output. Only the region is resized, blurred and run
+        through Canny; the rest of the edge map is zero. The edges array is
+        reused by the next call on the same thread.
+        """
+        scratch = self._scratch(image.shape)
+        width, height, scale = self.detect_size(image.shape)
+        roi = self._roi((width, height))
+        if region is None:
+            edges = self._filter(image, (width, height), scratch, scratch.edges)
+            if roi is not None:
+                cv2.bitwise_and(edges, roi, dst=edges)
+            return edges, scale
+
+        # The region in detection coordinates, clipped to the frame
+        x, y, w, h = region
+        x0, y0 = max(0, int(x * scale)), max(0, int(y * scale))
+        x1 = min(width, int(np.ceil((x + w) * scale)))
+        y1 = min(height, int(np.ceil((y + h) * scale)))
+        scratch.edges.fill(0)
+        if x1 <= x0 or y1 <= y0:
+            return scratch.edges, scale
+
+        # The same area of the full-resolution frame
+        crop = image[int(y0 / scale):min(image.shape[0], int(np.ceil(y1 / scale))),
+                     int(x0 / scale):min(image.shape[1], int(np.ceil(x1 / scale)))]
+        edges = _prefix(scratch.mask, (y1 - y0, x1 - x0))
+        self._filter(crop, (x1 - x0, y1 - y0), scratch, edges)
+        if roi is not None:
+            cv2.bitwise_and(edges, roi[y0:y1, x0:x1], dst=edges)
+        scratch.edges[y0:y1, x0:x1] = edges
+        return scratch.edges, scale
+
+    def _filter(self, image, size, scratch, edges):
+        """Resize image to size, then grayscale, blur and Canny it into edges
+
+        Intermediate results go into the start of the thread's scratch
+        buffers, so a crop costs only its own area.
+        """
+        width, height = size
+        source = image
+        if (image.shape[1], image.shape[0]) != (width, height):
+            source = _prefix(scratch.small, (height, width) + image.shape[2:])
+            cv2.resize(image, (width, height), dst=source, interpolation=cv2.INTER_AREA)
+        gray = _prefix(scratch.gray, (height, width))
+        if source.ndim == 3:
+            cv2.cvtColor(source, cv2.COLOR_BGR2GRAY, dst=gray)
+        else:
+            gray[:] = source
+        blur = _prefix(scratch.blur, (height, width))
+        cv2.GaussianBlur(gray, self.blur_kernel, 0, dst=blur)
+        cv2.Canny(blur, self.canny_low, self.canny_high, edges=edges)
+        return edges
+
+    def edge_integral(self, edges):
+        """Summed-area table of the edge map (edge pixels count 255 each)"""
+        scratch = self._local.scratch
+        cv2.integral(edges, scratch.integral, sdepth=cv2.CV_32S)
+        return scratch.integral
+
+    def to_full(self, box, scale):
+        """Map an (x, y, w, h) box from detection to full resolution"""
+        if scale == 1.0:
+            return box
+        x, y, w, h = box
+        return (int(x / scale), int(y / scale),
+                int(np.ceil(w / scale)), int(np.ceil(h / scale)))
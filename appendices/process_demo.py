@@ -1,70 +1,303 @@
 import argparse
-import cv2
+import csv
+import json
+import time
 from database.db_manager import DatabaseManager
-from notification.email_sender import EmailSender
-import easyocr
 import os
 from datetime import datetime
 
+# OpenCV, numpy and easyocr (which loads torch) take seconds to import, so
+# they are imported inside the functions that need them, as are the process
+# pool and SMTP modules. Runs that take no action, and --help, never load them.
+
 SPEED_THRESHOLD = 7.0  # m/s
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# OCR model and plate recognizer shared by every call in this process;
+# loading the model takes seconds
+_reader = None
+_recognizer = None
+_image_store = None
+
+
+def get_reader():
+    """Load the OCR model once per process"""
+    global _reader
+    if _reader is None:
+        import easyocr
+        _reader = easyocr.Reader(['en'])
+    return _reader
+
+
+def get_recognizer(options=None):
+    """Build the plate recognizer once per process"""
+    global _recognizer
+    if _recognizer is None:
+        from plate_recognition import PlateRecognizer
+        _recognizer = PlateRecognizer(get_reader(), **(options or {}))
+    return _recognizer
+
+
+def get_image_store():
+    """Open the violation image store once per process"""
+    global _image_store
+    if _image_store is None:
+        from image_store import ImageStore
+        _image_store = ImageStore()
+    return _image_store
 
 
-def process_license_plate(image_path):
-    image = cv2.imread(image_path)
+def load_image(image_path):
+    """Read an image file once; returns (encoded bytes, decoded frame)
+
+    Both are None if the file cannot be read or decoded.
+    """
+    import cv2
+    import numpy as np
+
+    try:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        data = None
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) if data else None
     if image is None:
         print(f"Could not read image: {image_path}")
+        return None, None
+    return data, image
+
+
+def process_license_plate(image_path, image=None):
+    if image is None:
+        _, image = load_image(image_path)
+        if image is None:
+            return None
+    return get_recognizer().read_plate(image)
+
+def log_violation(db, source_image, speed, license_plate, notify=True, data=None, image=None,
+                  timestamp=None):
+    """Store the image, record the violation and queue the driver's email
+
+    The source file is copied byte for byte; pass its bytes and decoded
+    frame when they are already in memory to avoid reading it again.
+    timestamp (YYYYmmdd_HHMMSS) is when the image was captured; it defaults
+    to now, which is only right for a live capture. The returned driver
+    record carries the queued email's outbox id as email_id.
+    """
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    image_path = get_image_store().save_file(source_image, data=data, image=image)
+    violation_data = {
+        "timestamp": timestamp,
+        "speed": speed,
+        "license_plate": license_plate,
+        "image_path": image_path
+    }
+    driver_info = db.add_violation(violation_data)
+    if driver_info and notify:
+        driver_info["email_id"] = db.enqueue_email(
+            driver_info["email"],
+            speed,
+            timestamp,
+            image_path
+        )
+    return driver_info
+
+def capture_time(image_path):
+    """A file's modification time as a violation timestamp, or None if it is missing"""
+    try:
+        return datetime.fromtimestamp(os.path.getmtime(image_path)).strftime("%Y%m%d_%H%M%S")
+    except OSError:
         return None
-    reader = easyocr.Reader(['en'])
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    edges = cv2.Canny(blur, 50, 150)
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        aspect_ratio = w / float(h)
-        if 2.0 < aspect_ratio < 5.0:
-            plate_region = image[y:y+h, x:x+w]
-            results = reader.readtext(plate_region)
-            if results:
-                return results[0][1]
-    return None
+
+def manifest_item(row, base_dir, default_speed):
+    """(image, speed, timestamp) for one manifest row; raises ValueError if it is invalid"""
+    if not isinstance(row, dict):
+        raise ValueError("expected an object with an image field")
+    image = row.get('image')
+    if not image:
+        raise ValueError("missing image")
+    speed = row.get('speed')
+    speed = default_speed if speed in (None, '') else float(speed)
+    # Relative image paths are resolved against the manifest's folder
+    image_path = os.path.join(base_dir, str(image))
+    timestamp = row.get('timestamp')
+    if timestamp:
+        # Stored as-is, so it must be in the format the rollups and emails parse
+        datetime.strptime(str(timestamp), "%Y%m%d_%H%M%S")
+        return image_path, speed, str(timestamp)
+    return image_path, speed, capture_time(image_path)
+
+def read_manifest(path, default_speed):
+    """Yield (item, error) for each entry of a directory, CSV or NDJSON manifest
+
+    item is (image, speed, timestamp), or None for a row that could not be
+    used, with error saying why. The timestamp is the manifest's timestamp
+    column (YYYYmmdd_HHMMSS) when it has one, otherwise the image file's
+    modification time, so rerunning a batch dates each violation when its
+    image was taken.
+    """
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image_path = os.path.join(path, name)
+                yield (image_path, default_speed, capture_time(image_path)), None
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield manifest_item(json.loads(line), base_dir, default_speed), None
+                except ValueError as e:
+                    yield None, f"line {line_number}: {e}"
+            return
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                yield manifest_item(row, base_dir, default_speed), None
+            except ValueError as e:
+                yield None, f"line {reader.line_num}: {e}"
+
+def _process_item(item):
+    """Batch task: OCR one image with this worker's warm reader"""
+    image_path, speed, timestamp = item
+    started = time.perf_counter()
+    license_plate = None
+    error = None
+    if speed is not None and speed > SPEED_THRESHOLD:
+        try:
+            license_plate = process_license_plate(image_path)
+        except Exception as e:
+            error = str(e)
+    return {
+        "image": image_path,
+        "speed": speed,
+        "timestamp": timestamp,
+        "license_plate": license_plate,
+        "error": error,
+        "seconds": time.perf_counter() - started
+    }
+
+def run_batch(path, default_speed=None, workers=1, send_email=True, recognizer_options=None):
+    """Process every image in a directory or manifest"""
+    summary = {
+        "images": 0,
+        "below_threshold": 0,
+        "no_plate": 0,
+        "violations": 0,
+        "unknown_driver": 0,
+        "errors": 0,
+        "ocr_seconds": 0.0
+    }
+    # Bad manifest rows are reported and skipped; the rest still run
+    items = []
+    for item, error in read_manifest(path, default_speed):
+        if error:
+            print(f"Skipping manifest {error}")
+            summary["errors"] += 1
+        else:
+            items.append(item)
+    summary["images"] = len(items)
+
+    db = DatabaseManager()
+    from notification.email_sender import OutboxSender
+    outbox_sender = OutboxSender(db) if send_email else None
+    if outbox_sender:
+        outbox_sender.start()
+
+    started = time.perf_counter()
+    if workers > 1:
+        # Each worker process loads the model once in its initializer
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=get_recognizer,
+                                       initargs=(recognizer_options,))
+        results = executor.map(_process_item, items, chunksize=4)
+    else:
+        get_recognizer(recognizer_options)
+        executor = None
+        results = map(_process_item, items)
+
+    try:
+        for result in results:
+            summary["ocr_seconds"] += result["seconds"]
+            if result["error"]:
+                print(f"Error processing {result['image']}: {result['error']}")
+                summary["errors"] += 1
+            elif result["speed"] is None or result["speed"] <= SPEED_THRESHOLD:
+                summary["below_threshold"] += 1
+            elif not result["license_plate"]:
+                summary["no_plate"] += 1
+            else:
+                driver_info = log_violation(db, result["image"], result["speed"],
+                                            result["license_plate"], notify=send_email,
+                                            timestamp=result["timestamp"])
+                summary["violations" if driver_info else "unknown_driver"] += 1
+                if driver_info and outbox_sender:
+                    outbox_sender.notify()
+    finally:
+        if executor:
+            executor.shutdown()
+        if outbox_sender:
+            # Deliver whatever the background thread had not reached yet
+            outbox_sender.stop(drain=True)
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["images_per_second"] = round(len(items) / elapsed, 2) if elapsed else 0.0
+    summary["ocr_seconds"] = round(summary["ocr_seconds"], 3)
+    summary["workers"] = workers
+    return summary
 
 def main():
     parser = argparse.ArgumentParser(description="Process demo image and speed.")
-    parser.add_argument('--image', required=True, help='Path to the image file')
-    parser.add_argument('--speed', type=float, required=True, help='Speed value (m/s)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--image', help='Path to the image file')
+    source.add_argument('--batch', help='Directory of images, or a CSV/NDJSON manifest with image, speed '
+                                        'and optional timestamp (YYYYmmdd_HHMMSS) columns')
+    parser.add_argument('--speed', type=float, help='Speed value (m/s); the default speed in batch mode')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for batch mode')
+    parser.add_argument('--no-email', action='store_true', help='Do not send notification emails in batch mode')
+    parser.add_argument('--top-k', type=int, default=3, help='Plate candidates sent to OCR per image')
+    parser.add_argument('--min-area', type=int, default=600, help='Smallest candidate box, in pixels')
     args = parser.parse_args()
+    recognizer_options = {"top_k": args.top_k, "min_area": args.min_area}
+
+    if args.batch:
+        summary = run_batch(args.batch, args.speed, args.workers, send_email=not args.no_email,
+                            recognizer_options=recognizer_options)
+        print(json.dumps(summary, indent=2))
+        return
+
+    if args.speed is None:
+        parser.error("--speed is required with --image")
 
     print(f"Received speed: {args.speed} m/s")
     if args.speed > SPEED_THRESHOLD:
         print(f"Speed exceeds threshold ({SPEED_THRESHOLD} m/s). Processing image...")
-        license_plate = process_license_plate(args.image)
+        get_recognizer(recognizer_options)
+        # Decode once: the frame is used for OCR and the bytes are stored as-is
+        data, image = load_image(args.image)
+        license_plate = process_license_plate(args.image, image) if image is not None else None
         if license_plate:
             print(f"Detected license plate: {license_plate}")
             # Save violation
             db = DatabaseManager()
-            email_sender = EmailSender()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            image_dir = "captured_images"
-            os.makedirs(image_dir, exist_ok=True)
-            image_path = os.path.join(image_dir, f"violation_{timestamp}.jpg")
-            cv2.imwrite(image_path, cv2.imread(args.image))
-            violation_data = {
-                "timestamp": timestamp,
-                "speed": args.speed,
-                "license_plate": license_plate,
-                "image_path": image_path
-            }
-            db.add_violation(violation_data)
-            driver_info = db.get_driver_info(license_plate)
+            driver_info = log_violation(db, args.image, args.speed, license_plate,
+                                        data=data, image=image)
             if driver_info:
-                email_sender.send_violation_notification(
-                    driver_info["email"],
-                    args.speed,
-                    timestamp,
-                    image_path
-                )
-                print(f"Violation logged and email sent to {driver_info['email']}")
+                from notification.email_sender import OutboxSender
+                # Only this violation's email; anything else in the outbox is
+                # left to the background sender
+                outbox_sender = OutboxSender(db)
+                sent = outbox_sender.send_now(driver_info["email_id"])
+                outbox_sender.stop()
+                if sent:
+                    print(f"Violation logged and email sent to {driver_info['email']}")
+                else:
+                    print(f"Violation logged and email queued for {driver_info['email']}")
             else:
                 print("Driver not found in database. No email sent.")
         else:
@@ -73,4 +306,4 @@ def main():
         print(f"Speed is within the limit ({SPEED_THRESHOLD} m/s). No action taken.")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
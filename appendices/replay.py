@@ -0,0 +1,326 @@
+"""Re-run detection over recorded footage as fast as it can be decoded
+
+    python replay.py --video lane1.mp4 --every 2 --output-db replay.db
+    python replay.py --frames recorded/ --fps 10 --report replay.json
+
+Frames are decoded on their own thread and go through the same motion
+gate, plate tracker and OCR as the live monitors, with no display and no
+pacing. Times come from the footage rather than the wall clock, so tracks
+expire exactly as they would have live, however fast the replay runs.
+Violations go to a separate database (drivers are copied from the live
+one) and images to a separate store; no emails are sent.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from database.db_manager import DatabaseManager
+from image_store import ImageStore
+from motion_gate import MotionGate
+from plate_recognition import PlateRecognizer
+from plate_tracker import PlateTracker
+from preprocessing import FrameRing, Preprocessor
+import metrics
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+# Frames each OCR worker may have submitted at once; each one holds a
+# decoded frame until its OCR finishes
+OCR_FRAMES_PER_WORKER = 2
+
+
+class FrameSource:
+    """Decodes a video file or a directory of frames on a background thread
+
+    Yields (frame index, seconds into the footage, frame). Skipped frames
+    are only grabbed, not decoded, so every > 1 saves most of the decode
+    cost as well.
+    """
+
+    _END = object()
+
+    def __init__(self, path, every=1, fps=None, start=None, queue_size=16, ocr_workers=2):
+        self.path = path
+        # Process one frame in this many
+        self.every = max(1, every)
+        self.is_directory = os.path.isdir(path)
+        if self.is_directory:
+            self.files = sorted(name for name in os.listdir(path)
+                                if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.cap = None
+            # Frame directories have no timing of their own
+            self.fps = fps or 10.0
+            self.total = len(self.files)
+        else:
+            self.cap = cv2.VideoCapture(path)
+            if not self.cap.isOpened():
+                raise Exception(f"Could not open video: {path}")
+            self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self.total = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+        # Wall-clock time of the first frame, for violation timestamps. A
+        # recording's modification time is when it ended.
+        if start is not None:
+            self.start_time = start
+        elif self.is_directory:
+            first = os.path.join(path, self.files[0]) if self.files else path
+            self.start_time = os.path.getmtime(first)
+        else:
+            self.start_time = os.path.getmtime(path) - self.total / self.fps
+
+        # Decoding runs ahead of processing by at most queue_size frames;
+        # unlike the live monitors nothing is dropped, the decoder waits
+        self.queue = queue.Queue(maxsize=queue_size)
+        # Most frames the consumer may keep in OCR at once
+        self.ocr_frames = max(1, ocr_workers) * OCR_FRAMES_PER_WORKER
+        # Video frames are decoded into a reused ring, which must outlast
+        # every frame queued or still in OCR, plus the one being decoded,
+        # one waiting to be queued and the one the consumer is looking at
+        self.frame_ring = FrameRing(queue_size + self.ocr_frames + 4)
+        self.decoded = 0
+        self.thread = threading.Thread(target=self._run, name="decode", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is self._END:
+                return
+            yield item
+
+    def _run(self):
+        try:
+            if self.is_directory:
+                self._read_directory()
+            else:
+                self._read_video()
+        except Exception as e:
+            print(f"Decoding stopped: {str(e)}")
+        finally:
+            self.queue.put(self._END)
+            if self.cap is not None:
+                self.cap.release()
+
+    def _read_video(self):
+        index = 0
+        shape = None
+        while True:
+            if index % self.every:
+                if not self.cap.grab():
+                    return
+                index += 1
+                continue
+            buffer = self.frame_ring.next(shape) if shape else None
+            with metrics.timer("replay.decode"):
+                ok, frame = self.cap.read(buffer)
+            if not ok:
+                return
+            shape = frame.shape
+            self.decoded += 1
+            self.queue.put((index, index / self.fps, frame))
+            index += 1
+
+    def _read_directory(self):
+        for index in range(0, len(self.files), self.every):
+            with metrics.timer("replay.decode"):
+                frame = cv2.imread(os.path.join(self.path, self.files[index]))
+            if frame is None:
+                print(f"Skipping unreadable frame: {self.files[index]}")
+                continue
+            self.decoded += 1
+            self.queue.put((index, index / self.fps, frame))
+
+
+def copy_drivers(source_db, output):
+    """Copy the live database's drivers so replayed plates can be matched"""
+    if not os.path.exists(source_db) or os.path.abspath(source_db) == os.path.abspath(output.db_path):
+        return 0
+    conn = output.get_connection()
+    conn.execute("ATTACH DATABASE ? AS live", (source_db,))
+    try:
+        copied = conn.execute('''
+        INSERT OR IGNORE INTO drivers (id, name, license_plate, email, violation_count,
+                                       created_at, plate_key)
+        SELECT id, name, license_plate, email, 0, created_at, plate_key(license_plate)
+        FROM live.drivers
+        ''').rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE live")
+    return copied
+
+
+class Replay:
+    """Runs recorded frames through gate, tracker and OCR into an output database"""
+
+    def __init__(self, source, output_db="replay.db", drivers_db="speed_monitor.db",
+                 image_root="replay_images", speed=10.0, speed_threshold=7.0, ocr_workers=2,
+                 recognizer_options=None, motion_options=None, tracker_options=None,
+                 preprocess_options=None):
+        import easyocr
+        self.source = source
+        self.reader = easyocr.Reader(['en'])
+        self.preprocessor = Preprocessor(**(preprocess_options or {}))
+        self.recognizer = PlateRecognizer(self.reader, preprocessor=self.preprocessor,
+                                          **(recognizer_options or {}))
+        self.motion_gate = MotionGate(**(motion_options or {}))
+        self.tracker = PlateTracker(**(tracker_options or {}))
+
+        self.db = DatabaseManager(output_db)
+        self.drivers_copied = copy_drivers(drivers_db, self.db)
+        self.image_store = ImageStore(image_root)
+
+        # Recorded footage has no speed readings, so every vehicle is
+        # treated as moving at this speed (m/s)
+        self.speed = speed
+        # Speed threshold (m/s)
+        self.speed_threshold = speed_threshold
+        self.ocr_workers = ocr_workers
+        self.executor = ThreadPoolExecutor(max_workers=ocr_workers, thread_name_prefix="ocr")
+        # OCR calls still running, oldest first, with the footage time of
+        # their frame
+        self._pending = deque()
+
+        self.counters = {
+            "frames": 0,
+            "ocr_frames": 0,
+            "reads": 0,
+            "tracks": 0,
+            "violations": 0,
+            "unmatched": 0
+        }
+        self._lock = threading.Lock()
+
+    def recognize(self, image, jobs):
+        plates = self.recognizer.read_each(image, [candidate for _, candidate in jobs])
+        for (track_id, _), plate in zip(jobs, plates):
+            if plate:
+                with self._lock:
+                    self.counters["reads"] += 1
+                self.tracker.add_read(track_id, plate.text, plate.confidence, image, self.speed)
+
+    def wait_for_ocr(self, before=None):
+        """Wait for OCR on frames older than before (all frames if None)"""
+        while self._pending and (before is None or self._pending[0][0] <= before):
+            self._collect()
+
+    def _collect(self):
+        try:
+            self._pending.popleft()[1].result()
+        except Exception as e:
+            print(f"Error in OCR: {str(e)}")
+
+    def finish(self, tracks):
+        for track in tracks:
+            self.counters["tracks"] += 1
+            if track.speed is not None and track.speed > self.speed_threshold:
+                self.record(track)
+
+    def record(self, track):
+        """Store a finished track's violation in the output database"""
+        image_path = self.image_store.save(track.best_frame)
+        driver = self.db.add_violation({
+            "timestamp": self.timestamp(track.first_seen),
+            "speed": track.speed,
+            "license_plate": track.plate(),
+            "image_path": image_path
+        })
+        if driver:
+            self.counters["violations"] += 1
+        else:
+            self.counters["unmatched"] += 1
+
+    def timestamp(self, seconds):
+        """Violation timestamp for a point in the footage"""
+        return time.strftime("%Y%m%d_%H%M%S", time.localtime(self.source.start_time + seconds))
+
+    def run(self):
+        """Process every selected frame; returns the throughput report"""
+        started = time.perf_counter()
+        self.source.start()
+        seconds = 0.0
+        for index, seconds, frame in self.source:
+            self.counters["frames"] += 1
+            # A track expires max_age after its last sighting, so only
+            # reads of frames at least that old can still change it
+            self.wait_for_ocr(seconds - self.tracker.max_age)
+            self.finish(self.tracker.expire(seconds))
+
+            with metrics.timer("motion_gate"):
+                region = self.motion_gate.check(frame)
+            if region is None:
+                continue
+            # Each plate candidate follows its own track
+            jobs = self.tracker.assign(self.recognizer.find_candidates(frame, region), seconds)
+            if not jobs:
+                continue
+            # Bound the frames in OCR so the decode ring is never overwritten
+            while len(self._pending) >= self.source.ocr_frames:
+                self._collect()
+            self.counters["ocr_frames"] += 1
+            self._pending.append((seconds, self.executor.submit(
+                self.recognize, frame, jobs)))
+
+        self.wait_for_ocr()
+        self.finish(self.tracker.flush())
+        self.executor.shutdown()
+        elapsed = time.perf_counter() - started
+
+        report = dict(self.counters,
+                      source=self.source.path,
+                      output_db=self.db.db_path,
+                      every=self.source.every,
+                      decoded=self.source.decoded,
+                      footage_seconds=round(seconds, 3),
+                      elapsed_seconds=round(elapsed, 3),
+                      fps=round(self.counters["frames"] / elapsed, 1) if elapsed else 0.0,
+                      realtime_factor=round(seconds / elapsed, 2) if elapsed else 0.0,
+                      drivers_copied=self.drivers_copied)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded footage through plate detection.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help='Video file to replay')
+    source.add_argument('--frames', help='Directory of frames, replayed in file name order')
+    parser.add_argument('--every', type=int, default=1, help='Process one frame in this many')
+    parser.add_argument('--fps', type=float, help='Frame rate of the footage (default: from the video, or 10)')
+    parser.add_argument('--start', help='Time of the first frame, YYYYmmdd_HHMMSS (default: from the file times)')
+    parser.add_argument('--queue-size', type=int, default=16, help='Frames decoded ahead of processing')
+    parser.add_argument('--output-db', default="replay.db", help='Database the violations are written to')
+    parser.add_argument('--drivers-db', default="speed_monitor.db", help='Database the drivers are copied from')
+    parser.add_argument('--images', default="replay_images", help='Where violation images are stored')
+    parser.add_argument('--speed', type=float, default=10.0, help='Speed (m/s) assumed for every vehicle')
+    parser.add_argument('--threshold', type=float, default=7.0, help='Speed threshold (m/s)')
+    parser.add_argument('--ocr-workers', type=int, default=2, help='OCR threads')
+    parser.add_argument('--report', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    metrics.set_process("replay")
+    start = time.mktime(time.strptime(args.start, "%Y%m%d_%H%M%S")) if args.start else None
+    frames = FrameSource(args.video or args.frames, every=args.every, fps=args.fps, start=start,
+                         queue_size=args.queue_size, ocr_workers=args.ocr_workers)
+    replay = Replay(frames, output_db=args.output_db, drivers_db=args.drivers_db,
+                    image_root=args.images, speed=args.speed, speed_threshold=args.threshold,
+                    ocr_workers=args.ocr_workers)
+    report = replay.run()
+    print(f"Processed {report['frames']} frames in {report['elapsed_seconds']}s "
+          f"({report['fps']} fps, {report['realtime_factor']}x real time): "
+          f"{report['violations']} violations, {report['unmatched']} unmatched plates")
+    print(metrics.registry.format_line())
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
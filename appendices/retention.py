@@ -0,0 +1,316 @@
+"""Archive and delete old violations, their images, and orphaned records
+
+    python retention.py --max-age-days 365 --dry-run
+    python retention.py --max-age-days 365 --orphans --clean-images
+
+Expired violations are written to one zip per month under the archive
+directory (NDJSON records plus their images) before they are deleted, in
+small transactions so the monitor's writer is never held up for long.
+Freed database pages are then returned with incremental vacuum.
+
+Archiving deletes skip the rollup trigger: each driver's violation_count
+and every rollup (hourly, daily and all-time counts and histograms) still
+include archived violations, so the stats keep their history and the
+daily buckets still add up to the total. With --recount the counters are
+instead rebuilt from the violations that remain.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import zipfile
+from datetime import datetime, timedelta
+from database.db_manager import DatabaseManager
+from image_store import ImageStore
+
+EXPIRED_BATCH_QUERY = '''
+SELECT v.id, v.timestamp, v.speed, v.image_path, v.driver_id, d.name, d.license_plate, d.email
+FROM violations v
+LEFT JOIN drivers d ON v.driver_id = d.id
+WHERE v.timestamp < ? AND (v.timestamp, v.id) > (?, ?)
+ORDER BY v.timestamp, v.id
+LIMIT ?
+'''
+
+# Violations whose driver was deleted, walked in id order
+ORPHAN_BATCH_QUERY = '''
+SELECT v.id, v.timestamp, v.speed, v.image_path, v.driver_id, NULL, NULL, NULL
+FROM violations v
+WHERE v.id > ? AND NOT EXISTS (SELECT 1 FROM drivers d WHERE d.id = v.driver_id)
+ORDER BY v.id
+LIMIT ?
+'''
+
+# How many violations use an image, and whether a pending email still does
+IMAGE_REFERENCES_QUERY = '''
+SELECT (SELECT COUNT(*) FROM violations WHERE image_path = ?),
+       EXISTS (SELECT 1 FROM email_outbox WHERE status = 'pending' AND image_path = ?)
+'''
+
+COLUMNS = ("id", "timestamp", "speed", "image_path", "driver_id", "name", "license_plate", "email")
+
+
+class RetentionEngine:
+    """Archives violations older than max_age_days, then deletes them in batches"""
+
+    def __init__(self, db, image_store, max_age_days=365, archive_dir="archive",
+                 batch_size=500, pause=0.05, vacuum_pages=1000, min_orphan_age=86400.0):
+        self.db = db
+        self.image_store = image_store
+        self.max_age_days = max_age_days
+        self.archive_dir = archive_dir
+        # Rows per delete transaction, and the pause after each one so the
+        # live writer can take the lock in between
+        self.batch_size = batch_size
+        self.pause = pause
+        # Pages returned to the filesystem per incremental_vacuum step
+        self.vacuum_pages = vacuum_pages
+        # Unreferenced image files younger than this may belong to a
+        # violation that is still being recorded, so they are left alone
+        self.min_orphan_age = min_orphan_age
+
+    def cutoff(self, now=None):
+        """Timestamp before which violations expire, in the YYYYmmdd_HHMMSS format"""
+        now = now or datetime.now()
+        return (now - timedelta(days=self.max_age_days)).strftime("%Y%m%d_%H%M%S")
+
+    def expired_batches(self, cutoff):
+        """Yield batches of expired violations, oldest first"""
+        conn = self.db.get_connection()
+        after = ("", 0)
+        while True:
+            rows = conn.execute(EXPIRED_BATCH_QUERY,
+                                (cutoff, after[0], after[1], self.batch_size)).fetchall()
+            if not rows:
+                return
+            after = (rows[-1][1], rows[-1][0])
+            yield [dict(zip(COLUMNS, row)) for row in rows]
+
+    def orphan_batches(self):
+        """Yield batches of violations whose driver no longer exists"""
+        conn = self.db.get_connection()
+        after = 0
+        while True:
+            rows = conn.execute(ORPHAN_BATCH_QUERY, (after, self.batch_size)).fetchall()
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield [dict(zip(COLUMNS, row)) for row in rows]
+
+    def run(self, dry_run=False, orphans=False, clean_images=False, recount=False, now=None):
+        """Archive and delete expired (and optionally orphaned) violations
+
+        Returns a report; with dry_run nothing is written or deleted and the
+        report gives what would be reclaimed. Rollups and violation counts
+        keep the archived violations unless recount is set.
+        """
+        report = {
+            "cutoff": self.cutoff(now),
+            "dry_run": dry_run,
+            "violations": 0,
+            "orphaned_violations": 0,
+            "images": 0,
+            "image_bytes": 0,
+            "orphan_image_files": 0,
+            "recounted": False,
+            "archives": []
+        }
+        sources = [("violations", self.expired_batches(report["cutoff"]))]
+        if orphans:
+            sources.append(("orphaned_violations", self.orphan_batches()))
+
+        # Dry runs delete nothing, so an expired orphan comes up in both
+        # passes; count it once, as a real run would
+        counted = set()
+        # Expiring violations per image
+        expiring_images = {}
+        for key, batches in sources:
+            for batch in batches:
+                if dry_run:
+                    batch = [row for row in batch if row["id"] not in counted]
+                    counted.update(row["id"] for row in batch)
+                    report[key] += len(batch)
+                    for row in batch:
+                        image_path = row["image_path"]
+                        expiring_images[image_path] = expiring_images.get(image_path, 0) + 1
+                    continue
+                report[key] += len(batch)
+                for path in self.archive(batch):
+                    if path not in report["archives"]:
+                        report["archives"].append(path)
+                images = {row["image_path"]: self.image_store.disk_usage(row["image_path"])
+                          for row in batch}
+                self.db.delete_violations([row["id"] for row in batch], remove_images=False,
+                                          archive=True)
+                for image_path, size in images.items():
+                    if self.db.release_image(image_path):
+                        report["images"] += 1
+                        report["image_bytes"] += size
+                time.sleep(self.pause)
+
+        for image_path, expiring in expiring_images.items():
+            if self.reclaimable_image(image_path, expiring):
+                report["images"] += 1
+                report["image_bytes"] += self.image_store.disk_usage(image_path)
+
+        if recount and not dry_run:
+            self.db.recount_violations()
+            report["recounted"] = True
+
+        if clean_images:
+            count, size = self.clean_orphan_images(dry_run)
+            report["orphan_image_files"] = count
+            report["image_bytes"] += size
+
+        if dry_run:
+            report["db_bytes"] = self.estimate_db_bytes(report["violations"]
+                                                        + report["orphaned_violations"])
+        else:
+            report["db_bytes"] = self.vacuum()
+        return report
+
+    def reclaimable_image(self, image_path, expiring):
+        """True if only the `expiring` violations being deleted still use the image"""
+        conn = self.db.get_connection()
+        violations, emailed = conn.execute(IMAGE_REFERENCES_QUERY,
+                                           (image_path, image_path)).fetchone()
+        return violations <= expiring and not emailed
+
+    def archive(self, batch):
+        """Append a batch to its monthly zip archives; returns the archive paths"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        months = {}
+        for row in batch:
+            months.setdefault(row["timestamp"][:6], []).append(row)
+
+        paths = []
+        for month, rows in sorted(months.items()):
+            path = os.path.join(self.archive_dir, f"violations-{month}.zip")
+            with zipfile.ZipFile(path, "a", compression=zipfile.ZIP_DEFLATED) as archive:
+                names = set(archive.namelist())
+                lines = []
+                for row in rows:
+                    record = dict(row)
+                    arcname = "images/" + os.path.basename(row["image_path"])
+                    if os.path.isfile(row["image_path"]):
+                        if arcname not in names:
+                            # JPEGs are already compressed
+                            archive.write(row["image_path"], arcname,
+                                          compress_type=zipfile.ZIP_STORED)
+                            names.add(arcname)
+                        record["archived_image"] = arcname
+                    lines.append(json.dumps(record))
+                member = f"violations/{rows[0]['id']}-{rows[-1]['id']}.ndjson"
+                if member in names:
+                    # A rerun after an interrupted delete archives the same rows again
+                    member = f"violations/{rows[0]['id']}-{rows[-1]['id']}-{int(time.time())}.ndjson"
+                archive.writestr(member, "\n".join(lines) + "\n")
+            paths.append(path)
+        return paths
+
+    def clean_orphan_images(self, dry_run=False):
+        """Remove stored images nothing refers to; returns (files, bytes)"""
+        files = 0
+        size = 0
+        cutoff = time.time() - self.min_orphan_age
+        for image_path in self.image_store.iter_images():
+            try:
+                if os.path.getmtime(image_path) > cutoff:
+                    continue
+            except OSError:
+                continue
+            if self.db.image_in_use(image_path):
+                continue
+            usage = self.image_store.disk_usage(image_path)
+            if not dry_run:
+                try:
+                    self.image_store.remove(image_path)
+                except OSError:
+                    continue
+            files += 1
+            size += usage
+        return files, size
+
+    def estimate_db_bytes(self, rows):
+        """Approximate database bytes freed by deleting this many violations"""
+        conn = self.db.get_connection()
+        total = conn.execute("SELECT COUNT(*) FROM violations").fetchone()[0]
+        if not rows or not total:
+            return 0
+        try:
+            # dbstat gives exact sizes of the table and its indexes when
+            # SQLite was built with it
+            used = conn.execute('''
+            SELECT SUM(pgsize) FROM dbstat
+            WHERE name = 'violations' OR name IN
+                (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'violations')
+            ''').fetchone()[0] or 0
+        except sqlite3.OperationalError:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            used = page_size * pages
+        return int(used * rows / total)
+
+    def vacuum(self):
+        """Return free pages to the filesystem a step at a time; returns bytes freed"""
+        conn = self.db.get_connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free:
+                print(f"{free * page_size} bytes are free inside the database; run with "
+                      "--enable-incremental-vacuum once to return them to the filesystem")
+            return 0
+        freed = 0
+        while True:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                return freed
+            step = min(free, self.vacuum_pages)
+            conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+            conn.commit()
+            freed += step * page_size
+            time.sleep(self.pause)
+
+
+def enable_incremental_vacuum(db):
+    """Switch an existing database to incremental auto-vacuum (one full VACUUM)"""
+    conn = db.get_connection()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and delete old violations and images.")
+    parser.add_argument('--db', default="speed_monitor.db", help='Database file')
+    parser.add_argument('--images', default="captured_images", help='Image store directory')
+    parser.add_argument('--archive-dir', default="archive", help='Where monthly archives are written')
+    parser.add_argument('--max-age-days', type=float, default=365, help='Keep violations this recent')
+    parser.add_argument('--batch-size', type=int, default=500, help='Violations per delete transaction')
+    parser.add_argument('--orphans', action='store_true',
+                        help='Also archive violations whose driver was deleted')
+    parser.add_argument('--clean-images', action='store_true',
+                        help='Also remove image files no violation refers to')
+    parser.add_argument('--recount', action='store_true',
+                        help='Rebuild violation counts and stats from the violations left, '
+                             'dropping archived ones (by default they keep counting)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report what would be archived and reclaimed without changing anything')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Convert an existing database first (runs a full VACUUM)')
+    args = parser.parse_args()
+
+    store = ImageStore(args.images)
+    db = DatabaseManager(args.db, remove_image=store.remove)
+    if args.enable_incremental_vacuum and not args.dry_run:
+        enable_incremental_vacuum(db)
+    engine = RetentionEngine(db, store, max_age_days=args.max_age_days,
+                             archive_dir=args.archive_dir, batch_size=args.batch_size)
+    report = engine.run(dry_run=args.dry_run, orphans=args.orphans,
+                        clean_images=args.clean_images, recount=args.recount)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -76,6 +76,12 @@ void loop() {
       lcd.setCursor(7, 1);
       lcd.print(currentSpeedKmh, 1);
 
+      // Every measurement goes to the Pi, which matches frames to the
+      // nearest reading; about 20 ms of serial time at 9600 baud
+      Serial.print("Speed: ");
+      Serial.print(currentSpeedKmh);
+      Serial.println(" km/h");
+
       if (currentSpeedKmh > speedLimitKmhArduino) {
         if (currentTimeMs - lastSignalTimeMs > signalDebounceMs) {
           Serial.print("Speeding detected! Speed: ");
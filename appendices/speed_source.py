@@ -0,0 +1,342 @@
+"""Capture triggers and speed readings from the Arduino speed detector
+
+A speed source tells the monitor when to capture and how fast the vehicle
+in a frame was going:
+
+    source.start()
+    triggered_at = source.wait_trigger(timeout=0.5)   # None on timeout
+    speed = source.speed_at(frame_time)               # m/s, or None
+
+Times are time.monotonic() seconds. The Arduino prints a line such as
+"Speed: 42.10 km/h" for every measurement and "Speeding detected! Speed:
+42.10 km/h. Signaling Pi." when a vehicle breaks its limit, when it also
+pulses the signal pin. SerialSpeedSource keeps recent readings in a ring
+buffer and triggers on the speeding lines; GpioSpeedSource triggers on the
+pin's rising edge, which arrives before the serial line does, and takes
+its speeds from a serial source. PtySpeedSource stands in for the Arduino
+on any Linux machine:
+
+    python speed_source.py simulate --limit 30
+"""
+import argparse
+import os
+import queue
+import re
+import select
+import threading
+import time
+
+KMH_TO_MPS = 1 / 3.6
+SPEED_PATTERN = re.compile(rb"Speed:\s*(-?[0-9]+(?:\.[0-9]+)?)\s*km/h")
+TRIGGER_PREFIX = b"Speeding detected"
+
+
+def parse_line(line):
+    """Return (speed in m/s, is_trigger) for an Arduino line, or None"""
+    match = SPEED_PATTERN.search(line)
+    if match is None:
+        return None
+    return float(match.group(1)) * KMH_TO_MPS, line.lstrip().startswith(TRIGGER_PREFIX)
+
+
+class SpeedBuffer:
+    """Fixed-size ring of (time, speed) readings, searched by time"""
+
+    def __init__(self, size=256):
+        self.size = size
+        self._times = [0.0] * size
+        self._speeds = [0.0] * size
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, speed):
+        with self._lock:
+            index = self._count % self.size
+            self._times[index] = timestamp
+            self._speeds[index] = speed
+            self._count += 1
+
+    def nearest(self, timestamp, max_gap=0.5):
+        """Speed of the reading closest to timestamp, if one is within max_gap seconds"""
+        with self._lock:
+            best = None
+            best_gap = max_gap
+            # Newest first; readings arrive in time order, so the search can
+            # stop once they are more than max_gap older than timestamp
+            for n in range(min(self._count, self.size)):
+                index = (self._count - 1 - n) % self.size
+                gap = self._times[index] - timestamp
+                if gap < -max_gap:
+                    break
+                # On a tie the newer reading, seen first, is kept
+                if abs(gap) < best_gap or (best is None and abs(gap) <= best_gap):
+                    best, best_gap = self._speeds[index], abs(gap)
+            return best
+
+    def latest(self):
+        """(time, speed) of the newest reading, or None"""
+        with self._lock:
+            if not self._count:
+                return None
+            index = (self._count - 1) % self.size
+            return self._times[index], self._speeds[index]
+
+
+class SpeedSource:
+    """Base class: readings go into a SpeedBuffer and triggers into a queue"""
+
+    def __init__(self, buffer_size=256, max_gap=0.5):
+        self.readings = SpeedBuffer(buffer_size)
+        # A frame is only given a speed measured within this many seconds of it
+        self.max_gap = max_gap
+        self.triggers = queue.Queue(maxsize=16)
+        self.trigger_count = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def trigger(self, timestamp=None):
+        """Record a capture trigger; the oldest is dropped if nobody is waiting"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self.trigger_count += 1
+        try:
+            self.triggers.put_nowait(timestamp)
+        except queue.Full:
+            try:
+                self.triggers.get_nowait()
+            except queue.Empty:
+                pass
+            self.triggers.put_nowait(timestamp)
+
+    def wait_trigger(self, timeout=None):
+        """Block until the next trigger and return its time, or None on timeout"""
+        try:
+            return self.triggers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def speed_at(self, timestamp):
+        """Speed (m/s) of the reading nearest timestamp, or None"""
+        return self.readings.nearest(timestamp, self.max_gap)
+
+
+class SerialSpeedSource(SpeedSource):
+    """Reads the Arduino's serial output on a background thread
+
+    Uses pyserial when it is installed. Without it the port is read as a
+    plain file, which works for pseudo-terminals and for serial devices
+    already configured with stty.
+    """
+
+    def __init__(self, port="/dev/ttyACM0", baudrate=9600, triggers=True, **kwargs):
+        super().__init__(**kwargs)
+        self.port = port
+        self.baudrate = baudrate
+        # Whether speeding lines trigger capture; off when a GPIO pin does
+        self.use_triggers = triggers
+        self.lines = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._stream = None
+        self.thread = None
+
+    def _open(self):
+        try:
+            import serial
+        except ImportError:
+            return open(self.port, "rb", buffering=0)
+        return serial.Serial(self.port, self.baudrate, timeout=0.5)
+
+    def start(self):
+        self._stream = self._open()
+        self.thread = threading.Thread(target=self._run, name="speed-serial", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join(1.0)
+        if self._stream is not None:
+            self._stream.close()
+
+    def _read(self):
+        # Reads wake at least every 0.5 s so stop() is noticed
+        if hasattr(self._stream, "in_waiting"):
+            # pyserial: wait for one byte, then take whatever else has arrived
+            return self._stream.read(self._stream.in_waiting or 1)
+        ready, _, _ = select.select([self._stream], [], [], 0.5)
+        return os.read(self._stream.fileno(), 256) if ready else b""
+
+    def _run(self):
+        pending = b""
+        while not self._stop.is_set():
+            try:
+                chunk = self._read()
+            except (OSError, ValueError):
+                self.errors += 1
+                print(f"Speed source {self.port} stopped")
+                return
+            if not chunk:
+                continue
+            received = time.monotonic()
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            # Each line is dated back from the end of the chunk, past every
+            # byte that followed it, so earlier lines get earlier times
+            following = len(pending) + sum(len(line) + 1 for line in lines)
+            for line in lines:
+                following -= len(line) + 1
+                self.handle_line(line, received, following)
+
+    def handle_line(self, line, received=None, following=0):
+        """Parse one line, dating it back by the time it and the following bytes took to arrive"""
+        received = time.monotonic() if received is None else received
+        self.lines += 1
+        parsed = parse_line(line)
+        if parsed is None:
+            return
+        speed, is_trigger = parsed
+        # At 9600 baud a 50-byte line takes about 50 ms to arrive
+        measured = received - (len(line) + 1 + following) * 10.0 / self.baudrate
+        # A line that arrived alone in a later read can be dated before the
+        # previous one; readings must stay in time order for nearest()
+        latest = self.readings.latest()
+        if latest is not None:
+            measured = max(measured, latest[0])
+        self.readings.add(measured, speed)
+        if is_trigger and self.use_triggers:
+            self.trigger(measured)
+
+
+class GpioSpeedSource(SpeedSource):
+    """Triggers on the Arduino's signal pin through an edge interrupt
+
+    Readings come from speeds (normally a SerialSpeedSource created with
+    triggers=False); the edge itself wakes the capture thread with no
+    polling delay.
+    """
+
+    def __init__(self, pin, speeds=None, bouncetime=200, **kwargs):
+        super().__init__(**kwargs)
+        self.pin = pin
+        self.speeds = speeds
+        # Milliseconds during which further edges are ignored
+        self.bouncetime = bouncetime
+
+    def start(self):
+        import RPi.GPIO as GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(self.pin, GPIO.IN)
+        GPIO.add_event_detect(self.pin, GPIO.RISING, callback=lambda _: self.trigger(),
+                              bouncetime=self.bouncetime)
+        if self.speeds is not None:
+            self.speeds.start()
+
+    def stop(self):
+        import RPi.GPIO as GPIO
+        GPIO.remove_event_detect(self.pin)
+        if self.speeds is not None:
+            self.speeds.stop()
+
+    def speed_at(self, timestamp):
+        if self.speeds is None:
+            return None
+        return self.speeds.speed_at(timestamp)
+
+
+class PtySpeedSource(SerialSpeedSource):
+    """A SerialSpeedSource reading from a pseudo-terminal it feeds itself
+
+    send() writes Arduino-format lines into the pty, so the whole serial
+    path, parsing included, runs without hardware.
+    """
+
+    def __init__(self, **kwargs):
+        import pty
+        self.master, slave = pty.openpty()
+        # Raw mode, so lines arrive as written
+        import tty
+        tty.setraw(slave)
+        port = os.ttyname(slave)
+        self._slave = slave
+        super().__init__(port=port, **kwargs)
+
+    def send(self, speed_kmh, speeding=False):
+        """Write one reading as the Arduino would print it"""
+        if speeding:
+            line = f"Speeding detected! Speed: {speed_kmh:.2f} km/h. Signaling Pi.\r\n"
+        else:
+            line = f"Speed: {speed_kmh:.2f} km/h\r\n"
+        os.write(self.master, line.encode())
+
+    def stop(self):
+        super().stop()
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def simulate(source, limit_kmh=30.0, interval=0.15, pass_seconds=3.0, gap_seconds=5.0,
+             peak_kmh=45.0, stop=None):
+    """Feed a PtySpeedSource a vehicle that passes every pass_seconds + gap_seconds"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        signalled = False
+        started = time.monotonic()
+        while time.monotonic() - started < pass_seconds and not stop.is_set():
+            progress = (time.monotonic() - started) / pass_seconds
+            speed = peak_kmh * (1.0 - abs(2.0 * progress - 1.0))
+            speeding = speed > limit_kmh and not signalled
+            source.send(speed, speeding)
+            signalled = signalled or speeding
+            stop.wait(interval)
+        stop.wait(gap_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed source tools.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    sim = commands.add_parser('simulate', help='Run an Arduino stand-in on a pseudo-terminal')
+    sim.add_argument('--limit', type=float, default=30.0, help='Speed limit (km/h) that triggers capture')
+    sim.add_argument('--peak', type=float, default=45.0, help='Top speed (km/h) of each passing vehicle')
+    watch = commands.add_parser('watch', help='Print readings and triggers from a serial port')
+    watch.add_argument('port', help='Serial device, e.g. /dev/ttyACM0 or a pty path')
+    watch.add_argument('--baudrate', type=int, default=9600)
+    args = parser.parse_args()
+
+    if args.command == 'simulate':
+        # The monitor opens the pty's path as its port; this process only
+        # writes to it
+        source = PtySpeedSource()
+        print(f"Arduino stand-in on {source.port}; press Ctrl+C to stop")
+        try:
+            simulate(source, limit_kmh=args.limit, peak_kmh=args.peak)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            source.stop()
+        return
+
+    source = SerialSpeedSource(args.port, args.baudrate)
+    source.start()
+    try:
+        while True:
+            triggered = source.wait_trigger(timeout=1.0)
+            reading = source.readings.latest()
+            if triggered is not None:
+                print(f"trigger at {triggered:.3f}: {source.speed_at(triggered):.2f} m/s")
+            elif reading:
+                print(f"latest {reading[1]:.2f} m/s")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.stop()
+
+
+if __name__ == "__main__":
+    main()
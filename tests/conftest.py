@@ -0,0 +1,36 @@
+"""Shared setup for the tests of the listings in appendices/
+
+The listings import each other as they are laid out on the device: most
+modules side by side, DatabaseManager as database.db_manager and the email
+senders as notification.email_sender. A throwaway package directory maps
+those two packages onto appendices/, so the sources run unchanged both in
+this process and in the fresh interpreters some tests start.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+APPENDICES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "appendices")
+PACKAGES = ("database", "notification")
+
+_layout = tempfile.mkdtemp(prefix="speed_monitor_layout_")
+for _package in PACKAGES:
+    os.makedirs(os.path.join(_layout, _package))
+    with open(os.path.join(_layout, _package, "__init__.py"), "w") as _f:
+        _f.write(f"__path__ = [{APPENDICES!r}]\n")
+sys.path[:0] = [_layout, APPENDICES]
+PYTHONPATH = os.pathsep.join((_layout, APPENDICES))
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_layout, ignore_errors=True)
+
+
+@pytest.fixture
+def subprocess_env():
+    """Environment for a fresh interpreter that imports the listings"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (PYTHONPATH, env.get("PYTHONPATH")) if p)
+    return env
@@ -0,0 +1,84 @@
+"""Keyset pages of /api/violations"""
+import importlib
+import pytest
+from database.db_manager import DatabaseManager
+
+pytest.importorskip("flask")
+pytest.importorskip("cv2")
+
+TIMESTAMPS = (["20260101_090000"] * 2 + ["20260101_120000"] * 5 + ["20260101_150000"]
+              + ["20260102_080000"] * 3)
+
+
+@pytest.fixture
+def dashboard(tmp_path, monkeypatch):
+    # app opens its default database and image store in the working directory
+    monkeypatch.chdir(tmp_path)
+    app = importlib.import_module("app")
+    db = DatabaseManager(str(tmp_path / "api.db"))
+    db.add_driver("Abebe", "AA12345", "abebe@example.com")
+    db.add_driver("Sara", "BB12345", "sara@example.com")
+    db.add_violations([{"license_plate": "AA12345" if n % 3 else "BB12345", "speed": 10.0 + n,
+                        "timestamp": timestamp, "image_path": f"captured_images/{n}.jpg"}
+                       for n, timestamp in enumerate(TIMESTAMPS)])
+    monkeypatch.setattr(app, "db", db)
+    app._response_cache.clear()
+    yield app, db
+    app._response_cache.clear()
+    db.close()
+
+
+def expected_ids(db, where="1", params=()):
+    return [row[0] for row in db.get_connection().execute(f'''
+    SELECT v.id FROM violations v JOIN drivers d ON v.driver_id = d.id
+    WHERE {where} ORDER BY v.timestamp DESC, v.id DESC
+    ''', params)]
+
+
+def walk(client, query):
+    """Follow X-Next-Cursor from the first page; returns ids and page count"""
+    ids = []
+    pages = 0
+    url = f"/api/violations?limit=2&{query}"
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages += 1
+        ids += [row["id"] for row in response.get_json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids, pages
+        url = f"/api/violations?limit=2&{query}&after={cursor}"
+
+
+@pytest.mark.parametrize("query, where, params", [
+    ("", "1", ()),
+    ("plate=AA12345", "d.license_plate = ?", ("AA12345",)),
+    ("since=20260101_120000&until=20260102_000000",
+     "v.timestamp >= ? AND v.timestamp < ?", ("20260101_120000", "20260102_000000")),
+    ("plate=BB12345&since=20260101_120000",
+     "d.license_plate = ? AND v.timestamp >= ?", ("BB12345", "20260101_120000")),
+], ids=["all", "plate", "range", "plate_since"])
+def test_pages_have_no_duplicates_or_gaps(dashboard, query, where, params):
+    app, db = dashboard
+    ids, pages = walk(app.app.test_client(), query)
+    expected = expected_ids(db, where, params)
+    assert expected
+    assert ids == expected
+    assert pages >= len(expected) // 2
+
+
+def test_cursor_inside_a_shared_timestamp(dashboard):
+    app, db = dashboard
+    shared = expected_ids(db, "v.timestamp = ?", ("20260101_120000",))
+    response = app.app.test_client().get(
+        f"/api/violations?limit=2&after=20260101_120000:{shared[1]}")
+    assert [row["id"] for row in response.get_json()] == shared[2:4]
+
+
+@pytest.mark.parametrize("after", ["garbage", "20260101_120000:", ":12", "20260101_120000:x1"])
+def test_malformed_cursor_is_rejected(dashboard, after):
+    app, _ = dashboard
+    response = app.app.test_client().get(f"/api/violations?after={after}")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid cursor"}
@@ -0,0 +1,39 @@
+"""Deleting a driver takes their violations and rollups with them"""
+import pytest
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    removed = []
+    manager = DatabaseManager(str(tmp_path / "speed_monitor.db"), remove_image=removed.append)
+    manager.removed_images = removed
+    manager.add_driver("Abebe", "AA12345", "abebe@example.com")
+    manager.add_driver("Sara", "BB12345", "sara@example.com")
+    for plate, speed, image in (("AA12345", 12.0, "a1.jpg"), ("AA12345", 15.0, "shared.jpg"),
+                                ("BB12345", 9.0, "shared.jpg")):
+        manager.add_violation({"timestamp": "20260101_120000", "speed": speed,
+                               "license_plate": plate, "image_path": image})
+    yield manager
+    manager.close()
+
+
+def counts(db):
+    conn = db.get_connection()
+    return (conn.execute("SELECT COUNT(*) FROM violations").fetchone()[0],
+            conn.execute("SELECT count FROM violation_counts WHERE period = 'all'").fetchone()[0],
+            conn.execute("SELECT COUNT(*) FROM driver_speed_histogram").fetchone()[0])
+
+
+def test_delete_driver_removes_violations(db):
+    assert db.delete_driver("AA12345")
+    assert counts(db) == (1, 1, 1)
+    assert db.get_driver_info("AA12345") is None
+    # The shared image is still used by the other driver's violation
+    assert db.removed_images == ["a1.jpg"]
+    assert not db.delete_driver("AA12345")
+
+
+def test_delete_driver_archive_keeps_rollups(db):
+    assert db.delete_driver("AA12345", archive=True)
+    assert counts(db) == (1, 3, 1)
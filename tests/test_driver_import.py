@@ -0,0 +1,80 @@
+"""Bulk driver import: rejected rows are reported by line and skipped"""
+import io
+import pytest
+from database.db_manager import DatabaseManager
+from driver_io import export_drivers, import_drivers
+
+REGISTRY = """name,license_plate,email
+Abebe,AA12345,abebe@example.com
+Sara,BB12345,not-an-email
+Kebede,CC12345,kebede@example.com
+"Hana
+Tesfaye",DD12345,hana@example.com
+"""
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "speed_monitor.db"))
+    # Stands in for any constraint the database enforces beyond validate()
+    manager.get_connection().execute('''
+    CREATE TRIGGER reject_cc BEFORE INSERT ON drivers WHEN NEW.license_plate = 'CC12345'
+    BEGIN SELECT RAISE(ABORT, 'plate CC12345 is blocked'); END
+    ''')
+    yield manager
+    manager.close()
+
+
+def drivers(db):
+    return {row[0]: row[1:] for row in db.get_connection().execute(
+        "SELECT license_plate, id, name, violation_count FROM drivers")}
+
+
+@pytest.mark.parametrize("batch_size", [1000, 2])
+def test_bad_rows_are_reported_and_skipped(db, batch_size):
+    logged = []
+    report = import_drivers(db, io.StringIO(REGISTRY), batch_size=batch_size,
+                            on_error=lambda line, message: logged.append(line))
+    assert report["rows"] == 4
+    assert report["imported"] == 2
+    assert report["rejected"] == 2
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+    assert report["errors"][0]["error"] == "invalid email"
+    assert "blocked" in report["errors"][1]["error"]
+    assert logged == [3, 4]
+    assert sorted(drivers(db)) == ["AA12345", "DD12345"]
+    # The quoted name spans two lines and is kept whole
+    assert drivers(db)["DD12345"][1] == "Hana\nTesfaye"
+
+
+def test_reimport_keeps_ids_and_violation_counts(db):
+    import_drivers(db, io.StringIO(REGISTRY))
+    before = drivers(db)
+    db.add_violation({"license_plate": "AA12345", "speed": 12.0,
+                      "timestamp": "20260101_120000", "image_path": "a.jpg"})
+
+    updated = REGISTRY.replace("Abebe,", "Abebe Bikila,")
+    report = import_drivers(db, io.StringIO(updated))
+    assert report["imported"] == 2
+    after = drivers(db)
+    assert after["AA12345"] == (before["AA12345"][0], "Abebe Bikila", 1)
+    assert after["DD12345"] == before["DD12345"]
+
+
+def test_ndjson_errors_and_export_round_trip(db, tmp_path):
+    ndjson = ('{"name": "Abebe", "license_plate": "AA12345", "email": "abebe@example.com"}\n'
+              '\n'
+              'not json\n'
+              '["a", "list"]\n'
+              '{"name": "Sara", "license_plate": "---", "email": "sara@example.com"}\n')
+    report = import_drivers(db, io.StringIO(ndjson), fmt="ndjson")
+    assert report["imported"] == 1
+    assert [error["line"] for error in report["errors"]] == [3, 4, 5]
+
+    exported = "".join(export_drivers(db, "csv"))
+    other = DatabaseManager(str(tmp_path / "copy.db"))
+    try:
+        assert import_drivers(other, io.StringIO(exported))["imported"] == 1
+        assert other.get_driver_info("AA12345")["email"] == "abebe@example.com"
+    finally:
+        other.close()
@@ -0,0 +1,199 @@
+"""OutboxSender against a local aiosmtpd server"""
+import socket
+import threading
+import time
+import pytest
+from database.db_manager import DatabaseManager
+from notification.email_sender import EmailSender, OutboxSender
+
+controller_module = pytest.importorskip("aiosmtpd.controller")
+
+# A minimal JPEG header, enough for the image attachment
+JPEG = b"\xff\xd8\xff\xdb" + b"\x00" * 64
+
+
+class Handler:
+    """Records delivered messages; queued faults apply to the next DATA commands
+
+    A fault is "drop" (close the connection without replying) or an SMTP
+    reply such as "451 4.3.0 Try again later".
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.faults = []
+        self.sessions = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions.append(server)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.faults:
+            fault = self.faults.pop(0)
+            if fault == "drop":
+                server.transport.close()
+                return "421 4.3.0 Closing connection"
+            return fault
+        self.messages.append((envelope.rcpt_tos[0], envelope.content))
+        return "250 OK"
+
+    def drop_connections(self):
+        """Close every client connection from the server's event loop"""
+        closed = threading.Event()
+
+        def close():
+            for server in self.sessions:
+                if server.transport is not None:
+                    server.transport.close()
+            closed.set()
+        self.loop.call_soon_threadsafe(close)
+        assert closed.wait(5)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    handler = Handler()
+    handler.port = free_port()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=handler.port)
+    controller.start()
+    handler.loop = controller.loop
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "speed_monitor.db"))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "violation.jpg"
+    path.write_bytes(JPEG)
+    return str(path)
+
+
+def make_sender(db, smtp, **options):
+    email_sender = EmailSender("127.0.0.1", smtp.port, use_starttls=False)
+    email_sender.sender_email = "monitor@example.com"
+    options = dict({"max_rate": 1000.0, "base_backoff": 0.2}, **options)
+    sender = OutboxSender(db, email_sender, **options)
+    sender.sent_ids = []
+    mark_email_sent = db.mark_email_sent
+
+    def record(email_id):
+        sender.sent_ids.append(email_id)
+        mark_email_sent(email_id)
+    db.mark_email_sent = record
+    return sender
+
+
+def enqueue(db, image, count):
+    return [db.enqueue_email(f"driver{n}@example.com", 12.5, "20260101_120000", image)
+            for n in range(count)]
+
+
+def outbox(db):
+    return {row[0]: row[1:] for row in db.get_connection().execute(
+        "SELECT id, status, attempts FROM email_outbox")}
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_delivers_over_one_connection(db, smtp, image):
+    ids = enqueue(db, image, 5)
+    sender = make_sender(db, smtp)
+    assert sender.send_pending() == 5
+    sender.stop()
+    assert sorted(rcpt for rcpt, _ in smtp.messages) == sorted(
+        f"driver{n}@example.com" for n in range(5))
+    assert len(smtp.sessions) == 1
+    assert sender.sent_ids == ids
+    assert outbox(db) == {email_id: ("sent", 1) for email_id in ids}
+
+
+def test_send_now_delivers_only_that_message(db, smtp, image):
+    ids = enqueue(db, image, 3)
+    sender = make_sender(db, smtp)
+    assert sender.send_now(ids[1])
+    # Already sent, so there is nothing left to claim
+    assert not sender.send_now(ids[1])
+    sender.stop()
+    assert [rcpt for rcpt, _ in smtp.messages] == ["driver1@example.com"]
+    assert sender.sent_ids == [ids[1]]
+    assert outbox(db) == {ids[0]: ("pending", 0), ids[1]: ("sent", 1), ids[2]: ("pending", 0)}
+
+
+def test_reconnects_after_idle_connection_is_dropped(db, smtp, image):
+    sender = make_sender(db, smtp)
+    first = enqueue(db, image, 2)
+    assert sender.send_pending() == 2
+    smtp.drop_connections()
+    second = enqueue(db, image, 2)
+    assert sender.send_pending() == 2
+    sender.stop()
+    assert len(smtp.messages) == 4
+    assert len(smtp.sessions) == 2
+    assert sender.sent_ids == first + second
+    assert all(row == ("sent", 1) for row in outbox(db).values())
+
+
+def test_retries_with_backoff_after_drops(db, smtp, image):
+    # The send and its immediate reconnect both fail, so the row backs off
+    smtp.faults = ["drop", "drop"]
+    [email_id] = enqueue(db, image, 1)
+    sender = make_sender(db, smtp)
+    started = time.time()
+    assert sender.send_pending() == 0
+    status, attempts = outbox(db)[email_id]
+    assert (status, attempts) == ("pending", 1)
+    retry_at = db.get_connection().execute(
+        "SELECT next_attempt_at FROM email_outbox WHERE id = ?", (email_id,)).fetchone()[0]
+    assert retry_at >= started + sender.base_backoff
+    # Not due again until the backoff has passed
+    assert sender.send_pending() == 0
+
+    smtp.faults = ["451 4.3.0 Try again later"]
+    time.sleep(max(0.0, retry_at - time.time()) + 0.05)
+    assert sender.send_pending() == 0
+    status, attempts = outbox(db)[email_id]
+    assert (status, attempts) == ("pending", 2)
+    # The second failure waits twice as long
+    retry_at_2 = db.get_connection().execute(
+        "SELECT next_attempt_at FROM email_outbox WHERE id = ?", (email_id,)).fetchone()[0]
+    assert retry_at_2 - time.time() > sender.base_backoff * 1.5
+
+    time.sleep(max(0.0, retry_at_2 - time.time()) + 0.05)
+    assert sender.send_pending() == 1
+    sender.stop()
+    assert [rcpt for rcpt, _ in smtp.messages] == ["driver0@example.com"]
+    assert sender.sent_ids == [email_id]
+    assert outbox(db)[email_id] == ("sent", 3)
+
+
+def test_background_thread_delivers_and_drains(db, smtp, image):
+    sender = make_sender(db, smtp, poll_interval=0.1)
+    sender.start()
+    ids = enqueue(db, image, 3)
+    sender.notify()
+    wait_for(lambda: len(smtp.messages) == 3)
+    more = enqueue(db, image, 2)
+    sender.stop(drain=True)
+    assert len(smtp.messages) == 5
+    assert sorted(sender.sent_ids) == sorted(ids + more)
+    assert all(row == ("sent", 1) for row in outbox(db).values())
@@ -0,0 +1,64 @@
+"""Cached plate lookups must not outlive the rows they were read from"""
+import pytest
+from database.db_manager import DatabaseManager, PlateCache
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "speed_monitor.db")
+
+
+@pytest.fixture
+def db(db_path):
+    manager = DatabaseManager(db_path, remove_image=lambda path: None)
+    yield manager
+    manager.close()
+
+
+def add_violation(db, plate):
+    return db.add_violation({"license_plate": plate, "speed": 12.0,
+                             "timestamp": "20260101_120000", "image_path": "a.jpg"})
+
+
+def test_cached_miss_rechecked_after_another_connection_adds_driver(db, db_path):
+    assert db.get_driver_info("ABC123") is None
+    assert db.plate_cache.get("ABC123") == (True, None)
+    other = DatabaseManager(db_path)
+    try:
+        other.add_driver("Abebe", "ABC123", "abebe@example.com")
+    finally:
+        other.close()
+    assert db.get_driver_info("ABC123")["license_plate"] == "ABC123"
+
+
+def test_counts_follow_inserts_and_deletes_under_every_alias(db):
+    db.add_driver("Abebe", "ABC123", "abebe@example.com")
+    add_violation(db, "ABC123")
+    add_violation(db, "A8C123")
+    # Both the registered plate and the misread are cached
+    assert db.get_driver_info("ABC123")["violation_count"] == 2
+    assert db.get_driver_info("A8C123")["violation_count"] == 2
+    [violation_id] = [row[0] for row in db.get_connection().execute(
+        "SELECT MIN(id) FROM violations")]
+    assert db.delete_violation(violation_id)
+    assert db.get_driver_info("A8C123")["violation_count"] == 1
+    assert db.get_driver_info("ABC123")["violation_count"] == 1
+
+
+def test_put_after_invalidation_is_dropped():
+    cache = PlateCache()
+    generation = cache.generation
+    cache.invalidate("ABC123")
+    cache.put("ABC123", {"id": 1, "violation_count": 0}, generation)
+    assert cache.get("ABC123") == (False, None)
+
+
+def test_entries_expire_and_are_evicted():
+    cache = PlateCache(maxsize=2, ttl=0.0)
+    cache.put("ABC123", {"id": 1}, cache.generation)
+    assert cache.get("ABC123") == (False, None)
+    cache = PlateCache(maxsize=2)
+    for n, plate in enumerate(("AAA111", "BBB222", "CCC333")):
+        cache.put(plate, {"id": n}, cache.generation)
+    assert cache.get("AAA111") == (False, None)
+    assert cache.get("CCC333") == (True, {"id": 2})
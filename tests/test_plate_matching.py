@@ -0,0 +1,87 @@
+"""Which driver an OCR read is charged to"""
+import sqlite3
+import pytest
+from database.db_manager import MIGRATIONS, DatabaseManager
+from plate_index import PlateIndex, normalize_plate
+
+
+@pytest.fixture
+def open_db(tmp_path):
+    managers = []
+
+    def open_db(*plates, **options):
+        manager = DatabaseManager(str(tmp_path / "speed_monitor.db"), **options)
+        for n, plate in enumerate(plates):
+            manager.add_driver(f"Driver {n}", plate, f"driver{n}@example.com")
+        managers.append(manager)
+        return manager
+    yield open_db
+    for manager in managers:
+        manager.close()
+
+
+def plate_of(driver):
+    return driver["license_plate"] if driver else None
+
+
+def test_confusable_characters_fold_onto_one_key(open_db):
+    db = open_db("ABC123")
+    assert normalize_plate("a8c-123") == normalize_plate("ABC123") == "A8C123"
+    assert plate_of(db.get_driver_info("A8C123")) == "ABC123"
+    assert plate_of(db.get_driver_info("ABC 123")) == "ABC123"
+
+
+def test_shared_plate_key_matches_neither(open_db):
+    db = open_db("ABC123", "A8C123")
+    # Exact plates still match their own driver
+    assert plate_of(db.get_driver_info("A8C123")) == "A8C123"
+    assert db.get_driver_info("A8C-123") is None
+    assert db.match_plate("ABC 123") is None
+
+
+def test_edit_distance_matching_is_off_by_default(open_db):
+    db = open_db("ABC123")
+    assert db.get_driver_info("ABC124") is None
+
+
+def test_edit_distance_match_must_be_unique(open_db):
+    db = open_db("ABC123", "XYZ789", plate_match_distance=1)
+    assert plate_of(db.get_driver_info("ABC124")) == "ABC123"
+    db.add_driver("Driver 2", "ABC125", "driver2@example.com")
+    # One substitution away from both ABC123 and ABC125
+    assert db.get_driver_info("ABC127") is None
+
+
+def test_plate_index_lookup():
+    index = PlateIndex(max_distance=1)
+    index.add_many([(1, "A8C123"), (2, "A8C125")])
+    # A deletion away from both keys
+    assert index.lookup("A8C12") is None
+    assert index.lookup("A8C1Z5") == (2, 1)
+    index.remove(2)
+    assert index.lookup("A8C124") == (1, 1)
+    assert index.lookup("XYZ789") is None
+
+
+def test_migration_backfills_plate_keys(tmp_path):
+    path = str(tmp_path / "speed_monitor.db")
+    # A database as the version before plate keys left it
+    conn = sqlite3.connect(path)
+    for version, _, statements in MIGRATIONS:
+        if version == 7:
+            break
+        for statement in statements:
+            conn.execute(statement)
+    conn.execute("PRAGMA user_version = 6")
+    conn.execute("INSERT INTO drivers (name, license_plate, email) "
+                 "VALUES ('Abebe', 'ABC-123', 'abebe@example.com')")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(path)
+    try:
+        assert db.get_connection().execute(
+            "SELECT plate_key FROM drivers").fetchall() == [("A8C123",)]
+        assert plate_of(db.get_driver_info("A8C123")) == "ABC-123"
+    finally:
+        db.close()
@@ -0,0 +1,44 @@
+"""The dashboard and violation queries must stay index-backed"""
+import sqlite3
+import pytest
+from database.db_manager import MIGRATIONS, DatabaseManager
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "speed_monitor.db")
+
+
+def user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_every_migration_applied(db_path):
+    DatabaseManager(db_path).close()
+    assert user_version(db_path) == MIGRATIONS[-1][0]
+
+
+def test_hot_queries_use_indexes(db_path):
+    db = DatabaseManager(db_path)
+    try:
+        assert db.check_query_plans() == []
+    finally:
+        db.close()
+
+
+def test_migrations_are_idempotent(db_path, monkeypatch):
+    DatabaseManager(db_path).close()
+    version = user_version(db_path)
+    # Forget which files were migrated, so the second construction checks again
+    monkeypatch.setattr(DatabaseManager, "_migrated_files", set())
+    db = DatabaseManager(db_path)
+    try:
+        db.migrate()
+        assert db.check_query_plans() == []
+    finally:
+        db.close()
+    assert user_version(db_path) == version
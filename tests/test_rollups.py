@@ -0,0 +1,64 @@
+"""The rollup triggers follow every insert and delete, except archiving deletes"""
+import pytest
+from database.db_manager import DatabaseManager
+
+HOUR, DAY = "20260101_12", "20260101"
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "speed_monitor.db"), remove_image=lambda path: None)
+    manager.add_driver("Abebe", "AA12345", "abebe@example.com")
+    manager.add_driver("Sara", "BB12345", "sara@example.com")
+    yield manager
+    manager.close()
+
+
+def violation(plate, speed, timestamp, image):
+    return {"license_plate": plate, "speed": speed, "timestamp": timestamp, "image_path": image}
+
+
+def counters(db, speed_bin):
+    """Every counter a violation of driver AA12345 in speed_bin contributes to"""
+    conn = db.get_connection()
+    result = {}
+    for period, bucket in (("hour", HOUR), ("day", DAY), ("all", "")):
+        result[f"count.{period}"] = conn.execute(
+            "SELECT count FROM violation_counts WHERE period = ? AND bucket = ?",
+            (period, bucket)).fetchone()[0]
+        result[f"histogram.{period}"] = conn.execute(
+            "SELECT count FROM speed_histogram WHERE period = ? AND bucket = ? AND speed_bin = ?",
+            (period, bucket, speed_bin)).fetchone()[0]
+    result["driver_histogram"] = conn.execute('''
+    SELECT h.count FROM driver_speed_histogram h JOIN drivers d ON d.id = h.driver_id
+    WHERE d.license_plate = 'AA12345' AND h.speed_bin = ?
+    ''', (speed_bin,)).fetchone()[0]
+    result["violation_count"] = conn.execute(
+        "SELECT violation_count FROM drivers WHERE license_plate = 'AA12345'").fetchone()[0]
+    return result
+
+
+def test_delete_and_archive_delete(db):
+    db.add_violation(violation("AA12345", 12.3, "20260101_120000", "a1.jpg"))
+    assert db.add_violations([
+        violation("AA12345", 12.8, "20260101_120500", "a2.jpg"),
+        violation("AA12345", 12.1, "20260101_121000", "a3.jpg"),
+        violation("BB12345", 9.0, "20260101_121500", "b1.jpg"),
+    ]) == 3
+    ids = [row[0] for row in db.get_connection().execute(
+        "SELECT id FROM violations WHERE image_path LIKE 'a%' ORDER BY id")]
+
+    before = counters(db, 12)
+    assert before == {"count.hour": 4, "histogram.hour": 3, "count.day": 4, "histogram.day": 3,
+                      "count.all": 4, "histogram.all": 3, "driver_histogram": 3,
+                      "violation_count": 3}
+
+    assert db.delete_violation(ids[0])
+    after_delete = counters(db, 12)
+    assert after_delete == {name: count - 1 for name, count in before.items()}
+
+    assert db.delete_violations([ids[1]], archive=True) == 1
+    assert counters(db, 12) == after_delete
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM archiving").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM violations").fetchone()[0] == 2
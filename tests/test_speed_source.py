@@ -0,0 +1,45 @@
+"""Parsing and dating of the Arduino's serial lines"""
+import sys
+import time
+import pytest
+from speed_source import KMH_TO_MPS, PtySpeedSource, SerialSpeedSource, parse_line
+
+
+@pytest.fixture
+def source():
+    source = PtySpeedSource()
+    source.start()
+    yield source
+    source.stop()
+
+
+def test_parse_line():
+    assert parse_line(b"Speed: 36.00 km/h\r") == (pytest.approx(10.0), False)
+    assert parse_line(b"Speeding detected! Speed: 72.00 km/h. Signaling Pi.") == \
+        (pytest.approx(20.0), True)
+    assert parse_line(b"Ready") is None
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs a Linux pseudo-terminal")
+def test_speeding_line_triggers_capture(source):
+    sent = time.monotonic()
+    source.send(45.0, speeding=True)
+    triggered = source.wait_trigger(timeout=5.0)
+    assert triggered is not None
+    assert sent - 0.5 <= triggered <= time.monotonic()
+    assert source.speed_at(triggered) == pytest.approx(45.0 * KMH_TO_MPS)
+
+
+def test_readings_stay_in_time_order():
+    source = SerialSpeedSource("/dev/null")
+    short = b"Speed: 20.00 km/h\r"
+    long = b"Speeding detected! Speed: 40.00 km/h. Signaling Pi.\r"
+    # Read separately, the longer line is dated back further than the
+    # shorter one before it: 100.01 - 53 bytes at 9600 baud < 100.0 - 19 bytes
+    source.handle_line(short, received=100.0)
+    source.handle_line(long, received=100.01)
+    triggered = source.wait_trigger(timeout=0)
+    assert triggered >= 100.0 - (len(short) + 1) * 10.0 / source.baudrate
+    # The newer reading is the one nearest any later time
+    assert source.speed_at(100.01) == pytest.approx(40.0 * KMH_TO_MPS)
+    assert source.speed_at(triggered) == pytest.approx(40.0 * KMH_TO_MPS)
@@ -0,0 +1,46 @@
+"""process_demo must start fast when it has nothing to recognize"""
+import subprocess
+import sys
+import time
+from pathlib import Path
+import pytest
+
+BUDGET_MS = 200.0
+HEAVY_MODULES = ("cv2", "numpy", "easyocr", "torch")
+SCRIPT = str(Path(__file__).resolve().parent.parent / "appendices" / "process_demo.py")
+
+# Runs process_demo as __main__ and then lists the heavy modules it loaded
+RUNNER = f"""
+import runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+print("LOADED:" + ",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+
+
+def run_demo(env, cwd, *args):
+    """Best wall time in ms of three fresh runs, and the heavy modules loaded"""
+    best = None
+    for _ in range(3):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", RUNNER, SCRIPT] + list(args), cwd=cwd,
+                                env=env, capture_output=True, text=True, check=True)
+        elapsed = (time.perf_counter() - started) * 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    loaded = result.stdout.rsplit("LOADED:", 1)[1].strip()
+    return best, [m for m in loaded.split(",") if m]
+
+
+@pytest.mark.parametrize("args", [
+    ("--help",),
+    ("--image", "missing.jpg", "--speed", "3"),
+], ids=["help", "below_threshold"])
+def test_startup_within_budget(args, subprocess_env, tmp_path):
+    elapsed_ms, loaded = run_demo(subprocess_env, tmp_path, *args)
+    assert not loaded, f"process_demo {' '.join(args)} loaded {', '.join(loaded)}"
+    assert elapsed_ms < BUDGET_MS, f"took {elapsed_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)"
+    # Nothing is recorded, so no database is created either
+    assert not list(tmp_path.iterdir())